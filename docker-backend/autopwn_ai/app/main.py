@@ -1,28 +1,59 @@
-from fastapi import FastAPI, HTTPException, Depends, WebSocket, WebSocketDisconnect, Request, File, UploadFile
+# Imported first so the startup timer also covers the imports below
+from app.utils.startup import startup_timer
+from fastapi import FastAPI, HTTPException, Depends, WebSocket, WebSocketDisconnect, Request, File, UploadFile, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import APIKeyHeader
 from fastapi.responses import JSONResponse, FileResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
+from fastapi.routing import APIRoute
+from starlette.requests import ClientDisconnect
 from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Literal
 import os
+import json
 import uuid
 import asyncio
 import platform
 import shutil
 import tempfile
-import subprocess
 from loguru import logger
 import time
 import io
+import functools
+import posixpath
 from pathlib import Path
+from urllib.parse import quote
+from email.utils import formatdate
 from dotenv import load_dotenv
 
-from app.services.kali_service import KaliService
-from app.utils.tool_validator import is_command_safe, get_validation_error
+from app.services.kali_service import KaliService, KaliConnectionError, SessionLimitError
+from app.services.local_runner import LocalRunner
+from app.services.tool_inventory import ToolInventory
+from app.services.job_queue import JobQueue, QueueFullError
+from app.services.output_store import OutputStore
+from app.services.stream_hub import StreamHub
+from app.services.result_cache import ResultCache
+from app.services.health_prober import HealthProber
+from app.services.workspace import WorkspaceService
+from app.services.file_transfer import FileTransferService, UploadError
+from app.services.artifact_store import ArtifactStore, ArtifactResponse
+from app.services.history_store import HistoryStore, key_fingerprint
+from app.services.governor import QuotaManager, QuotaExceededError, charged_cpu_seconds
+from app.services.shared_state import create_shared_state
+from app.services.worker_router import WorkerRouter, resource_for_path, is_internal
+from app.utils.tool_validator import validate_command, validate_many
+from app.utils.rate_limiter import SlidingWindowRateLimiter, SharedRateLimiter, classify_route
+from app.utils.http_cache import etag_matches, if_range_matches, parse_range, RangeNotSatisfiable
+from app.utils import timing
+from app.utils.profiler import SamplingProfiler, ProfilerBusyError
+from app.utils.metrics import (
+    registry, HTTP_REQUESTS, HTTP_REQUEST_DURATION, RATE_LIMIT_REJECTIONS, WEBSOCKET_STREAMS, HTTP_STREAMS,
+    KALI_POOL
+)
 
 # Load environment variables
 load_dotenv()
+startup_timer.mark("imports")
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -31,15 +62,44 @@ app = FastAPI(
     version="1.0.0"
 )
 
+
+class TimedRoute(APIRoute):
+    """Route that notes when its endpoint returns, so the rest can be timed as encoding"""
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        if asyncio.iscoroutinefunction(endpoint):
+            @functools.wraps(endpoint)
+            async def timed_endpoint(*args, **kw):
+                try:
+                    return await endpoint(*args, **kw)
+                finally:
+                    timing.mark_endpoint_done()
+        else:
+            @functools.wraps(endpoint)
+            def timed_endpoint(*args, **kw):
+                try:
+                    return endpoint(*args, **kw)
+                finally:
+                    timing.mark_endpoint_done()
+        super().__init__(path, timed_endpoint, **kwargs)
+
+
+# Must be set before any route is declared
+app.router.route_class = TimedRoute
+
 # Create directories for binaries
 os.makedirs("binaries/windows", exist_ok=True)
 os.makedirs("binaries/linux", exist_ok=True)
 os.makedirs("binaries/macos", exist_ok=True)
 os.makedirs("uploads", exist_ok=True)
 
-# Serve static files (including binaries)
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# Serve static files (including binaries); a missing static/ only disables that mount
+if os.path.isdir("static"):
+    app.mount("/static", StaticFiles(directory="static"), name="static")
+else:
+    logger.warning("No static/ directory found, not serving /static")
 app.mount("/binaries", StaticFiles(directory="binaries"), name="binaries")
+startup_timer.mark("app_setup")
 
 # CORS middleware
 app.add_middleware(
@@ -50,51 +110,162 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Shared state across uvicorn workers (SHARED_STATE_BACKEND=sqlite|redis); None
+# keeps everything in this process, as with a single worker
+shared_state = create_shared_state()
+worker_router = WorkerRouter(shared_state, app) if shared_state is not None else None
+
+async def claim_resource(resource_id: str):
+    """Record this worker as the owner of a job, session, output, upload or stream"""
+    if worker_router is not None:
+        await worker_router.claim(resource_id)
+
+async def release_resource(resource_id: str):
+    if worker_router is not None:
+        await worker_router.release(resource_id)
+
+# Worker routing middleware: requests for a resource owned by another worker are forwarded there.
+# Only installed with shared state, so a single process doesn't pay for the extra layer
+async def worker_routing_middleware(request: Request, call_next):
+    if not is_internal(request):
+        resource_id = resource_for_path(request.url.path)
+        if resource_id is not None:
+            address = await worker_router.owner_address(resource_id)
+            if address is not None:
+                return await worker_router.forward(request, address)
+    return await call_next(request)
+
+if worker_router is not None:
+    app.middleware("http")(worker_routing_middleware)
+
 # Rate limiting middleware
+if shared_state is not None:
+    rate_limiter = SharedRateLimiter.from_env(state=shared_state)
+else:
+    rate_limiter = SlidingWindowRateLimiter.from_env()
+
 @app.middleware("http")
 async def rate_limit_middleware(request: Request, call_next):
-    client_ip = request.client.host
-    current_time = time.time()
-    requests_per_minute = 30  # Adjust as needed
-    
-    # Initialize request history dict if not in app state
-    if not hasattr(app.state, "request_history"):
-        app.state.request_history = {}
-    
-    # Clean old requests (older than 60 seconds)
-    app.state.request_history = {
-        ip: [t for t in times if current_time - t < 60] 
-        for ip, times in app.state.request_history.items()
-    }
-    
-    # Check and update client's request history
-    if client_ip not in app.state.request_history:
-        app.state.request_history[client_ip] = []
-    
-    if len(app.state.request_history[client_ip]) >= requests_per_minute:
+    # Forwarded requests were already counted by the worker that received them
+    if is_internal(request):
+        return await call_next(request)
+
+    # Every client shares the one API key, so keyed requests are limited per
+    # (key, client IP) rather than in a single bucket; everyone else by IP.
+    # Buckets may live in shared state, so they name the key by fingerprint.
+    client_ip = request.client.host if request.client else "unknown"
+    api_key = request.headers.get("X-API-Key")
+    if api_key and api_key == API_KEY:
+        client_key = f"key:{key_fingerprint(api_key)}@{client_ip}"
+    else:
+        client_key = f"ip:{client_ip}"
+
+    route_class = classify_route(request.url.path)
+    with timing.phase("rate_limit"):
+        allowed, retry_after = await rate_limiter.hit_async(client_key, route_class)
+    if not allowed:
+        RATE_LIMIT_REJECTIONS.labels(route_class).inc()
         return JSONResponse(
             status_code=429,
-            content={"detail": "Too many requests"}
+            content={"detail": "Too many requests"},
+            headers={"Retry-After": str(max(1, int(retry_after + 0.5)))}
         )
     
-    app.state.request_history[client_ip].append(current_time)
-    
     # Process the request
     response = await call_next(request)
     return response
 
+# Server-Timing breakdown of each response (rate_limit, auth, validate, pool_acquire,
+# channel_open, remote_run, encode, total)
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Request metrics middleware (registered last, so it also times rate-limited requests)
+@app.middleware("http")
+async def metrics_middleware(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    timings = timing.start_request() if SERVER_TIMING_ENABLED else None
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        if timings is not None:
+            # Streamed bodies are still being produced, so this covers serialization up to the headers
+            if timings.endpoint_done is not None:
+                timings.add("encode", time.perf_counter() - timings.endpoint_done)
+            response.headers["Server-Timing"] = timings.header()
+        return response
+    finally:
+        # Label by route template rather than raw path to keep cardinality bounded
+        route = request.scope.get("route")
+        path = getattr(route, "path", "unmatched")
+        HTTP_REQUESTS.labels(path, request.method, status).inc()
+        HTTP_REQUEST_DURATION.labels(path, request.method).observe(time.perf_counter() - start)
+
 # API Key authentication
 API_KEY = os.getenv("API_KEY", "12345")
+
+# Batch execution limits
+BATCH_MAX_COMMANDS = int(os.getenv("BATCH_MAX_COMMANDS", "100"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "8"))
+
+# Seconds between keep-alive events on streamed /execute responses
+STREAM_HEARTBEAT_INTERVAL = float(os.getenv("STREAM_HEARTBEAT_INTERVAL", "15"))
 api_key_header = APIKeyHeader(name="X-API-Key")
 
 def get_api_key(api_key: str = Depends(api_key_header)):
-    if api_key != API_KEY:
-        logger.warning(f"Invalid API key attempt: {api_key[:5]}...")
-        raise HTTPException(status_code=401, detail="Invalid API Key")
+    with timing.phase("auth"):
+        if api_key != API_KEY:
+            logger.warning(f"Invalid API key attempt: {api_key[:5]}...")
+            raise HTTPException(status_code=401, detail="Invalid API Key")
+    return api_key
+
+# Admin key for /debug endpoints; they are disabled when unset
+ADMIN_API_KEY = os.getenv("ADMIN_API_KEY")
+
+def get_admin_key(api_key: str = Depends(api_key_header)):
+    if not ADMIN_API_KEY or api_key != ADMIN_API_KEY:
+        logger.warning(f"Rejected admin request with key: {api_key[:5]}...")
+        raise HTTPException(status_code=403, detail="Admin API key required")
+    return api_key
+
+# /metrics needs the API or admin key unless anonymous scraping is opted into
+METRICS_PUBLIC = os.getenv("METRICS_PUBLIC", "false").lower() in ("1", "true", "yes")
+optional_api_key_header = APIKeyHeader(name="X-API-Key", auto_error=False)
+
+def get_metrics_key(api_key: Optional[str] = Depends(optional_api_key_header)):
+    if METRICS_PUBLIC:
+        return api_key
+    if not api_key or api_key not in (API_KEY, ADMIN_API_KEY):
+        raise HTTPException(status_code=403, detail="API key required for metrics")
     return api_key
 
 # Initialize services
 kali_service = KaliService()
+local_runner = LocalRunner()
+tool_inventory = ToolInventory(kali_service)
+output_store = OutputStore()
+history_store = HistoryStore()
+# Per-key concurrency and CPU quotas, shared across workers when shared state is configured
+quotas = QuotaManager(shared_state, worker_id=worker_router.worker_id if worker_router else "local")
+job_queue = JobQueue(kali_service, output_store=output_store, history=history_store, quotas=quotas)
+stream_hub = StreamHub(kali_service, history=history_store, quotas=quotas)
+result_cache = ResultCache()
+health_prober = HealthProber(kali_service)
+workspace = WorkspaceService(kali_service)
+file_transfer = FileTransferService(kali_service, workspace)
+artifact_store = ArtifactStore()
+profiler = SamplingProfiler()
+
+def _pool_metrics() -> Dict[tuple, float]:
+    stats = kali_service.get_stats()
+    samples = {(stats["host"], "sessions"): stats["sessions"]}
+    for backend in stats["backends"]:
+        for field in ("transports", "connecting", "active_channels", "max_channels"):
+            samples[(backend["name"], field)] = backend[field]
+    return samples
+
+KALI_POOL.callback = _pool_metrics
+startup_timer.mark("services")
 
 # Model definitions
 class CommandRequest(BaseModel):
@@ -108,6 +279,27 @@ class CommandResponse(BaseModel):
     stderr: str
     success: bool
     execution_time: float
+    output_id: Optional[str] = None
+    truncated: bool = False
+    stdout_size: Optional[int] = None
+    stderr_size: Optional[int] = None
+    cpu_seconds: Optional[float] = None
+    limit_exceeded: Optional[str] = None
+
+class BatchRequest(BaseModel):
+    commands: List[CommandRequest]
+    concurrency: Optional[int] = None
+
+class JobRequest(CommandRequest):
+    priority: Literal["high", "normal", "low"] = "normal"
+
+class UploadRequest(BaseModel):
+    path: str
+    size: Optional[int] = None
+    sha256: Optional[str] = None
+
+class UploadCompleteRequest(BaseModel):
+    sha256: Optional[str] = None
 
 class ProxyConfig(BaseModel):
     host: str
@@ -127,113 +319,532 @@ async def root():
 
 # Available tools endpoint
 @app.get("/tools")
-async def get_available_tools(api_key: str = Depends(get_api_key)):
+async def get_available_tools(
+    request: Request,
+    prefix: Optional[str] = None,
+    q: Optional[str] = None,
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1, le=10000),
+    api_key: str = Depends(get_api_key)
+):
     """Get list of available tools on the Kali system"""
     try:
-        # Get list of common security tools in Kali
-        result = kali_service.execute_command(
-            "find /usr/bin /usr/sbin -type f -executable -size +1k | sort | grep -v -E '\\.so$' | xargs -n1 basename"
-        )
-        
-        if not result["success"]:
-            raise HTTPException(status_code=500, detail="Failed to retrieve tools")
-        
-        # Parse tools list
-        tools = [tool for tool in result["stdout"].split("\n") if tool.strip()]
-        
-        return {
-            "count": len(tools),
-            "tools": tools
-        }
+        await tool_inventory.ensure_loaded()
     except Exception as e:
         logger.error(f"Error getting tools: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+    headers = {"ETag": tool_inventory.etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("If-None-Match"), tool_inventory.etag):
+        return Response(status_code=304, headers=headers)
+
+    total, tools = tool_inventory.query(prefix=prefix, contains=q, offset=offset, limit=limit)
+    return JSONResponse(
+        content={
+            "count": total,
+            "offset": offset,
+            "limit": limit,
+            "tools": tools
+        },
+        headers=headers
+    )
+
+async def run_command(
+    command: str,
+    timeout: Optional[int],
+    command_id: Optional[str] = None,
+    api_key: Optional[str] = None,
+    source: str = "execute",
+    session_id: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Execute a validated command on Kali, record it in history and build its
+    CommandResponse. With `session_id`, it runs in that shell session.
+    Raises QuotaExceededError if the API key is over its quotas. Cancelling
+    it stops the command on Kali.
+    """
+    # Generate command ID
+    command_id = command_id or str(uuid.uuid4())
+    
+    # Execute command, capturing output so large results can be paged
+    async with quotas.reserve(api_key) as reservation:
+        capture = output_store.create(command_id)
+        try:
+            result = await kali_service.execute_command_async(
+                command, 
+                session_id=session_id or command_id,
+                timeout=timeout,
+                sink=capture
+            )
+        except BaseException as e:
+            # Nothing will fetch a failed command's output, so drop any spilled segment
+            capture.discard()
+            if isinstance(e, asyncio.CancelledError) and session_id is None:
+                # Stop the remote command; a shell session outlives any one command
+                kali_service.close_session(command_id)
+            raise
+        reservation.cpu_seconds = charged_cpu_seconds(result)
+    output_store.finish(capture)
+    if capture.truncated:
+        await claim_resource(command_id)
+    history_store.record(
+        command,
+        source,
+        result["success"],
+        api_key=api_key,
+        command_id=command_id,
+        exit_code=result.get("exit_code"),
+        execution_time=result["execution_time"],
+        stdout_size=capture.streams["stdout"].size,
+        stderr_size=capture.streams["stderr"].size
+    )
+    
+    return {
+        "command_id": command_id,
+        "command": command,
+        "success": result["success"],
+        "execution_time": result["execution_time"],
+        "cpu_seconds": result.get("cpu_seconds"),
+        "limit_exceeded": result.get("limit_exceeded"),
+        **capture.response_fields()
+    }
+
+def quota_error(e: QuotaExceededError) -> HTTPException:
+    # Concurrency frees up as commands finish; CPU only as the window slides
+    retry_after = "5" if e.quota == "concurrency" else "60"
+    return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": retry_after})
+
+async def cancel_on_disconnect(request: Request, awaitable):
+    """Await `awaitable`, cancelling it if the client disconnects first; raises ClientDisconnect then"""
+    async def wait_for_disconnect():
+        # The body has been read, so the next message is the disconnect.
+        # Request.is_disconnected() can't see it through the http middlewares.
+        while (await request.receive())["type"] != "http.disconnect":
+            pass
+
+    task = asyncio.ensure_future(awaitable)
+    watcher = asyncio.ensure_future(wait_for_disconnect())
+    try:
+        await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+        if task.done():
+            return task.result()
+        raise ClientDisconnect()
+    finally:
+        watcher.cancel()
+        if not task.done():
+            task.cancel()
+        await asyncio.gather(task, watcher, return_exceptions=True)
+
+def stream_execution(command_req: CommandRequest, media_type: str, api_key: str) -> StreamingResponse:
+    """
+    Run a validated command through the stream hub and send its frames as
+    Server-Sent Events or NDJSON while it runs. Heartbeats are sent while
+    the command is quiet; a client disconnect stops the remote command.
+    """
+    command_id = str(uuid.uuid4())
+
+    def encode(frame: Dict[str, Any]) -> str:
+        if media_type == "text/event-stream":
+            return f"event: {frame['type']}\ndata: {json.dumps(frame)}\n\n"
+        return json.dumps(frame) + "\n"
+
+    async def generate():
+        # Subscribe once the body is being sent, so the cleanup below always runs
+        subscriber = stream_hub.subscribe(command_id, command_req.command, command_req.timeout, owner=api_key)
+        await claim_resource(command_id)
+        HTTP_STREAMS.inc()
+        try:
+            yield encode({"type": "start", "command_id": command_id, "command": command_req.command})
+            while True:
+                try:
+                    frame = await asyncio.wait_for(subscriber.get(), STREAM_HEARTBEAT_INTERVAL)
+                except asyncio.TimeoutError:
+                    # SSE comments are ignored by clients but keep proxies from idling out
+                    yield ": heartbeat\n\n" if media_type == "text/event-stream" else encode({"type": "heartbeat"})
+                    continue
+                if frame is None:
+                    break
+                yield encode(frame)
+        finally:
+            HTTP_STREAMS.dec()
+            stream_hub.unsubscribe(command_id, subscriber)
+
+    return StreamingResponse(
+        generate(),
+        media_type=media_type,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-Command-ID": command_id}
+    )
+
 # Execute command endpoint
 @app.post("/execute", response_model=CommandResponse)
-async def execute_command(command_req: CommandRequest, api_key: str = Depends(get_api_key)):
-    """Execute a command on the Kali server"""
+async def execute_command(
+    command_req: CommandRequest,
+    request: Request,
+    response: Response,
+    api_key: str = Depends(get_api_key)
+):
+    """
+    Execute a command on the Kali server. With `Accept: text/event-stream`
+    or `Accept: application/x-ndjson`, output is streamed as it arrives.
+    """
     try:
         # Validate command
-        if not is_command_safe(command_req.command):
-            error_msg = get_validation_error(command_req.command)
-            raise HTTPException(status_code=400, detail=f"Invalid command: {error_msg}")
+        with timing.phase("validate"):
+            verdict = validate_command(command_req.command)
+        if not verdict.allowed:
+            raise HTTPException(status_code=400, detail=f"Invalid command: {verdict.reason}")
         
-        # Generate command ID
-        command_id = str(uuid.uuid4())
+        accept = request.headers.get("Accept", "")
+        for media_type in ("text/event-stream", "application/x-ndjson"):
+            if media_type in accept:
+                # Refused up front; once streaming starts the status can't change
+                await quotas.check(api_key)
+                return stream_execution(command_req, media_type, api_key)
         
-        # Execute command
-        result = kali_service.execute_command(
-            command_req.command, 
-            session_id=command_id,
-            timeout=command_req.timeout
+        # Allowlisted read-only commands may be served from the result cache
+        bypass = (
+            request.headers.get("X-Cache-Bypass") == "1"
+            or "no-cache" in request.headers.get("Cache-Control", "")
         )
-        
-        return {
-            "command_id": command_id,
-            "command": command_req.command,
-            "stdout": result["stdout"],
-            "stderr": result["stderr"],
-            "success": result["success"],
-            "execution_time": result["execution_time"]
-        }
+        result, cache_status = await result_cache.run(
+            command_req.command,
+            kali_service.name,
+            lambda: run_command(command_req.command, command_req.timeout, api_key=api_key),
+            bypass=bypass,
+            admit=lambda: quotas.check(api_key)
+        )
+        response.headers["X-Cache"] = cache_status
+        return result
     except HTTPException:
         raise
+    except QuotaExceededError as e:
+        raise quota_error(e)
     except Exception as e:
         logger.error(f"Error executing command: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error executing command: {str(e)}")
 
+# Batch execute endpoint
+@app.post("/execute/batch")
+async def execute_batch(
+    batch_req: BatchRequest,
+    request: Request,
+    api_key: str = Depends(get_api_key)
+):
+    """
+    Execute several commands concurrently, streaming each result as an NDJSON
+    line as soon as it finishes. Lines carry the command's `index` in the
+    request; rejected commands are reported first and never run. The last
+    line is a summary.
+    """
+    if not batch_req.commands:
+        raise HTTPException(status_code=400, detail="Batch must contain at least one command")
+    if len(batch_req.commands) > BATCH_MAX_COMMANDS:
+        raise HTTPException(status_code=400, detail=f"Batch exceeds {BATCH_MAX_COMMANDS} commands")
+
+    concurrency = max(1, min(batch_req.concurrency or BATCH_MAX_CONCURRENCY, BATCH_MAX_CONCURRENCY))
+    bypass = (
+        request.headers.get("X-Cache-Bypass") == "1"
+        or "no-cache" in request.headers.get("Cache-Control", "")
+    )
+    verdicts = validate_many(command_req.command for command_req in batch_req.commands)
+    command_ids = [str(uuid.uuid4()) for _ in batch_req.commands]
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_one(index: int, command_req: CommandRequest) -> Dict[str, Any]:
+        async with semaphore:
+            try:
+                result, cache_status = await result_cache.run(
+                    command_req.command,
+                    kali_service.name,
+                    lambda: run_command(
+                        command_req.command, command_req.timeout, command_ids[index], api_key=api_key, source="batch"
+                    ),
+                    bypass=bypass,
+                    admit=lambda: quotas.check(api_key)
+                )
+                return {"index": index, "cache": cache_status, **result}
+            except Exception as e:
+                logger.error(f"Error executing batch command: {str(e)}")
+                return {"index": index, "command": command_req.command, "success": False, "error": str(e)}
+
+    async def generate():
+        start_time = time.time()
+        counts = {"succeeded": 0, "failed": 0, "rejected": 0}
+        tasks: Dict[int, asyncio.Future] = {}
+        try:
+            for index, (command_req, verdict) in enumerate(zip(batch_req.commands, verdicts)):
+                if verdict.allowed:
+                    tasks[index] = asyncio.ensure_future(run_one(index, command_req))
+                    continue
+                counts["rejected"] += 1
+                yield json.dumps({
+                    "index": index,
+                    "command": command_req.command,
+                    "success": False,
+                    "error": f"Invalid command: {verdict.reason}"
+                }) + "\n"
+
+            for finished in asyncio.as_completed(list(tasks.values())):
+                result = await finished
+                counts["succeeded" if result["success"] else "failed"] += 1
+                yield json.dumps(result) + "\n"
+
+            yield json.dumps({
+                "summary": {
+                    "total": len(batch_req.commands),
+                    **counts,
+                    "execution_time": time.time() - start_time
+                }
+            }) + "\n"
+        finally:
+            # Client went away: stop waiting. The result cache stops an execution
+            # on Kali once no other request is waiting on it.
+            for task in tasks.values():
+                task.cancel()
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+# Execution history endpoints
+@app.get("/history")
+async def get_history(
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    success: Optional[bool] = None,
+    exit_code: Optional[int] = None,
+    tool: Optional[str] = None,
+    prefix: Optional[str] = None,
+    source: Optional[Literal["execute", "batch", "stream", "job", "session", "local"]] = None,
+    api_key: str = Depends(get_api_key)
+):
+    """
+    Commands run with this API key, newest first. `since`/`until` are Unix
+    timestamps; `tool` matches the executable name, `prefix` the start of
+    the command line. Pass `next_cursor` back as `cursor` for the next page.
+    """
+    try:
+        return await history_store.query(
+            api_key,
+            cursor=cursor,
+            limit=limit,
+            since=since,
+            until=until,
+            success=success,
+            exit_code=exit_code,
+            tool=tool,
+            prefix=prefix,
+            source=source
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/history/stats")
+async def get_history_stats(api_key: str = Depends(get_api_key)):
+    """Get history writer queue and retention counts"""
+    return history_store.stats()
+
+# Quota usage
+@app.get("/usage")
+async def get_usage(api_key: str = Depends(get_api_key)):
+    """Running commands and CPU seconds used by this API key, with its quotas and per-command limits"""
+    return {
+        **await quotas.usage(api_key),
+        "command_limits": kali_service.limits.to_dict()
+    }
+
+# Result cache statistics
+@app.get("/cache/stats")
+async def get_cache_stats(api_key: str = Depends(get_api_key)):
+    """Get result cache hit/miss counts"""
+    return result_cache.stats()
+
+# Background job endpoints
+@app.post("/jobs", status_code=202)
+async def submit_job(job_req: JobRequest, api_key: str = Depends(get_api_key)):
+    """Queue a command for background execution and return its job ID"""
+    verdict = validate_command(job_req.command)
+    if not verdict.allowed:
+        raise HTTPException(status_code=400, detail=f"Invalid command: {verdict.reason}")
+
+    try:
+        job = await job_queue.submit(
+            job_req.command,
+            timeout=job_req.timeout,
+            priority=job_req.priority,
+            owner=api_key
+        )
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "30"})
+    except QuotaExceededError as e:
+        raise quota_error(e)
+    await claim_resource(job.job_id)
+
+    return {"job_id": job.job_id, "status": job.status, "priority": job.priority}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, api_key: str = Depends(get_api_key)):
+    """Get the status and result of a background job"""
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return job.to_dict()
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str, api_key: str = Depends(get_api_key)):
+    """Cancel a queued or running background job"""
+    job = job_queue.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return job.to_dict()
+
+# Shell session endpoints
+@app.post("/sessions", status_code=201)
+async def open_session(api_key: str = Depends(get_api_key)):
+    """Open a persistent shell; commands run in it keep their cwd and environment"""
+    try:
+        session = await kali_service.run_blocking(kali_service.open_session)
+    except SessionLimitError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "30"})
+    except KaliConnectionError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    await claim_resource(session["session_id"])
+    return session
+
+@app.get("/sessions")
+async def list_sessions(api_key: str = Depends(get_api_key)):
+    """List the shell sessions open on this worker"""
+    return {"sessions": kali_service.list_sessions(), "max_sessions": kali_service.shell_max_sessions}
+
+@app.get("/sessions/{session_id}")
+async def get_session(session_id: str, api_key: str = Depends(get_api_key)):
+    """Get the state of a shell session"""
+    try:
+        return kali_service.get_session(session_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Session not found: {session_id}")
+
+@app.post("/sessions/{session_id}/execute", response_model=CommandResponse)
+async def execute_in_session(session_id: str, command_req: CommandRequest, api_key: str = Depends(get_api_key)):
+    """Run a command in a shell session, after any earlier commands in it finish"""
+    with timing.phase("validate"):
+        verdict = validate_command(command_req.command)
+    if not verdict.allowed:
+        raise HTTPException(status_code=400, detail=f"Invalid command: {verdict.reason}")
+    try:
+        kali_service.get_session(session_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Session not found: {session_id}")
+
+    try:
+        # Results depend on the session's state, so the result cache is skipped
+        return await run_command(
+            command_req.command,
+            command_req.timeout,
+            api_key=api_key,
+            source="session",
+            session_id=session_id
+        )
+    except QuotaExceededError as e:
+        raise quota_error(e)
+    except KaliConnectionError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error executing command in session {session_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error executing command: {str(e)}")
+
+@app.delete("/sessions/{session_id}")
+async def close_session(session_id: str, api_key: str = Depends(get_api_key)):
+    """Close a shell session, stopping any command running in it"""
+    if not await kali_service.run_blocking(kali_service.close_session, session_id):
+        raise HTTPException(status_code=404, detail=f"Session not found: {session_id}")
+    await release_resource(session_id)
+    return {"session_id": session_id, "closed": True}
+
+# Stored output endpoint
+@app.get("/outputs/{output_id}")
+async def get_output(
+    output_id: str,
+    stream: Literal["stdout", "stderr"] = "stdout",
+    unit: Literal["bytes", "lines"] = "bytes",
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1),
+    api_key: str = Depends(get_api_key)
+):
+    """Get a byte or line range of a stored command output"""
+    capture = output_store.get(output_id)
+    if capture is None:
+        raise HTTPException(status_code=404, detail=f"Output not found: {output_id}")
+
+    output = capture.streams[stream]
+    if unit == "bytes":
+        limit = min(limit or 1024 * 1024, 16 * 1024 * 1024)
+        chunks = output.read_bytes(offset, limit)
+    else:
+        limit = min(limit or 1000, 100000)
+        chunks = output.read_lines(offset, limit)
+
+    return StreamingResponse(
+        chunks,
+        media_type="text/plain; charset=utf-8",
+        headers={
+            "X-Output-Total-Bytes": str(output.size),
+            "X-Output-Total-Lines": str(output.lines)
+        }
+    )
+
 # Execute local command (native binary wrapper)
 @app.post("/execute/local")
-async def execute_local_command(command_req: CommandRequest, api_key: str = Depends(get_api_key)):
-    """Execute a command locally through the native binary wrapper"""
+async def execute_local_command(command_req: CommandRequest, request: Request, api_key: str = Depends(get_api_key)):
+    """Execute a command locally through the native binary wrapper; a client disconnect kills it"""
     try:
         # Validate command
-        if not is_command_safe(command_req.command):
-            error_msg = get_validation_error(command_req.command)
-            raise HTTPException(status_code=400, detail=f"Invalid command: {error_msg}")
+        verdict = validate_command(command_req.command)
+        if not verdict.allowed:
+            raise HTTPException(status_code=400, detail=f"Invalid command: {verdict.reason}")
         
-        # Execute command locally
-        start_time = time.time()
-        
-        try:
-            # Create a temporary file to store the command
-            with tempfile.NamedTemporaryFile(mode='w+', delete=False) as temp:
-                temp.write(command_req.command)
-                temp_path = temp.name
-            
-            # Execute through autopwn-runner binary
-            process = subprocess.Popen(
-                ["./binaries/autopwn-runner", temp_path],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
-            
-            stdout, stderr = process.communicate(timeout=command_req.timeout)
-            
-            # Remove the temporary file
-            os.unlink(temp_path)
-            
-            return {
-                "command_id": str(uuid.uuid4()),
-                "command": command_req.command,
-                "stdout": stdout,
-                "stderr": stderr,
-                "success": process.returncode == 0,
-                "execution_time": time.time() - start_time
-            }
-            
-        except subprocess.TimeoutExpired:
-            return {
-                "command_id": str(uuid.uuid4()),
-                "command": command_req.command,
-                "stdout": "",
-                "stderr": "Command execution timed out",
-                "success": False,
-                "execution_time": time.time() - start_time
-            }
-            
+        # Execute command locally through the autopwn-runner binary
+        async with quotas.reserve(api_key) as reservation:
+            # The runner's CPU time isn't measured, so it is charged wall time
+            start_time = time.time()
+            result = None
+            try:
+                result = await cancel_on_disconnect(
+                    request, local_runner.run(command_req.command, timeout=command_req.timeout)
+                )
+            finally:
+                reservation.cpu_seconds = result["execution_time"] if result else time.time() - start_time
+
+        command_id = str(uuid.uuid4())
+        history_store.record(
+            command_req.command,
+            "local",
+            result["success"],
+            api_key=api_key,
+            command_id=command_id,
+            exit_code=result.get("exit_code"),
+            execution_time=result["execution_time"],
+            stdout_size=len(result["stdout"].encode()),
+            stderr_size=len(result["stderr"].encode())
+        )
+        return {
+            "command_id": command_id,
+            "command": command_req.command,
+            "stdout": result["stdout"],
+            "stderr": result["stderr"],
+            "success": result["success"],
+            "execution_time": result["execution_time"],
+            "queue_time": result["queue_time"],
+            "limit_exceeded": result["limit_exceeded"]
+        }
+
+    except HTTPException:
+        raise
+    except QuotaExceededError as e:
+        raise quota_error(e)
+    except ClientDisconnect:
+        logger.info(f"Client disconnected, stopped local command: {command_req.command}")
+        return Response(status_code=499)
     except Exception as e:
         logger.error(f"Error executing local command: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error executing local command: {str(e)}")
@@ -241,37 +852,61 @@ async def execute_local_command(command_req: CommandRequest, api_key: str = Depe
 # WebSocket endpoint for streaming command output
 @app.websocket("/ws/execute/{command_id}")
 async def websocket_execute(websocket: WebSocket, command_id: str):
+    # Browsers can't set headers on a WebSocket, so the key may also come as ?api_key=
+    api_key = websocket.headers.get("X-API-Key") or websocket.query_params.get("api_key")
+    if api_key != API_KEY:
+        logger.warning(f"Rejected WebSocket with invalid API key: {(api_key or '')[:5]}...")
+        await websocket.close(code=1008)  # Policy violation
+        return
+
     await websocket.accept()
+    subscriber = None
+    WEBSOCKET_STREAMS.inc()
     
     try:
         # Get command details from websocket
         data = await websocket.receive_json()
         
-        # Validate command
         cmd = data.get("command", "")
         timeout = data.get("timeout", 300)
         
-        if not is_command_safe(cmd):
-            error_msg = get_validation_error(cmd)
-            await websocket.send_json({"type": "error", "message": f"Invalid command: {error_msg}"})
+        # Clients may attach to a command that is already running, here or on another worker
+        if stream_hub.get(command_id) is None and worker_router is not None:
+            address = await worker_router.owner_address(command_id)
+            if address is not None:
+                await relay_websocket(websocket, address, command_id)
+                return
+
+        if stream_hub.get(command_id) is None:
+            verdict = validate_command(cmd)
+            if not verdict.allowed:
+                await websocket.send_json({"type": "error", "message": f"Invalid command: {verdict.reason}"})
+                await websocket.close()
+                return
+        
+        try:
+            subscriber = stream_hub.subscribe(command_id, cmd, timeout, data.get("overflow"), owner=api_key)
+        except ValueError as e:
+            await websocket.send_json({"type": "error", "message": str(e)})
             await websocket.close()
             return
+        await claim_resource(command_id)
         
-        # Callback for streaming results
-        async def send_output(output):
-            await websocket.send_json(output)
+        # Notice disconnects even while the command is quiet
+        async def watch_disconnect():
+            while (await websocket.receive())["type"] != "websocket.disconnect":
+                pass
+            subscriber.close()
+        watcher = asyncio.create_task(watch_disconnect())
         
-        # Execute command with streaming
-        await kali_service.stream_command(
-            cmd, 
-            send_output, 
-            session_id=command_id,
-            timeout=timeout
-        )
+        try:
+            while (frame := await subscriber.get()) is not None:
+                await websocket.send_json(frame)
+        finally:
+            watcher.cancel()
         
     except WebSocketDisconnect:
         logger.info(f"WebSocket disconnected for command {command_id}")
-        kali_service.close_session(command_id)
     except Exception as e:
         logger.error(f"WebSocket error: {str(e)}")
         try:
@@ -279,43 +914,274 @@ async def websocket_execute(websocket: WebSocket, command_id: str):
             await websocket.close()
         except:
             pass
-        kali_service.close_session(command_id)
+    finally:
+        WEBSOCKET_STREAMS.dec()
+        if subscriber is not None:
+            stream_hub.unsubscribe(command_id, subscriber)
+
+async def relay_websocket(websocket: WebSocket, address: str, command_id: str):
+    """Send a WebSocket client the frames of a stream running on another worker"""
+    async def relay():
+        async for frame in worker_router.relay_stream(address, command_id):
+            await websocket.send_json(frame)
+
+    async def watch_disconnect():
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+
+    tasks = [asyncio.create_task(relay()), asyncio.create_task(watch_disconnect())]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+    if tasks[0] in done:
+        tasks[0].result()
+        await websocket.close()
+
+@app.get("/internal/streams/{command_id}", include_in_schema=False)
+async def internal_stream(command_id: str, request: Request):
+    """NDJSON frames of a running stream, for relaying by other workers; internal listener only"""
+    if not is_internal(request) or stream_hub.get(command_id) is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    subscriber = stream_hub.subscribe(command_id, "", None)
+
+    async def generate():
+        try:
+            while (frame := await subscriber.get()) is not None:
+                yield json.dumps(frame) + "\n"
+        finally:
+            stream_hub.unsubscribe(command_id, subscriber)
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
 
 # File operations endpoints
+def _file_error(e: OSError, path: str) -> HTTPException:
+    if isinstance(e, FileNotFoundError):
+        return HTTPException(status_code=404, detail=f"Path not found: {path}")
+    if isinstance(e, PermissionError):
+        return HTTPException(status_code=403, detail=f"Permission denied: {path}")
+    if isinstance(e, NotADirectoryError):
+        return HTTPException(status_code=400, detail=f"Not a directory: {path}")
+    return HTTPException(status_code=500, detail=str(e))
+
 @app.get("/files")
-async def list_files(path: str = "", api_key: str = Depends(get_api_key)):
-    """List files in the workspace directory"""
+async def list_files(
+    path: str = "",
+    sort: Literal["name", "size", "mtime", "type"] = "name",
+    order: Literal["asc", "desc"] = "asc",
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    fresh: bool = False,
+    api_key: str = Depends(get_api_key)
+):
+    """List files in the workspace directory, one page at a time"""
     try:
-        workspace = os.getenv("KALI_WORKSPACE", "/home/kaliuser/workspace")
-        target_path = workspace
-        
-        if path:
-            # Prevent directory traversal
-            if ".." in path:
-                raise HTTPException(status_code=400, detail="Path cannot contain '..'")
-            
-            # Ensure path is within workspace
-            target_path = os.path.join(workspace, path.lstrip('/'))
-        
-        # List files
-        result = kali_service.execute_command(f"ls -la {target_path}")
-        
-        if not result["success"]:
-            raise HTTPException(status_code=500, detail=f"Failed to list files: {result['stderr']}")
-        
-        return {
-            "path": path,
-            "listing": result["stdout"]
-        }
-    except HTTPException:
-        raise
+        return await workspace.list_page(path, sort, order, cursor, limit, fresh=fresh)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except OSError as e:
+        raise _file_error(e, path)
     except Exception as e:
         logger.error(f"Error listing files: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/files/walk")
+async def walk_files(
+    path: str = "",
+    max_depth: Optional[int] = Query(None, ge=0),
+    api_key: str = Depends(get_api_key)
+):
+    """Stream every entry under a workspace directory as NDJSON"""
+    try:
+        workspace.resolve(path)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def generate():
+        async for entry in workspace.walk(path, max_depth):
+            yield json.dumps(entry) + "\n"
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+@app.get("/files/download")
+async def download_file(request: Request, path: str, api_key: str = Depends(get_api_key)):
+    """Stream a workspace file, honouring single-range Range requests"""
+    try:
+        info = await file_transfer.stat(path)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except IsADirectoryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except OSError as e:
+        raise _file_error(e, path)
+
+    size = info["size"]
+    etag = f'W/"{size:x}-{int(info["mtime"]):x}"'
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": etag,
+        "Content-Disposition": f"attachment; filename*=UTF-8''{quote(posixpath.basename(info['remote_path']))}",
+    }
+
+    # size-mtime is only a weak validator, so any If-Range gets the full body
+    range_header = request.headers.get("range")
+    if not if_range_matches(request.headers.get("if-range"), etag):
+        range_header = None
+
+    try:
+        byte_range = parse_range(range_header, size)
+    except RangeNotSatisfiable:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+
+    status_code = 200
+    start, end = 0, size - 1
+    if byte_range is not None:
+        start, end = byte_range
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+
+    return StreamingResponse(
+        file_transfer.read_range(info["remote_path"], start, end),
+        status_code=status_code,
+        media_type="application/octet-stream",
+        headers=headers
+    )
+
+@app.get("/files/checksum")
+async def file_checksum(path: str, api_key: str = Depends(get_api_key)):
+    """SHA-256 of a workspace file, computed on the Kali host"""
+    try:
+        return {"path": path, "sha256": await file_transfer.checksum(path)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except OSError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+def _upload_error(e: UploadError) -> HTTPException:
+    headers = {"Upload-Offset": str(e.offset)} if e.offset is not None else None
+    return HTTPException(status_code=e.status_code, detail=str(e), headers=headers)
+
+@app.post("/files/uploads", status_code=201)
+async def create_upload(upload_req: UploadRequest, api_key: str = Depends(get_api_key)):
+    """Start a resumable upload; send the data with PUT /files/uploads/{upload_id}"""
+    try:
+        upload = await file_transfer.create_upload(upload_req.path, upload_req.size, upload_req.sha256)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except OSError as e:
+        raise _file_error(e, upload_req.path)
+    await claim_resource(upload.upload_id)
+    return {**upload.to_dict(), "chunk_size": file_transfer.write_chunk_bytes}
+
+@app.get("/files/uploads/{upload_id}")
+async def get_upload(upload_id: str, response: Response, api_key: str = Depends(get_api_key)):
+    """Current state of an upload; resume sending from `offset`"""
+    upload = file_transfer.get_upload(upload_id)
+    if upload is None:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    response.headers["Upload-Offset"] = str(upload.offset)
+    return upload.to_dict()
+
+@app.put("/files/uploads/{upload_id}")
+async def append_upload(upload_id: str, request: Request, response: Response, api_key: str = Depends(get_api_key)):
+    """Append the request body at the offset given in the Upload-Offset header"""
+    try:
+        offset = int(request.headers.get("upload-offset", "0"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid Upload-Offset header")
+
+    try:
+        upload = await file_transfer.append(upload_id, offset, request.stream())
+    except UploadError as e:
+        raise _upload_error(e)
+    except ClientDisconnect:
+        logger.info(f"Client disconnected during upload {upload_id}")
+        return Response(status_code=400)
+    except OSError as e:
+        logger.error(f"Upload {upload_id} failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    response.headers["Upload-Offset"] = str(upload.offset)
+    return upload.to_dict()
+
+@app.post("/files/uploads/{upload_id}/complete")
+async def complete_upload(
+    upload_id: str,
+    complete_req: Optional[UploadCompleteRequest] = None,
+    api_key: str = Depends(get_api_key)
+):
+    """Verify size and checksum and move the upload into place"""
+    try:
+        return await file_transfer.complete(upload_id, complete_req.sha256 if complete_req else None)
+    except UploadError as e:
+        raise _upload_error(e)
+    except OSError as e:
+        logger.error(f"Failed to complete upload {upload_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.delete("/files/uploads/{upload_id}")
+async def abort_upload(upload_id: str, api_key: str = Depends(get_api_key)):
+    """Abort an upload and discard its data"""
+    if not await file_transfer.abort(upload_id):
+        raise HTTPException(status_code=404, detail="Upload not found")
+    await release_resource(upload_id)
+    return {"upload_id": upload_id, "status": "aborted"}
+
+# Artifact downloads
+async def serve_artifact(request: Request, name: str, filename: str, not_found: str) -> Response:
+    """
+    Serve a downloadable artifact from the manifest: strong ETag, 304 on
+    If-None-Match, single-range requests, and a precompressed variant when
+    the client accepts one.
+    """
+    artifact = await artifact_store.get(name)
+    if artifact is None:
+        raise HTTPException(status_code=404, detail=not_found)
+
+    representation = artifact.select(request.headers.get("accept-encoding"))
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": representation.etag,
+        "Last-Modified": formatdate(artifact.mtime, usegmt=True),
+        "Cache-Control": "private, no-cache",
+        "Vary": "Accept-Encoding",
+        "Content-Disposition": f"attachment; filename*=UTF-8''{quote(filename)}",
+    }
+    if representation.encoding:
+        headers["Content-Encoding"] = representation.encoding
+
+    if etag_matches(request.headers.get("if-none-match"), representation.etag):
+        return Response(status_code=304, headers=headers)
+
+    # Ranges address the selected encoding; a stale If-Range means send everything
+    size = representation.size
+    range_header = request.headers.get("range")
+    if not if_range_matches(request.headers.get("if-range"), representation.etag):
+        range_header = None
+
+    try:
+        byte_range = parse_range(range_header, size)
+    except RangeNotSatisfiable:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+
+    status_code = 200
+    start, end = 0, size - 1
+    if byte_range is not None:
+        start, end = byte_range
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+    return ArtifactResponse(representation.path, start, end - start + 1, status_code=status_code, headers=headers)
+
+@app.get("/download/manifest")
+async def download_manifest(api_key: str = Depends(get_api_key)):
+    """Size, SHA-256 and available encodings of every downloadable artifact"""
+    return {"artifacts": artifact_store.manifest()}
+
 # Download binary executables
 @app.get("/download/binary/{platform}")
-async def download_binary(platform: str, api_key: str = Depends(get_api_key)):
+async def download_binary(platform: str, request: Request, api_key: str = Depends(get_api_key)):
     """Download the AutoPwn native binary for the specified platform"""
     valid_platforms = ["windows", "linux", "macos"]
     if platform not in valid_platforms:
@@ -328,20 +1194,16 @@ async def download_binary(platform: str, api_key: str = Depends(get_api_key)):
         "macos": "autopwn-runner-mac"
     }
     
-    file_path = f"binaries/{platform}/{file_map[platform]}"
-    
-    if not os.path.exists(file_path):
-        raise HTTPException(status_code=404, detail=f"Binary not found for platform: {platform}")
-    
-    return FileResponse(
-        path=file_path,
-        filename=file_map[platform],
-        media_type="application/octet-stream"
+    return await serve_artifact(
+        request,
+        f"binaries/{platform}/{file_map[platform]}",
+        file_map[platform],
+        f"Binary not found for platform: {platform}"
     )
 
 # Get proxy setup script
 @app.get("/download/proxy-setup/{platform}")
-async def download_proxy_setup(platform: str, api_key: str = Depends(get_api_key)):
+async def download_proxy_setup(platform: str, request: Request, api_key: str = Depends(get_api_key)):
     """Download the proxy setup script for the specified platform"""
     valid_platforms = ["windows", "linux", "macos"]
     if platform not in valid_platforms:
@@ -354,15 +1216,11 @@ async def download_proxy_setup(platform: str, api_key: str = Depends(get_api_key
         "macos": "setup-proxy.sh"
     }
     
-    file_path = f"scripts/{platform}/{file_map[platform]}"
-    
-    if not os.path.exists(file_path):
-        raise HTTPException(status_code=404, detail=f"Setup script not found for platform: {platform}")
-    
-    return FileResponse(
-        path=file_path,
-        filename=file_map[platform],
-        media_type="application/octet-stream"
+    return await serve_artifact(
+        request,
+        f"scripts/{platform}/{file_map[platform]}",
+        file_map[platform],
+        f"Setup script not found for platform: {platform}"
     )
 
 # Generate proxy configuration
@@ -419,7 +1277,7 @@ async def start_proxy(config: ProxyConfig, api_key: str = Depends(get_api_key)):
 
 # GUI App download
 @app.get("/download/gui/{platform}")
-async def download_gui(platform: str, api_key: str = Depends(get_api_key)):
+async def download_gui(platform: str, request: Request, api_key: str = Depends(get_api_key)):
     """Download the AutoPwn GUI app for the specified platform"""
     valid_platforms = ["windows", "linux", "macos"]
     if platform not in valid_platforms:
@@ -432,31 +1290,94 @@ async def download_gui(platform: str, api_key: str = Depends(get_api_key)):
         "macos": "AutoPwnService.app.zip"
     }
     
-    file_path = f"gui/{platform}/{file_map[platform]}"
-    
-    if not os.path.exists(file_path):
-        raise HTTPException(status_code=404, detail=f"GUI app not found for platform: {platform}")
-    
-    return FileResponse(
-        path=file_path,
-        filename=file_map[platform],
-        media_type="application/octet-stream"
+    return await serve_artifact(
+        request,
+        f"gui/{platform}/{file_map[platform]}",
+        file_map[platform],
+        f"GUI app not found for platform: {platform}"
     )
 
-# Health check endpoint
+# Health check endpoints
 @app.get("/health")
 async def health_check():
-    """Health check endpoint"""
+    """Health check endpoint, answered from the latest background probe"""
+    await health_prober.ensure_probed()
+    if health_prober.consecutive_failures == 0:
+        return {"status": "healthy", "kali_connection": True}
+    return {"status": "unhealthy", "kali_connection": False, "error": health_prober.last_error}
+
+@app.get("/health/live")
+async def liveness_check():
+    """Liveness: the process is up and serving requests"""
+    return {"status": "alive", "uptime": round(time.time() - health_prober.started_at, 3)}
+
+@app.get("/health/ready")
+async def readiness_check(history: bool = True):
+    """Readiness: cached Kali probe state; 503 until a probe succeeds or after repeated failures"""
+    snapshot = health_prober.snapshot(include_history=history)
+    return JSONResponse(status_code=200 if snapshot["ready"] else 503, content=snapshot)
+
+@app.get("/health/startup")
+async def startup_report():
+    """Per-phase startup timing and whether warmup has finished"""
+    return startup_timer.report()
+
+# Debug endpoints
+@app.get("/debug/profile")
+async def profile_process(
+    seconds: float = Query(5, ge=1, le=60),
+    interval: float = Query(0.005, ge=0.001, le=1),
+    admin_key: str = Depends(get_admin_key)
+):
+    """
+    Sample every thread's stack for `seconds` and return collapsed stacks
+    (one "frame;frame;... count" line per stack) for flamegraph tools
+    """
     try:
-        # Test connection to Kali
-        result = kali_service.execute_command("echo 'health_check'")
-        if result["success"]:
-            return {"status": "healthy", "kali_connection": True}
-        else:
-            return {"status": "unhealthy", "kali_connection": False, "error": result["stderr"]}
-    except Exception as e:
-        logger.error(f"Health check failed: {str(e)}")
-        return {"status": "unhealthy", "kali_connection": False, "error": str(e)}
+        stacks = await profiler.profile(seconds, interval)
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return Response(content=stacks, media_type="text/plain")
+
+# Worker endpoints
+@app.get("/workers")
+async def worker_info(api_key: str = Depends(get_api_key)):
+    """This worker's identity, forwarding counters and shared-state backend"""
+    if worker_router is None:
+        return {"worker_id": None, "backend": "memory", "pid": os.getpid()}
+    return {**await worker_router.stats(), "pid": os.getpid()}
+
+# Backend endpoints
+@app.get("/backends")
+async def list_backends(api_key: str = Depends(get_api_key)):
+    """Per-host pool, load and health state for every Kali backend"""
+    stats = kali_service.get_stats()
+    return {"routing_policy": stats["routing_policy"], "backends": stats["backends"]}
+
+@app.post("/backends/{name}/drain")
+async def drain_backend(name: str, admin_key: str = Depends(get_admin_key)):
+    """Stop routing new commands to a backend; pinned sessions keep running there"""
+    try:
+        return kali_service.drain(name)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown backend: {name}")
+
+@app.post("/backends/{name}/activate")
+async def activate_backend(name: str, admin_key: str = Depends(get_admin_key)):
+    """Return a drained or ejected backend to service"""
+    try:
+        return kali_service.activate(name)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown backend: {name}")
+
+# Metrics endpoint
+@app.get("/metrics")
+async def get_metrics(api_key: Optional[str] = Depends(get_metrics_key)):
+    """
+    Service metrics in the Prometheus text format. Send X-API-Key, or set
+    METRICS_PUBLIC=true to allow anonymous scraping.
+    """
+    return Response(registry.render(), media_type="text/plain; version=0.0.4")
 
 # Error handler
 @app.exception_handler(Exception)
@@ -467,18 +1388,56 @@ async def global_exception_handler(request: Request, exc: Exception):
         content={"detail": f"Internal server error: {str(exc)}"}
     )
 
+async def warm_up():
+    """Pre-open SSH connections in parallel and run the first health probe"""
+    try:
+        start = time.perf_counter()
+        opened = await kali_service.warm()
+        startup_timer.record("ssh_warmup", time.perf_counter() - start)
+        logger.info(f"Warmed {opened} SSH connection(s)")
+
+        start = time.perf_counter()
+        await health_prober.probe()
+        startup_timer.record("first_probe", time.perf_counter() - start)
+    except Exception as e:
+        logger.error(f"Startup warmup failed: {str(e)}")
+    finally:
+        health_prober.end_warmup()
+        startup_timer.ready()
+
 # Startup event
 @app.on_event("startup")
 async def startup_event():
     logger.info("AutoPwn Service starting up...")
-    # You can initialize resources here if needed
+    startup_timer.mark("server_start")
+    app.state.rate_limit_sweeper = asyncio.create_task(rate_limiter.run_sweeper())
+    app.state.tool_refresher = asyncio.create_task(tool_inventory.run_refresher())
+    app.state.health_prober = asyncio.create_task(health_prober.run_prober())
+    # Readiness is held until SSH connections are warm and the first probe has run
+    health_prober.begin_warmup()
+    app.state.warmup = asyncio.create_task(warm_up())
+    # Hash artifacts in the background; downloads before it finishes hash on demand
+    app.state.artifact_manifest = asyncio.get_running_loop().run_in_executor(None, artifact_store.build_manifest)
+    history_store.start()
+    job_queue.start()
+    if worker_router is not None:
+        await worker_router.start()
 
 # Shutdown event
 @app.on_event("shutdown")
-def shutdown_event():
-    """Close all SSH sessions on shutdown"""
+async def shutdown_event():
+    """Close all SSH sessions and pooled connections on shutdown"""
     logger.info("AutoPwn Service shutting down...")
-    kali_service.close_all_sessions()
+    app.state.warmup.cancel()
+    app.state.rate_limit_sweeper.cancel()
+    app.state.tool_refresher.cancel()
+    app.state.health_prober.cancel()
+    if worker_router is not None:
+        await worker_router.stop()
+    await job_queue.stop()
+    output_store.clear()
+    history_store.close()
+    kali_service.shutdown()
 
 # Run the app if executed directly
 if __name__ == "__main__":
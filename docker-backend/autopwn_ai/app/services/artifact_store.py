@@ -0,0 +1,307 @@
+from typing import Any, Dict, List, Optional, Tuple
+from dataclasses import dataclass, field
+import os
+import gzip
+import shutil
+import asyncio
+import hashlib
+import anyio
+from loguru import logger
+from starlette.background import BackgroundTask
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+# =====================================
+# Artifact Store Configuration
+# =====================================
+
+# Directories whose files are served as downloadable artifacts
+ARTIFACT_ROOTS = ("binaries", "scripts", "gui")
+
+# Content codings we can serve precompressed, in order of preference,
+# and the file suffix of each variant
+ENCODINGS = ("br", "gzip")
+ENCODING_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+HASH_CHUNK_SIZE = 1024 * 1024
+SEND_CHUNK_SIZE = 256 * 1024
+
+# A generated gzip variant is kept only if it is at most this fraction of the original
+MAX_COMPRESSION_RATIO = 0.9
+
+
+@dataclass
+class Representation:
+    """One encoding of an artifact as stored on disk"""
+    path: str
+    size: int
+    sha256: str
+    encoding: Optional[str] = None
+
+    @property
+    def etag(self) -> str:
+        # Strong validator: content hash, plus the coding for encoded variants
+        suffix = f"-{self.encoding}" if self.encoding else ""
+        return f'"{self.sha256[:32]}{suffix}"'
+
+
+@dataclass
+class Artifact:
+    name: str
+    path: str
+    mtime: float
+    identity: Representation
+    variants: Dict[str, Representation] = field(default_factory=dict)
+    # (mtime_ns, size) of the source when it was hashed, to notice replacements
+    signature: Tuple[int, int] = (0, 0)
+
+    def select(self, accept_encoding: Optional[str]) -> Representation:
+        encoding = negotiate_encoding(accept_encoding, self.variants)
+        return self.variants[encoding] if encoding else self.identity
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "size": self.identity.size,
+            "sha256": self.identity.sha256,
+            "etag": self.identity.etag,
+            "mtime": self.mtime,
+            "encodings": {encoding: rep.size for encoding, rep in self.variants.items()},
+        }
+
+
+def negotiate_encoding(accept_encoding: Optional[str], available: Dict[str, Any]) -> Optional[str]:
+    """
+    Pick the best available content coding for an Accept-Encoding header.
+    Returns None for identity.
+    """
+    if not accept_encoding or not available:
+        return None
+    weights: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[coding.strip().lower()] = weight
+
+    best, best_weight = None, 0.0
+    for encoding in ENCODINGS:
+        if encoding not in available:
+            continue
+        weight = weights.get(encoding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+def _sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ArtifactStore:
+    """
+    Content-hash manifest of the downloadable artifacts (binaries, proxy
+    scripts, GUI builds). Files are hashed once, at startup or on first
+    request, and rehashed only when their mtime or size changes.
+    Precompressed `.br`/`.gz` siblings are picked up as variants; gzip
+    variants can also be generated into `cache_dir`, named by content hash
+    so they survive restarts.
+    """
+
+    def __init__(
+        self,
+        roots: Tuple[str, ...] = ARTIFACT_ROOTS,
+        cache_dir: Optional[str] = None,
+        precompress: Optional[bool] = None,
+        gzip_level: Optional[int] = None,
+    ):
+        self.roots = roots
+        self.cache_dir = cache_dir or os.getenv("ARTIFACT_CACHE_DIR", ".artifact-cache")
+        if precompress is None:
+            precompress = os.getenv("ARTIFACT_PRECOMPRESS", "true").lower() in ("1", "true", "yes")
+        self.precompress = precompress
+        self.gzip_level = gzip_level or int(os.getenv("ARTIFACT_GZIP_LEVEL", "9"))
+        self._artifacts: Dict[str, Artifact] = {}
+        self._loading: Dict[str, asyncio.Future] = {}
+
+    # ---------------------------------
+    # Manifest
+    # ---------------------------------
+    def _variant(self, path: str, sha256: str, size: int, mtime_ns: int, encoding: str) -> Optional[Representation]:
+        # A shipped sibling wins if it is at least as new as the source
+        sibling = path + ENCODING_SUFFIXES[encoding]
+        try:
+            sibling_stat = os.stat(sibling)
+            if sibling_stat.st_mtime_ns >= mtime_ns:
+                return Representation(sibling, sibling_stat.st_size, _sha256_file(sibling), encoding)
+        except FileNotFoundError:
+            pass
+
+        if encoding != "gzip" or not self.precompress:
+            return None
+        cached = os.path.join(self.cache_dir, sha256 + ENCODING_SUFFIXES[encoding])
+        if not os.path.exists(cached):
+            os.makedirs(self.cache_dir, exist_ok=True)
+            temp_path = f"{cached}.{os.getpid()}.tmp"
+            # mtime=0 keeps the output, and so its ETag, reproducible
+            with open(path, "rb") as source, open(temp_path, "wb") as raw, \
+                    gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=self.gzip_level, mtime=0) as target:
+                shutil.copyfileobj(source, target, HASH_CHUNK_SIZE)
+            os.replace(temp_path, cached)
+        compressed_size = os.path.getsize(cached)
+        if compressed_size > size * MAX_COMPRESSION_RATIO:
+            return None
+        return Representation(cached, compressed_size, _sha256_file(cached), encoding)
+
+    def _load(self, name: str) -> Optional[Artifact]:
+        """Hash an artifact and find or build its variants. Blocks."""
+        path = os.path.normpath(name)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            self._artifacts.pop(name, None)
+            return None
+
+        sha256 = _sha256_file(path)
+        variants = {}
+        for encoding in ENCODINGS:
+            try:
+                variant = self._variant(path, sha256, stat.st_size, stat.st_mtime_ns, encoding)
+            except OSError as e:
+                logger.warning(f"Could not prepare {encoding} variant of {name}: {str(e)}")
+                continue
+            if variant is not None:
+                variants[encoding] = variant
+
+        artifact = Artifact(
+            name=name,
+            path=path,
+            mtime=stat.st_mtime,
+            identity=Representation(path, stat.st_size, sha256),
+            variants=variants,
+            signature=(stat.st_mtime_ns, stat.st_size),
+        )
+        self._artifacts[name] = artifact
+        return artifact
+
+    def build_manifest(self) -> int:
+        """Hash every artifact under the roots. Blocks; returns the artifact count."""
+        count = 0
+        for root in self.roots:
+            for directory, _, files in os.walk(root):
+                for filename in files:
+                    if any(filename.endswith(suffix) for suffix in ENCODING_SUFFIXES.values()):
+                        continue
+                    name = os.path.join(directory, filename).replace(os.sep, "/")
+                    try:
+                        if self._load(name) is not None:
+                            count += 1
+                    except OSError as e:
+                        logger.warning(f"Could not index artifact {name}: {str(e)}")
+        logger.info(f"Artifact manifest built: {count} artifacts")
+        return count
+
+    def _is_current(self, artifact: Artifact) -> bool:
+        try:
+            stat = os.stat(artifact.path)
+        except FileNotFoundError:
+            return False
+        return (stat.st_mtime_ns, stat.st_size) == artifact.signature
+
+    async def get(self, name: str) -> Optional[Artifact]:
+        """Manifest entry for an artifact path, (re)hashing it if it changed"""
+        artifact = self._artifacts.get(name)
+        if artifact is not None and self._is_current(artifact):
+            return artifact
+
+        # Concurrent requests for a changed file share one rehash
+        loading = self._loading.get(name)
+        if loading is None:
+            loading = asyncio.get_running_loop().run_in_executor(None, self._load, name)
+            self._loading[name] = loading
+            loading.add_done_callback(lambda _: self._loading.pop(name, None))
+        return await asyncio.shield(loading)
+
+    def manifest(self) -> List[Dict[str, Any]]:
+        return [artifact.to_dict() for _, artifact in sorted(self._artifacts.items())]
+
+
+# =====================================
+# Artifact Response
+# =====================================
+
+
+class ArtifactResponse(Response):
+    """
+    Sends `length` bytes of a file starting at `offset`. Uses the ASGI
+    zero-copy extension when the server offers it, otherwise reads the file
+    in large chunks on a worker thread.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        offset: int,
+        length: int,
+        status_code: int = 200,
+        headers: Optional[Dict[str, str]] = None,
+        media_type: str = "application/octet-stream",
+        background: Optional[BackgroundTask] = None,
+    ):
+        self.path = path
+        self.offset = offset
+        self.length = length
+        self.status_code = status_code
+        self.media_type = media_type
+        self.background = background
+        self.init_headers({**(headers or {}), "content-length": str(length)})
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+
+        if self.length == 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        elif "http.response.zerocopy" in scope.get("extensions", {}):
+            file = await anyio.to_thread.run_sync(open, self.path, "rb")
+            try:
+                await send({
+                    "type": "http.response.zerocopy",
+                    "file": file,
+                    "offset": self.offset,
+                    "count": self.length,
+                    "more_body": False,
+                })
+            finally:
+                await anyio.to_thread.run_sync(file.close)
+        else:
+            def read_at(f, position: int, size: int) -> bytes:
+                f.seek(position)
+                return f.read(size)
+
+            file = await anyio.to_thread.run_sync(open, self.path, "rb")
+            try:
+                position, remaining = self.offset, self.length
+                while remaining > 0:
+                    chunk = await anyio.to_thread.run_sync(read_at, file, position, min(SEND_CHUNK_SIZE, remaining))
+                    if not chunk:
+                        break
+                    position += len(chunk)
+                    remaining -= len(chunk)
+                    await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+                if remaining > 0:
+                    # File shrank under us; end the body rather than hang the client
+                    await send({"type": "http.response.body", "body": b"", "more_body": False})
+            finally:
+                await anyio.to_thread.run_sync(file.close)
+
+        if self.background is not None:
+            await self.background()
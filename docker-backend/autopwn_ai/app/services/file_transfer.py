@@ -0,0 +1,332 @@
+from typing import Any, AsyncIterator, Dict, Optional
+from dataclasses import dataclass, field
+import os
+import stat
+import time
+import uuid
+import shlex
+import asyncio
+import hashlib
+import posixpath
+from loguru import logger
+
+# =====================================
+# Workspace File Transfers
+# =====================================
+
+
+class UploadError(Exception):
+    """Raised when an upload request cannot be applied; carries an HTTP status"""
+
+    def __init__(self, status_code: int, message: str, offset: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.offset = offset
+
+
+@dataclass
+class UploadSession:
+    upload_id: str
+    path: str
+    remote_path: str
+    temp_path: str
+    size: Optional[int] = None
+    sha256: Optional[str] = None
+    offset: int = 0
+    created_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+    busy: bool = False
+    hasher: Any = field(default_factory=hashlib.sha256)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "upload_id": self.upload_id,
+            "path": self.path,
+            "offset": self.offset,
+            "size": self.size,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+
+class FileTransferService:
+    """
+    Streams files between clients and the Kali workspace over SFTP.
+    Downloads are read in pipelined windows of `window_bytes`, with the next
+    window fetched while the current one is sent. Uploads are resumable
+    sessions: data is appended at the session offset, hashed as it is
+    written, and moved into place only after size and checksum are verified.
+    """
+
+    def __init__(
+        self,
+        kali_service: Any,
+        workspace: Any,
+        window_bytes: Optional[int] = None,
+        write_chunk_bytes: Optional[int] = None,
+        upload_ttl: Optional[float] = None,
+    ):
+        self.kali_service = kali_service
+        self.workspace = workspace
+        self.window_bytes = window_bytes or int(os.getenv("TRANSFER_WINDOW_BYTES", str(8 * 1024 * 1024)))
+        self.write_chunk_bytes = write_chunk_bytes or int(os.getenv("TRANSFER_WRITE_CHUNK_BYTES", str(1024 * 1024)))
+        self.upload_ttl = upload_ttl or float(os.getenv("UPLOAD_SESSION_TTL", "86400"))
+        self._uploads: Dict[str, UploadSession] = {}
+
+    # ---------------------------------
+    # Downloads
+    # ---------------------------------
+    async def stat(self, path: str) -> Dict[str, Any]:
+        """Size and mtime of a workspace file; raises IsADirectoryError for directories"""
+        remote_path = self.workspace.resolve(path)
+        attr = await self.kali_service.run_sftp(lambda sftp: sftp.stat(remote_path))
+        if attr.st_mode is not None and not stat.S_ISREG(attr.st_mode):
+            raise IsADirectoryError(f"Not a regular file: {path}")
+        return {"path": path, "remote_path": remote_path, "size": attr.st_size or 0, "mtime": attr.st_mtime or 0}
+
+    async def read_range(self, remote_path: str, start: int, end: int) -> AsyncIterator[bytes]:
+        """Yield bytes start..end (inclusive) of a remote file, one window at a time"""
+        session = None
+        handle = None
+
+        def open_file():
+            nonlocal session, handle
+            session = self.kali_service.acquire_sftp()
+            handle = session.client.open(remote_path, "rb")
+
+        def read_window(offset: int, length: int) -> bytes:
+            # One readv entry per SFTP request; a single large entry is read back slowly
+            request_size = handle.MAX_REQUEST_SIZE
+            return b"".join(handle.readv([
+                (position, min(request_size, offset + length - position))
+                for position in range(offset, offset + length, request_size)
+            ]))
+
+        # Executor call currently using the session, if any
+        pending = None
+        try:
+            pending = self.kali_service.run_blocking(open_file)
+            await pending
+            pending = None
+            offset = start
+            while offset <= end:
+                if pending is None:
+                    pending = self.kali_service.run_blocking(
+                        read_window, offset, min(self.window_bytes, end - offset + 1)
+                    )
+                data = await pending
+                pending = None
+                if not data:
+                    break
+                offset += len(data)
+                if offset <= end:
+                    # Fetch the next window while this one is being sent
+                    pending = self.kali_service.run_blocking(
+                        read_window, offset, min(self.window_bytes, end - offset + 1)
+                    )
+                yield data
+        finally:
+            # May run in a cancelled task, so clean up without awaiting
+            def cleanup():
+                if handle is not None:
+                    try:
+                        handle.close()
+                    except Exception:
+                        pass
+                if session is not None:
+                    self.kali_service.release_sftp(session)
+
+            def after_pending(future):
+                if not future.cancelled():
+                    future.exception()
+                self.kali_service.run_blocking(cleanup)
+
+            if pending is None:
+                self.kali_service.run_blocking(cleanup)
+            elif pending.done():
+                after_pending(pending)
+            else:
+                pending.add_done_callback(after_pending)
+
+    async def checksum(self, path: str) -> str:
+        """SHA-256 of a workspace file, computed on the Kali host"""
+        remote_path = self.workspace.resolve(path)
+        result = await self.kali_service.execute_command_async(f"sha256sum -- {shlex.quote(remote_path)}")
+        if not result["success"]:
+            raise OSError(result["stderr"].strip() or "sha256sum failed")
+        return result["stdout"].split()[0]
+
+    # ---------------------------------
+    # Uploads
+    # ---------------------------------
+    def _expire_uploads(self):
+        cutoff = time.time() - self.upload_ttl
+        for upload_id in [u.upload_id for u in self._uploads.values() if u.updated_at < cutoff and not u.busy]:
+            upload = self._uploads.pop(upload_id)
+            logger.info(f"Expiring abandoned upload {upload_id} for {upload.path}")
+            self.kali_service.run_blocking(self._remove_quietly, upload.temp_path)
+
+    def _remove_quietly(self, remote_path: str):
+        try:
+            with self.kali_service.sftp() as sftp:
+                sftp.remove(remote_path)
+        except Exception:
+            pass
+
+    def get_upload(self, upload_id: str) -> Optional[UploadSession]:
+        return self._uploads.get(upload_id)
+
+    async def create_upload(self, path: str, size: Optional[int] = None, sha256: Optional[str] = None) -> UploadSession:
+        """Start an upload to `path`; the parent directory must already exist"""
+        self._expire_uploads()
+        remote_path = self.workspace.resolve(path)
+        if remote_path == self.workspace.root:
+            raise ValueError("Upload path must name a file")
+        upload_id = uuid.uuid4().hex
+        directory, name = posixpath.split(remote_path)
+        temp_path = posixpath.join(directory, f".{name}.upload-{upload_id}")
+
+        def create(sftp):
+            sftp.open(temp_path, "wb").close()
+        await self.kali_service.run_sftp(create)
+
+        upload = UploadSession(
+            upload_id=upload_id,
+            path=path,
+            remote_path=remote_path,
+            temp_path=temp_path,
+            size=size,
+            sha256=sha256.lower() if sha256 else None,
+        )
+        self._uploads[upload_id] = upload
+        return upload
+
+    async def append(self, upload_id: str, offset: int, chunks: AsyncIterator[bytes]) -> UploadSession:
+        """
+        Append a request body to an upload at `offset`, which must equal the
+        session offset. If the body is cut short, the bytes written so far
+        are kept and the client can resume from the returned offset.
+        """
+        upload = self._uploads.get(upload_id)
+        if upload is None:
+            raise UploadError(404, "Upload not found")
+        if upload.busy:
+            raise UploadError(409, "Upload already has a request in progress", upload.offset)
+        if offset != upload.offset:
+            raise UploadError(409, f"Offset mismatch: upload is at {upload.offset}", upload.offset)
+
+        upload.busy = True
+        session = None
+        handle = None
+
+        def open_at_offset():
+            nonlocal session, handle
+            session = self.kali_service.acquire_sftp()
+            remote_size = session.client.stat(upload.temp_path).st_size or 0
+            if remote_size < upload.offset:
+                # Start over from an empty file so the client's retry at offset 0 is accepted
+                session.client.truncate(upload.temp_path, 0)
+                upload.offset = 0
+                upload.hasher = hashlib.sha256()
+                raise UploadError(409, "Uploaded data was lost; restart the upload", 0)
+            if remote_size > upload.offset:
+                # Drop bytes from an interrupted write that were never acknowledged
+                session.client.truncate(upload.temp_path, upload.offset)
+            handle = session.client.open(upload.temp_path, "r+b")
+            handle.seek(upload.offset)
+            handle.set_pipelined(True)
+
+        def write(data: bytes):
+            # Offset and hash advance together, in the thread doing the write
+            handle.write(data)
+            upload.hasher.update(data)
+            upload.offset += len(data)
+
+        pending = []
+        pending_bytes = 0
+        current = None
+        try:
+            current = self.kali_service.run_blocking(open_at_offset)
+            await current
+            async for chunk in chunks:
+                if upload.size is not None and upload.offset + pending_bytes + len(chunk) > upload.size:
+                    raise UploadError(413, f"Upload exceeds declared size of {upload.size} bytes", upload.offset)
+                pending.append(chunk)
+                pending_bytes += len(chunk)
+                if pending_bytes >= self.write_chunk_bytes:
+                    data = b"".join(pending)
+                    pending, pending_bytes = [], 0
+                    current = self.kali_service.run_blocking(write, data)
+                    await current
+            if pending:
+                current = self.kali_service.run_blocking(write, b"".join(pending))
+                await current
+        finally:
+            def close():
+                try:
+                    if handle is not None:
+                        # Waits for pipelined writes to be acknowledged
+                        handle.close()
+                finally:
+                    if session is not None:
+                        self.kali_service.release_sftp(session)
+
+            def closed(future):
+                # The session stays busy until pending writes have landed
+                upload.busy = False
+                upload.updated_at = time.time()
+                if not future.cancelled() and future.exception() is not None:
+                    logger.error(f"Failed to close upload {upload_id}: {str(future.exception())}")
+
+            def schedule_close(previous=None):
+                if previous is not None and not previous.cancelled():
+                    previous.exception()
+                close_future = self.kali_service.run_blocking(close)
+                close_future.add_done_callback(closed)
+                return close_future
+
+            if current is not None and not current.done():
+                # Interrupted mid-write: close once the write thread is finished with the handle
+                current.add_done_callback(schedule_close)
+            else:
+                try:
+                    await asyncio.shield(schedule_close())
+                except Exception:
+                    pass
+        return upload
+
+    async def complete(self, upload_id: str, sha256: Optional[str] = None) -> Dict[str, Any]:
+        """Verify an upload's size and checksum and move it into place"""
+        upload = self._uploads.get(upload_id)
+        if upload is None:
+            raise UploadError(404, "Upload not found")
+        if upload.busy:
+            raise UploadError(409, "Upload still has a request in progress", upload.offset)
+        if upload.size is not None and upload.offset != upload.size:
+            raise UploadError(409, f"Upload incomplete: {upload.offset} of {upload.size} bytes", upload.offset)
+
+        digest = upload.hasher.hexdigest()
+        expected = (sha256 or upload.sha256 or "").lower()
+        if expected and expected != digest:
+            await self.abort(upload_id)
+            raise UploadError(422, f"Checksum mismatch: expected {expected}, got {digest}")
+
+        await self.kali_service.run_sftp(lambda sftp: sftp.posix_rename(upload.temp_path, upload.remote_path))
+        del self._uploads[upload_id]
+        self.workspace.invalidate(upload.path)
+        logger.info(f"Upload {upload_id} completed: {upload.path} ({upload.offset} bytes)")
+        return {"path": upload.path, "size": upload.offset, "sha256": digest}
+
+    async def abort(self, upload_id: str) -> bool:
+        upload = self._uploads.pop(upload_id, None)
+        if upload is None:
+            return False
+        await self.kali_service.run_blocking(self._remove_quietly, upload.temp_path)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "uploads": len(self._uploads),
+            "uploads_in_progress": sum(1 for upload in self._uploads.values() if upload.busy),
+            "window_bytes": self.window_bytes,
+        }
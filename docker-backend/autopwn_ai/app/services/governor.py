@@ -0,0 +1,289 @@
+from typing import TYPE_CHECKING, Any, AsyncIterator, Callable, Deque, Dict, Optional, Tuple, TypeVar
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+import os
+import re
+import time
+import shlex
+import asyncio
+import threading
+
+from app.services.history_store import key_fingerprint
+
+if TYPE_CHECKING:
+    from app.services.shared_state import SharedState
+
+# =====================================
+# Governance Configuration
+# =====================================
+
+# Remote directory holding one file per running command with its process
+# group ID, so the group can be killed from another channel
+PGID_DIR = "/tmp/.autopwn-pgids"
+
+_TIMES = re.compile(rb"(\d+)m([\d.]+)s")
+
+T = TypeVar("T")
+
+
+@dataclass
+class CommandLimits:
+    """Per-command resource limits; 0 disables a limit"""
+    cpu_seconds: int = 0
+    memory_mb: int = 0
+    output_bytes: int = 0
+
+    @classmethod
+    def from_env(cls) -> "CommandLimits":
+        return cls(
+            cpu_seconds=int(os.getenv("COMMAND_CPU_LIMIT", "0")),
+            memory_mb=int(os.getenv("COMMAND_MEMORY_LIMIT_MB", "0")),
+            output_bytes=int(os.getenv("COMMAND_OUTPUT_LIMIT_BYTES", str(512 * 1024 * 1024))),
+        )
+
+    def ulimits(self) -> str:
+        # Applied per process and inherited, so every process of the command is
+        # bounded. The CPU hard limit is a second later, so SIGXCPU comes first.
+        parts = []
+        if self.cpu_seconds:
+            parts.append(f"ulimit -S -t {self.cpu_seconds}; ulimit -H -t {self.cpu_seconds + 1}")
+        if self.memory_mb:
+            parts.append(f"ulimit -v {self.memory_mb * 1024}")
+        return "".join(f"{part}; " for part in parts)
+
+    def to_dict(self) -> Dict[str, int]:
+        return {"cpu_seconds": self.cpu_seconds, "memory_mb": self.memory_mb, "output_bytes": self.output_bytes}
+
+
+_ENSURE_DIR = f"{{ [ -d {PGID_DIR} ] || mkdir -p {PGID_DIR}; }}"
+
+
+def _pgid_file(command_id: str) -> str:
+    return f"{PGID_DIR}/{re.sub(r'[^A-Za-z0-9_.-]', '_', command_id)}"
+
+
+def wrap_command(command: str, command_id: str, limits: CommandLimits, marker: str) -> str:
+    """
+    Remote command line that runs `command` in the user's shell as the
+    leader of a new process group, under `limits`. The group ID is left in
+    PGID_DIR while it runs. The last stderr line is `marker` followed by the
+    exit status and the command's user and system CPU time.
+    """
+    pgid_file = _pgid_file(command_id)
+    script = (
+        f"echo $$ > {pgid_file}; {limits.ulimits()}"
+        f"\"${{SHELL:-/bin/sh}}\" -c \"$1\"; rc=$?; "
+        f"times > {pgid_file}.t; {{ read _ _; read cu cs; }} < {pgid_file}.t; rm -f {pgid_file} {pgid_file}.t; "
+        f"printf '%s %s %s %s\\n' '{marker}' \"$rc\" \"$cu\" \"$cs\" >&2; exit $rc"
+    )
+    return f"{_ENSURE_DIR} && exec setsid -w sh -c {shlex.quote(script)} autopwn {shlex.quote(command)}"
+
+
+def wrap_shell(shell_command: str, session_id: str, limits: CommandLimits) -> str:
+    """Like wrap_command, for a persistent shell started as `shell_command`"""
+    pgid_file = _pgid_file(session_id)
+    script = (
+        f"echo $$ > {pgid_file}; {limits.ulimits()}"
+        f"{shell_command}; rc=$?; rm -f {pgid_file} {pgid_file}.t; exit $rc"
+    )
+    return f"{_ENSURE_DIR} && exec setsid -w sh -c {shlex.quote(script)}"
+
+
+def session_usage_script(session_id: str, marker: str) -> str:
+    """
+    Shell lines printing `marker` and the CPU time used so far by a
+    session's shell and its children to stderr
+    """
+    times_file = f"{_pgid_file(session_id)}.t"
+    return (
+        f"times > {times_file}; {{ read su ss; read cu cs; }} < {times_file}; rm -f {times_file}; "
+        f"printf '%s %s %s %s %s\\n' '{marker}' \"$su\" \"$ss\" \"$cu\" \"$cs\" >&2\n"
+    )
+
+
+def kill_command(command_id: str, grace: float = 1.0) -> str:
+    """
+    Remote command line that sends SIGTERM to a command's process group and
+    SIGKILL `grace` seconds later. Returns as soon as SIGTERM is sent.
+    """
+    pgid_file = _pgid_file(command_id)
+    # Anything but a plain group ID above 1 is refused: `kill -- -1` would hit
+    # every process. kill(1) rather than the builtin, which dash parses differently.
+    script = (
+        f"pg=$(cat {pgid_file} 2>/dev/null); rm -f {pgid_file} {pgid_file}.t; "
+        f"case \"$pg\" in ''|*[!0-9]*|0|1) exit 0;; esac; "
+        f"env kill -s TERM -- -\"$pg\" 2>/dev/null || exit 0; "
+        f"(sleep {grace:g}; env kill -s KILL -- -\"$pg\" 2>/dev/null) </dev/null >/dev/null 2>&1 & exit 0"
+    )
+    return f"exec sh -c {shlex.quote(script)}"
+
+
+def parse_cpu_times(payload: bytes) -> Optional[float]:
+    """Sum of the `times`-formatted ("1m2.5s") durations in a sentinel payload"""
+    times = _TIMES.findall(payload)
+    if not times:
+        return None
+    return sum(int(minutes) * 60 + float(seconds) for minutes, seconds in times)
+
+
+def charged_cpu_seconds(result: Dict[str, Any]) -> Optional[float]:
+    """
+    CPU seconds to charge for a command result. Commands whose CPU time
+    wasn't measured (killed, or run without a process group) are charged
+    their wall-clock time.
+    """
+    cpu_seconds = result.get("cpu_seconds")
+    return cpu_seconds if cpu_seconds is not None else result.get("execution_time")
+
+
+# =====================================
+# Quotas
+# =====================================
+
+
+class QuotaExceededError(Exception):
+    """Raised when an API key is over its concurrency or CPU quota"""
+
+    def __init__(self, quota: str, message: str):
+        super().__init__(message)
+        self.quota = quota
+
+
+class Reservation:
+    """A running command counted against a key's quotas; set `cpu_seconds` once known"""
+
+    def __init__(self):
+        self.cpu_seconds: Optional[float] = None
+
+
+class QuotaManager:
+    """
+    Per-API-key quotas: concurrent commands, and CPU seconds used within a
+    sliding `window`. Keys are tracked by fingerprint. With a shared-state
+    backend the counts are shared by all workers; otherwise they are kept
+    in this process.
+    """
+
+    def __init__(
+        self,
+        state: Optional["SharedState"] = None,
+        worker_id: str = "local",
+        max_concurrent: Optional[int] = None,
+        cpu_seconds: Optional[float] = None,
+        window: Optional[float] = None,
+    ):
+        self.state = state
+        self.worker_id = worker_id
+        self.max_concurrent = max_concurrent if max_concurrent is not None else int(os.getenv("QUOTA_MAX_CONCURRENT", "0"))
+        self.cpu_seconds = cpu_seconds if cpu_seconds is not None else float(os.getenv("QUOTA_CPU_SECONDS", "0"))
+        self.window = window or float(os.getenv("QUOTA_WINDOW", "3600"))
+
+        self._running: Dict[str, int] = {}
+        self._cpu: Dict[str, Deque[Tuple[float, float]]] = {}
+        self._lock = threading.Lock()
+
+    def _cpu_used(self, key: str) -> float:
+        if self.state is not None:
+            return self.state.cpu_used(key, self.window)
+        cutoff = time.time() - self.window
+        with self._lock:
+            entries = self._cpu.get(key)
+            if not entries:
+                return 0.0
+            while entries and entries[0][0] <= cutoff:
+                entries.popleft()
+            return sum(seconds for _, seconds in entries)
+
+    def _running_count(self, key: str) -> int:
+        if self.state is not None:
+            return self.state.running(key)
+        with self._lock:
+            return self._running.get(key, 0)
+
+    def _check(self, key: str, enforce_concurrency: bool):
+        if self.cpu_seconds and self._cpu_used(key) >= self.cpu_seconds:
+            raise QuotaExceededError("cpu", f"CPU quota of {self.cpu_seconds:g}s per {self.window:g}s used up")
+        if enforce_concurrency and self.max_concurrent and self._running_count(key) >= self.max_concurrent:
+            raise QuotaExceededError("concurrency", f"At most {self.max_concurrent} concurrent commands per API key")
+
+    def _acquire(self, key: str, enforce_concurrency: bool):
+        if self.cpu_seconds and self._cpu_used(key) >= self.cpu_seconds:
+            raise QuotaExceededError("cpu", f"CPU quota of {self.cpu_seconds:g}s per {self.window:g}s used up")
+
+        limit = self.max_concurrent if enforce_concurrency else 0
+        if self.state is not None:
+            acquired = self.state.try_acquire_slot(key, self.worker_id, limit)
+        else:
+            with self._lock:
+                acquired = not limit or self._running.get(key, 0) < limit
+                if acquired:
+                    self._running[key] = self._running.get(key, 0) + 1
+        if not acquired:
+            raise QuotaExceededError("concurrency", f"At most {self.max_concurrent} concurrent commands per API key")
+
+    def _release(self, key: str, cpu_seconds: Optional[float]):
+        if self.state is not None:
+            self.state.release_slot(key, self.worker_id)
+            if cpu_seconds:
+                self.state.add_cpu(key, cpu_seconds)
+            return
+        with self._lock:
+            running = self._running.get(key, 0) - 1
+            if running > 0:
+                self._running[key] = running
+            else:
+                self._running.pop(key, None)
+            if cpu_seconds:
+                self._cpu.setdefault(key, deque()).append((time.time(), cpu_seconds))
+
+    async def _call(self, method: Callable[..., T], *args: Any) -> T:
+        # Shared-state backends block, so they are called off the event loop
+        if self.state is not None:
+            return await self.state.run(method, *args)
+        return method(*args)
+
+    async def check(self, api_key: Optional[str], enforce_concurrency: bool = True):
+        """Raise QuotaExceededError if `api_key` could not start a command now"""
+        if api_key:
+            await self._call(self._check, key_fingerprint(api_key), enforce_concurrency)
+
+    async def acquire(self, api_key: Optional[str], enforce_concurrency: bool = True):
+        """
+        Count a starting command against `api_key`, raising QuotaExceededError
+        if it is over quota. Without `enforce_concurrency` the command is
+        counted but never refused for concurrency.
+        """
+        if api_key:
+            await self._call(self._acquire, key_fingerprint(api_key), enforce_concurrency)
+
+    async def release(self, api_key: Optional[str], cpu_seconds: Optional[float] = None):
+        """Stop counting a finished command and charge the CPU time it used"""
+        if api_key:
+            # Shielded so a second cancellation can't leave the slot taken
+            await asyncio.shield(self._call(self._release, key_fingerprint(api_key), cpu_seconds))
+
+    @asynccontextmanager
+    async def reserve(self, api_key: Optional[str], enforce_concurrency: bool = True) -> AsyncIterator[Reservation]:
+        """acquire/release around a block; charge CPU by setting the reservation's cpu_seconds"""
+        await self.acquire(api_key, enforce_concurrency)
+        reservation = Reservation()
+        try:
+            yield reservation
+        finally:
+            await self.release(api_key, reservation.cpu_seconds)
+
+    def _usage(self, key: str) -> Dict[str, Any]:
+        cpu_used = self._cpu_used(key)
+        return {
+            "key": key,
+            "running": self._running_count(key),
+            "max_concurrent": self.max_concurrent or None,
+            "cpu_seconds_used": round(cpu_used, 3),
+            "cpu_seconds_limit": self.cpu_seconds or None,
+            "cpu_seconds_remaining": round(max(0.0, self.cpu_seconds - cpu_used), 3) if self.cpu_seconds else None,
+            "window": self.window,
+        }
+
+    async def usage(self, api_key: str) -> Dict[str, Any]:
+        return await self._call(self._usage, key_fingerprint(api_key))
@@ -0,0 +1,170 @@
+from typing import Any, Dict, Optional
+from collections import deque
+import os
+import time
+import asyncio
+from loguru import logger
+
+from app.utils.metrics import HEALTH_PROBE_DURATION
+
+# =====================================
+# Health Prober Configuration
+# =====================================
+
+PROBE_COMMAND = "echo 'health_check'"
+
+# Probe states
+STARTING = "starting"
+HEALTHY = "healthy"
+DEGRADED = "degraded"
+UNHEALTHY = "unhealthy"
+
+
+class HealthProber:
+    """
+    Checks Kali connectivity in the background every `interval` seconds and
+    caches the result, so health endpoints never wait on SSH. A failed probe
+    marks the service degraded; `failure_threshold` consecutive failures mark
+    it unhealthy. The last `history_size` probes are kept for inspection.
+    While startup warmup is in progress the service is reported not ready
+    and background probing waits for it to finish.
+    """
+
+    def __init__(
+        self,
+        kali_service: Any,
+        interval: Optional[float] = None,
+        timeout: Optional[float] = None,
+        failure_threshold: Optional[int] = None,
+        history_size: Optional[int] = None,
+    ):
+        self.kali_service = kali_service
+        self.interval = interval or float(os.getenv("HEALTH_PROBE_INTERVAL", "10"))
+        self.timeout = timeout or float(os.getenv("HEALTH_PROBE_TIMEOUT", "5"))
+        self.failure_threshold = failure_threshold or int(os.getenv("HEALTH_FAILURE_THRESHOLD", "3"))
+        self.history: deque = deque(maxlen=history_size or int(os.getenv("HEALTH_HISTORY_SIZE", "60")))
+
+        self.started_at = time.time()
+        self.consecutive_failures = 0
+        self.last_probe_at: Optional[float] = None
+        self.last_success_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.pool: Dict[str, Any] = {}
+        self.warming = False
+        self._lock = asyncio.Lock()
+        self._warmed = asyncio.Event()
+        self._warmed.set()
+
+    @property
+    def status(self) -> str:
+        if self.last_probe_at is None:
+            return STARTING
+        if self.consecutive_failures == 0:
+            return HEALTHY
+        if self.consecutive_failures < self.failure_threshold:
+            return DEGRADED
+        return UNHEALTHY
+
+    @property
+    def ready(self) -> bool:
+        return not self.warming and self.status in (HEALTHY, DEGRADED)
+
+    def begin_warmup(self):
+        self.warming = True
+        self._warmed.clear()
+
+    def end_warmup(self):
+        self.warming = False
+        self._warmed.set()
+
+    async def probe(self) -> bool:
+        """Run one connectivity check and record the outcome"""
+        async with self._lock:
+            return await self._probe()
+
+    async def _probe(self) -> bool:
+        """Run one probe. Caller holds the lock."""
+        start = time.perf_counter()
+        error = None
+        try:
+            result = await asyncio.wait_for(
+                self.kali_service.execute_command_async(PROBE_COMMAND, timeout=int(self.timeout) or 1),
+                timeout=self.timeout,
+            )
+            if not result["success"]:
+                error = result["stderr"].strip() or f"exit code {result['exit_code']}"
+        except asyncio.TimeoutError:
+            error = f"Probe timed out after {self.timeout} seconds"
+        except Exception as e:
+            error = str(e)
+        rtt = time.perf_counter() - start
+
+        now = time.time()
+        self.last_probe_at = now
+        self.history.append({"at": now, "rtt_ms": round(rtt * 1000, 3), "ok": error is None})
+        HEALTH_PROBE_DURATION.labels("true" if error is None else "false").observe(rtt)
+        try:
+            self.pool = self.kali_service.get_stats()
+        except Exception as e:
+            logger.error(f"Failed to read Kali pool stats: {str(e)}")
+
+        if error is None:
+            if self.consecutive_failures:
+                logger.info(f"Kali health probe recovered after {self.consecutive_failures} failure(s)")
+            self.consecutive_failures = 0
+            self.last_success_at = now
+            self.last_error = None
+            return True
+
+        self.consecutive_failures += 1
+        self.last_error = error
+        logger.warning(f"Kali health probe failed ({self.consecutive_failures} in a row): {error}")
+        return False
+
+    async def ensure_probed(self):
+        """Probe once if nothing has been recorded yet"""
+        if self.last_probe_at is None:
+            async with self._lock:
+                # Callers queued behind the first probe reuse its result
+                if self.last_probe_at is None:
+                    await self._probe()
+
+    async def run_prober(self):
+        """Probe on an interval until cancelled"""
+        await self._warmed.wait()
+        while True:
+            if self.last_probe_at is not None:
+                await asyncio.sleep(max(0.0, self.last_probe_at + self.interval - time.time()))
+            try:
+                await self.probe()
+            except Exception as e:
+                logger.error(f"Health probe crashed: {str(e)}")
+
+    def _latency_summary(self) -> Dict[str, Optional[float]]:
+        latencies = sorted(entry["rtt_ms"] for entry in self.history if entry["ok"])
+        if not latencies:
+            return {"p50": None, "p95": None, "max": None}
+        return {
+            "p50": latencies[(len(latencies) - 1) // 2],
+            "p95": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+            "max": latencies[-1],
+        }
+
+    def snapshot(self, include_history: bool = True) -> Dict[str, Any]:
+        now = time.time()
+        snapshot = {
+            "status": self.status,
+            "ready": self.ready,
+            "warming": self.warming,
+            "probe_age": round(now - self.last_probe_at, 3) if self.last_probe_at else None,
+            "last_success_age": round(now - self.last_success_at, 3) if self.last_success_at else None,
+            "consecutive_failures": self.consecutive_failures,
+            "failure_threshold": self.failure_threshold,
+            "interval": self.interval,
+            "last_error": self.last_error,
+            "latency_ms": self._latency_summary(),
+            "pool": self.pool,
+        }
+        if include_history:
+            snapshot["history"] = list(self.history)
+        return snapshot
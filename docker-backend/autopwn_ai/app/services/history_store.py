@@ -0,0 +1,307 @@
+from typing import Any, Dict, List, Optional, Tuple
+import os
+import time
+import queue
+import asyncio
+import hashlib
+import sqlite3
+import threading
+from loguru import logger
+
+from app.utils.tool_validator import get_base_command
+
+# =====================================
+# History Store Configuration
+# =====================================
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY,
+    command_id TEXT,
+    api_key TEXT,
+    source TEXT NOT NULL,
+    command TEXT NOT NULL,
+    base_command TEXT NOT NULL,
+    exit_code INTEGER,
+    success INTEGER NOT NULL,
+    timed_out INTEGER,
+    execution_time REAL,
+    stdout_size INTEGER,
+    stderr_size INTEGER,
+    finished_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_history_key ON history (api_key, id);
+CREATE INDEX IF NOT EXISTS idx_history_key_success ON history (api_key, success, id);
+CREATE INDEX IF NOT EXISTS idx_history_key_exit ON history (api_key, exit_code, id);
+CREATE INDEX IF NOT EXISTS idx_history_key_finished ON history (api_key, finished_at);
+CREATE INDEX IF NOT EXISTS idx_history_key_tool ON history (api_key, base_command, id);
+CREATE INDEX IF NOT EXISTS idx_history_key_command ON history (api_key, command);
+CREATE INDEX IF NOT EXISTS idx_history_finished ON history (finished_at);
+"""
+
+COLUMNS = (
+    "command_id", "api_key", "source", "command", "base_command", "exit_code", "success",
+    "timed_out", "execution_time", "stdout_size", "stderr_size", "finished_at",
+)
+
+INSERT = f"INSERT INTO history ({', '.join(COLUMNS)}) VALUES ({', '.join('?' for _ in COLUMNS)})"
+
+# Rows deleted per statement during compaction, so the writer never holds
+# the write lock for long
+COMPACT_CHUNK = 5000
+
+_STOP = object()
+
+
+def key_fingerprint(api_key: Optional[str]) -> Optional[str]:
+    """Short stable identifier for an API key; the key itself is never stored"""
+    if not api_key:
+        return None
+    return hashlib.sha256(api_key.encode()).hexdigest()[:16]
+
+
+class HistoryStore:
+    """
+    Execution history in an embedded SQLite database (WAL mode).
+    `record` only queues the row; a writer thread drains the queue into
+    one transaction of up to `batch_size` rows at a time, and deletes rows
+    older than `retention_days` every `compact_interval` seconds. If the
+    queue is full, new rows are dropped and counted rather than slowing
+    requests.
+
+    Pages are keyset-paginated on id. Several workers may write to the
+    same database, each with its own batches, so ids only roughly follow
+    `finished_at`; time filters therefore apply to `finished_at` itself.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        batch_size: Optional[int] = None,
+        flush_interval: Optional[float] = None,
+        queue_size: Optional[int] = None,
+        retention_days: Optional[float] = None,
+    ):
+        self.path = path or os.getenv("HISTORY_DB_PATH", "data/history.db")
+        self.batch_size = batch_size or int(os.getenv("HISTORY_BATCH_SIZE", "500"))
+        self.flush_interval = flush_interval or float(os.getenv("HISTORY_FLUSH_INTERVAL", "1"))
+        self.retention_days = retention_days or float(os.getenv("HISTORY_RETENTION_DAYS", "30"))
+        self.compact_interval = float(os.getenv("HISTORY_COMPACT_INTERVAL", "3600"))
+
+        self.written = 0
+        self.dropped = 0
+        self.deleted = 0
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size or int(os.getenv("HISTORY_QUEUE_SIZE", "10000")))
+        self._writer: Optional[threading.Thread] = None
+        self._readers = threading.local()
+
+    # ---------------------------------
+    # Connections
+    # ---------------------------------
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+        # Only takes effect on a new database, and must come first there;
+        # lets compaction hand freed pages back to the OS
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+
+    def _reader(self) -> sqlite3.Connection:
+        # One read connection per executor thread; WAL lets them read while the writer commits
+        conn = getattr(self._readers, "conn", None)
+        if conn is None:
+            conn = self._readers.conn = self._connect()
+            conn.row_factory = sqlite3.Row
+        return conn
+
+    def start(self):
+        """Create the schema and start the writer thread"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        self._writer = threading.Thread(target=self._write_loop, args=(conn,), name="history-writer", daemon=True)
+        self._writer.start()
+
+    def close(self, timeout: float = 5.0):
+        """Flush queued rows and stop the writer"""
+        if self._writer is None:
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            logger.warning("History queue still full at shutdown, unflushed rows are lost")
+            return
+        self._writer.join(timeout)
+        self._writer = None
+
+    # ---------------------------------
+    # Writes
+    # ---------------------------------
+    def record(
+        self,
+        command: str,
+        source: str,
+        success: bool,
+        api_key: Optional[str] = None,
+        command_id: Optional[str] = None,
+        exit_code: Optional[int] = None,
+        timed_out: Optional[bool] = None,
+        execution_time: Optional[float] = None,
+        stdout_size: Optional[int] = None,
+        stderr_size: Optional[int] = None,
+    ):
+        """Queue one finished execution for writing. Never blocks."""
+        row = (
+            command_id, key_fingerprint(api_key), source, command, get_base_command(command) if command.strip() else "",
+            exit_code, int(bool(success)), None if timed_out is None else int(timed_out),
+            execution_time, stdout_size, stderr_size, time.time(),
+        )
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                logger.warning(f"History queue full, {self.dropped} row(s) dropped so far")
+
+    def _write_loop(self, conn: sqlite3.Connection):
+        next_compact = time.monotonic()
+        stopping = False
+        while not stopping:
+            batch: List[Tuple] = []
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+                while True:
+                    if item is _STOP:
+                        stopping = True
+                        break
+                    batch.append(item)
+                    if len(batch) >= self.batch_size:
+                        break
+                    item = self._queue.get_nowait()
+            except queue.Empty:
+                pass
+
+            if batch:
+                try:
+                    with conn:
+                        conn.execute("BEGIN")
+                        conn.executemany(INSERT, batch)
+                    self.written += len(batch)
+                except sqlite3.Error as e:
+                    logger.error(f"Failed to write {len(batch)} history row(s): {str(e)}")
+
+            if time.monotonic() >= next_compact:
+                next_compact = time.monotonic() + self.compact_interval
+                try:
+                    self._compact(conn)
+                except sqlite3.Error as e:
+                    logger.error(f"History compaction failed: {str(e)}")
+        conn.close()
+
+    def _compact(self, conn: sqlite3.Connection):
+        """Delete rows past the retention window, a chunk at a time"""
+        cutoff = time.time() - self.retention_days * 86400
+        deleted = 0
+        while True:
+            cursor = conn.execute(
+                "DELETE FROM history WHERE id IN "
+                "(SELECT id FROM history WHERE finished_at < ? ORDER BY finished_at LIMIT ?)",
+                (cutoff, COMPACT_CHUNK),
+            )
+            deleted += cursor.rowcount
+            if cursor.rowcount < COMPACT_CHUNK:
+                break
+        if deleted:
+            self.deleted += deleted
+            conn.execute("PRAGMA incremental_vacuum")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            logger.info(f"Compacted command history: {deleted} row(s) past {self.retention_days:g} day retention")
+
+    # ---------------------------------
+    # Queries
+    # ---------------------------------
+    def _query(
+        self,
+        api_key: Optional[str],
+        cursor: Optional[int],
+        limit: int,
+        since: Optional[float],
+        until: Optional[float],
+        success: Optional[bool],
+        exit_code: Optional[int],
+        tool: Optional[str],
+        prefix: Optional[str],
+        source: Optional[str],
+    ) -> Dict[str, Any]:
+        conn = self._reader()
+        clauses = ["api_key = ?"]
+        params: List[Any] = [key_fingerprint(api_key)]
+        for clause, value in (
+            ("id < ?", cursor),
+            ("finished_at >= ?", since),
+            ("finished_at < ?", until),
+            ("success = ?", None if success is None else int(success)),
+            ("exit_code = ?", exit_code),
+            ("base_command = ?", tool),
+            ("source = ?", source),
+        ):
+            if value is not None:
+                clauses.append(clause)
+                params.append(value)
+        if prefix:
+            # Range form of LIKE 'prefix%' that can use the command index
+            clauses.append("command >= ? AND command < ?")
+            params.extend([prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)])
+
+        rows = conn.execute(
+            f"SELECT id, {', '.join(c for c in COLUMNS if c != 'api_key')} FROM history "
+            f"WHERE {' AND '.join(clauses)} ORDER BY id DESC LIMIT ?",
+            params + [limit + 1],
+        ).fetchall()
+
+        entries = [dict(row) for row in rows[:limit]]
+        for entry in entries:
+            entry["success"] = bool(entry["success"])
+            if entry["timed_out"] is not None:
+                entry["timed_out"] = bool(entry["timed_out"])
+        next_cursor = str(entries[-1]["id"]) if len(rows) > limit else None
+        return {"entries": entries, "next_cursor": next_cursor}
+
+    async def query(
+        self,
+        api_key: Optional[str],
+        cursor: Optional[str] = None,
+        limit: int = 100,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        success: Optional[bool] = None,
+        exit_code: Optional[int] = None,
+        tool: Optional[str] = None,
+        prefix: Optional[str] = None,
+        source: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Newest-first page of the caller's history. `next_cursor` continues
+        after the last returned entry and is None on the final page.
+        """
+        try:
+            before = int(cursor) if cursor else None
+        except ValueError:
+            raise ValueError("Invalid cursor")
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self._query, api_key, before, limit, since, until, success, exit_code, tool, prefix, source
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "pending": self._queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "deleted": self.deleted,
+            "retention_days": self.retention_days,
+        }
@@ -0,0 +1,262 @@
+from typing import Any, Dict, List, Optional
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+import os
+import time
+import uuid
+import asyncio
+from loguru import logger
+
+from app.services.governor import QuotaExceededError, charged_cpu_seconds
+
+# =====================================
+# Job Queue Configuration
+# =====================================
+
+# Priority classes, served strictly in this order
+PRIORITY_CLASSES = ["high", "normal", "low"]
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINISHED_STATES = {COMPLETED, FAILED, CANCELLED}
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at max depth"""
+
+
+@dataclass
+class Job:
+    job_id: str
+    command: str
+    timeout: Optional[int]
+    priority: str
+    owner: str
+    status: str = QUEUED
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    cancel_requested: bool = False
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "command": self.command,
+            "priority": self.priority,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobQueue:
+    """
+    Runs commands in the background on a bounded pool of async workers.
+    Higher priority classes are always served first. Within a class, owners
+    (API keys) are served round-robin so one busy client cannot starve the
+    rest. Submissions beyond `max_depth` queued jobs are rejected.
+    """
+
+    def __init__(
+        self,
+        kali_service: Any,
+        output_store: Optional[Any] = None,
+        history: Optional[Any] = None,
+        quotas: Optional[Any] = None,
+        workers: Optional[int] = None,
+        max_depth: Optional[int] = None,
+        retention: Optional[float] = None,
+    ):
+        self.kali_service = kali_service
+        self.output_store = output_store
+        self.history = history
+        self.quotas = quotas
+        self.workers = workers or int(os.getenv("JOB_WORKERS", "4"))
+        self.max_depth = max_depth or int(os.getenv("JOB_MAX_QUEUE_DEPTH", "100"))
+        self.retention = retention or float(os.getenv("JOB_RETENTION", "3600"))
+
+        self._jobs: Dict[str, Job] = {}
+        # priority -> owner -> queued jobs; owners rotate to the back once served
+        self._queues: Dict[str, "OrderedDict[str, deque]"] = {
+            priority: OrderedDict() for priority in PRIORITY_CLASSES
+        }
+        self._depth = 0
+        self._available = asyncio.Condition()
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def depth(self) -> int:
+        return self._depth
+
+    @property
+    def running(self) -> int:
+        return sum(1 for job in self._jobs.values() if job.status == RUNNING)
+
+    def start(self):
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"job-worker-{i}") for i in range(self.workers)
+        ]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def _prune(self):
+        cutoff = time.time() - self.retention
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.status in FINISHED_STATES and job.finished_at < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    async def submit(self, command: str, timeout: Optional[int], priority: str, owner: str) -> Job:
+        """
+        Queue a command, raising QueueFullError if the queue is full and
+        QuotaExceededError if the owner has used up its CPU quota. Jobs are
+        never refused for concurrency; that is what the queue is for.
+        """
+        if priority not in self._queues:
+            raise ValueError(f"Invalid priority. Must be one of: {PRIORITY_CLASSES}")
+        if self._depth >= self.max_depth:
+            raise QueueFullError(f"Job queue is full ({self.max_depth} jobs queued)")
+        if self.quotas is not None:
+            await self.quotas.check(owner, enforce_concurrency=False)
+
+        self._prune()
+        job = Job(job_id=str(uuid.uuid4()), command=command, timeout=timeout, priority=priority, owner=owner)
+        self._jobs[job.job_id] = job
+        self._queues[priority].setdefault(owner, deque()).append(job)
+        self._depth += 1
+
+        async with self._available:
+            self._available.notify()
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """Cancel a queued job, or stop a running one on the Kali host"""
+        job = self._jobs.get(job_id)
+        if job is None or job.status in FINISHED_STATES:
+            return job
+
+        job.cancel_requested = True
+        if job.status == QUEUED:
+            owners = self._queues[job.priority]
+            owners[job.owner].remove(job)
+            if not owners[job.owner]:
+                del owners[job.owner]
+            self._depth -= 1
+            job.status = CANCELLED
+            job.finished_at = time.time()
+        else:
+            self.kali_service.close_session(job.job_id)
+        return job
+
+    def _next_job(self) -> Optional[Job]:
+        for priority in PRIORITY_CLASSES:
+            owners = self._queues[priority]
+            if owners:
+                owner, jobs = next(iter(owners.items()))
+                job = jobs.popleft()
+                if jobs:
+                    owners.move_to_end(owner)
+                else:
+                    del owners[owner]
+                self._depth -= 1
+                return job
+        return None
+
+    async def _worker(self):
+        while True:
+            async with self._available:
+                job = self._next_job()
+                while job is None:
+                    await self._available.wait()
+                    job = self._next_job()
+
+            job.status = RUNNING
+            job.started_at = time.time()
+            capture = None
+            reserved = False
+            result: Dict[str, Any] = {}
+            try:
+                # The CPU quota may have run out while the job was queued
+                if self.quotas is not None:
+                    await self.quotas.acquire(job.owner, enforce_concurrency=False)
+                    reserved = True
+                capture = self.output_store.create(job.job_id) if self.output_store else None
+                try:
+                    result = await self.kali_service.execute_command_async(
+                        job.command, session_id=job.job_id, timeout=job.timeout, sink=capture
+                    )
+                except BaseException:
+                    # Nothing will fetch a failed job's output, so drop any spilled segment
+                    if capture is not None:
+                        capture.discard()
+                    raise
+                job.result = {
+                    "command_id": job.job_id,
+                    "command": job.command,
+                    "stdout": result["stdout"],
+                    "stderr": result["stderr"],
+                    "success": result["success"],
+                    "execution_time": result["execution_time"],
+                    "cpu_seconds": result.get("cpu_seconds"),
+                    "limit_exceeded": result.get("limit_exceeded"),
+                }
+                if capture is not None:
+                    self.output_store.finish(capture)
+                    job.result.update(capture.response_fields())
+                job.status = CANCELLED if job.cancel_requested else COMPLETED
+            except asyncio.CancelledError:
+                job.status = CANCELLED
+                job.finished_at = time.time()
+                raise
+            except QuotaExceededError as e:
+                job.error = str(e)
+                job.status = FAILED
+            except Exception as e:
+                logger.error(f"Job {job.job_id} failed: {str(e)}")
+                job.error = str(e)
+                job.status = CANCELLED if job.cancel_requested else FAILED
+            finally:
+                if reserved:
+                    # Cancelled jobs have no result and are charged the time they ran
+                    await self.quotas.release(job.owner, charged_cpu_seconds(result) if result else time.time() - job.started_at)
+            job.finished_at = time.time()
+            if self.history is not None:
+                self.history.record(
+                    job.command,
+                    "job",
+                    job.status == COMPLETED and job.result["success"],
+                    api_key=job.owner,
+                    command_id=job.job_id,
+                    exit_code=result.get("exit_code") if job.result else None,
+                    execution_time=job.finished_at - job.started_at,
+                    stdout_size=job.result.get("stdout_size") if job.result else None,
+                    stderr_size=job.result.get("stderr_size") if job.result else None,
+                )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "queued": self._depth,
+            "running": self.running,
+            "max_depth": self.max_depth,
+            "tracked_jobs": len(self._jobs),
+        }
@@ -0,0 +1,1388 @@
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+from collections import OrderedDict
+from contextlib import contextmanager
+import os
+import uuid
+import time
+import shlex
+import codecs
+import select
+import socket
+import asyncio
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from loguru import logger
+
+from app.services.governor import (
+    CommandLimits, kill_command, parse_cpu_times, session_usage_script, wrap_command, wrap_shell
+)
+from app.services.output_parsers import create_parser
+from app.utils import timing
+from app.utils.metrics import (
+    KALI_ACQUIRE_DURATION, KALI_COMMAND_DURATION, KALI_CONNECT_DURATION, KALI_CONNECT_FAILURES
+)
+
+# paramiko is the slowest import in the service, so it is loaded on first
+# connect (normally during startup warmup) rather than at import time
+if TYPE_CHECKING:
+    import paramiko
+
+# =====================================
+# Configuration
+# =====================================
+
+# Bytes read from a channel per recv() call
+RECV_CHUNK_SIZE = 32768
+
+# Maximum number of output chunks buffered between the SSH reader thread
+# and an async stream consumer before the reader blocks
+STREAM_QUEUE_SIZE = 256
+
+# Backend states: active hosts take new work, draining hosts only serve
+# sessions already pinned to them, ejected hosts failed health checks
+ACTIVE = "active"
+DRAINING = "draining"
+EJECTED = "ejected"
+
+# How new commands pick a backend
+ROUTING_POLICIES = ("least_channels", "load_average")
+
+# Session IDs remembered for host affinity
+AFFINITY_SIZE = 4096
+
+# Program started on a persistent shell session's channel
+SHELL_COMMAND = "bash --noprofile --norc"
+
+# Exit status of a command killed by SIGXCPU at its CPU time limit
+CPU_LIMIT_EXIT_CODE = 128 + 24
+
+# Seconds to wait for a channel, and then for the remote kill(1), when
+# killing the process group of a command that did not finish
+KILL_TIMEOUT = 10
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        logger.warning(f"Ignoring invalid integer for {name}: {value!r}")
+        return default
+
+
+def _parse_hosts(value: str, default_port: int) -> List[Tuple[str, int]]:
+    """Parse a comma-separated "host[:port]" list"""
+    hosts = []
+    for item in value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        host, sep, port = item.rpartition(":")
+        if sep and port.isdigit():
+            hosts.append((host, int(port)))
+        else:
+            hosts.append((item, default_port))
+    return hosts
+
+
+class KaliConnectionError(Exception):
+    """Raised when no SSH channel to the Kali host can be obtained"""
+
+
+class SessionLimitError(Exception):
+    """Raised when opening a shell session would exceed the session cap"""
+
+
+def _usage(cpu_seconds: Optional[float] = None, limit_exceeded: Optional[str] = None) -> Dict[str, Any]:
+    """Resource usage of one command as reported alongside its result"""
+    return {"cpu_seconds": cpu_seconds, "limit_exceeded": limit_exceeded}
+
+
+# =====================================
+# SSH Connection Pool
+# =====================================
+class _PooledTransport:
+    """A persistent SSH transport and the channels currently multiplexed on it"""
+
+    def __init__(self, client: "paramiko.SSHClient"):
+        self.client = client
+        self.transport = client.get_transport()
+        self.active_channels = 0
+        self.last_used = time.monotonic()
+
+    @property
+    def alive(self) -> bool:
+        return self.transport is not None and self.transport.is_active()
+
+    def close(self):
+        try:
+            self.client.close()
+        except Exception:
+            pass
+
+
+class SSHConnectionPool:
+    """
+    Bounded pool of persistent paramiko transports to a single host.
+    Each transport carries up to `channels_per_transport` concurrent channels,
+    the host as a whole is capped at `max_channels`, and transports with no
+    open channels are closed after `idle_timeout` seconds.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int = 22,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        key_path: Optional[str] = None,
+        pool_size: int = 4,
+        channels_per_transport: int = 8,
+        max_channels: Optional[int] = None,
+        idle_timeout: float = 300.0,
+        connect_timeout: float = 10.0,
+        acquire_timeout: float = 300.0,
+    ):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.key_path = key_path
+        self.pool_size = max(1, pool_size)
+        self.channels_per_transport = max(1, channels_per_transport)
+        self.max_channels = max_channels or self.pool_size * self.channels_per_transport
+        self.idle_timeout = idle_timeout
+        self.connect_timeout = connect_timeout
+        self.acquire_timeout = acquire_timeout
+
+        self._transports: List[_PooledTransport] = []
+        self._connecting = 0
+        self._active_channels = 0
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def _connect(self) -> _PooledTransport:
+        import paramiko
+
+        start = time.perf_counter()
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        client.connect(
+            self.host,
+            port=self.port,
+            username=self.username,
+            password=self.password,
+            key_filename=self.key_path,
+            timeout=self.connect_timeout,
+            banner_timeout=self.connect_timeout,
+            auth_timeout=self.connect_timeout,
+            look_for_keys=self.key_path is None and self.password is None,
+            allow_agent=False,
+        )
+        transport = client.get_transport()
+        transport.set_keepalive(30)
+        # Commands and sentinels are small writes; don't let Nagle hold them back
+        transport.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        KALI_CONNECT_DURATION.labels(self.host).observe(time.perf_counter() - start)
+        logger.info(f"Opened SSH transport to {self.host}:{self.port}")
+        return _PooledTransport(client)
+
+    def _drop_dead(self):
+        """Remove transports that have disconnected. Caller holds the lock."""
+        dead = [t for t in self._transports if not t.alive]
+        for pooled in dead:
+            self._transports.remove(pooled)
+            self._active_channels -= pooled.active_channels
+            pooled.close()
+        if dead:
+            logger.warning(f"Dropped {len(dead)} dead SSH transport(s) to {self.host}")
+
+    def _reserve(self, deadline: float) -> _PooledTransport:
+        """Reserve a channel slot on a transport, connecting a new one if allowed"""
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise KaliConnectionError("Connection pool is closed")
+
+                self._drop_dead()
+
+                if self._active_channels < self.max_channels:
+                    candidates = [
+                        t for t in self._transports
+                        if t.active_channels < self.channels_per_transport
+                    ]
+                    if candidates:
+                        pooled = min(candidates, key=lambda t: t.active_channels)
+                        pooled.active_channels += 1
+                        pooled.last_used = time.monotonic()
+                        self._active_channels += 1
+                        return pooled
+
+                    if len(self._transports) + self._connecting < self.pool_size:
+                        self._connecting += 1
+                        break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise KaliConnectionError(
+                        f"Timed out waiting for a free SSH channel to {self.host}"
+                    )
+                self._cond.wait(remaining)
+
+        # Connect outside the lock so other callers can use existing transports
+        try:
+            pooled = self._connect()
+        except Exception as e:
+            KALI_CONNECT_FAILURES.labels(self.host).inc()
+            with self._cond:
+                self._connecting -= 1
+                self._cond.notify_all()
+            raise KaliConnectionError(f"Failed to connect to {self.host}:{self.port}: {e}") from e
+
+        with self._cond:
+            self._connecting -= 1
+            pooled.active_channels = 1
+            self._active_channels += 1
+            self._transports.append(pooled)
+            self._cond.notify_all()
+            return pooled
+
+    def open_transport(self) -> bool:
+        """
+        Connect one more idle transport if the pool has room, so later
+        commands skip the SSH handshake. Returns False if the pool is full.
+        """
+        with self._cond:
+            self._drop_dead()
+            if self._closed or len(self._transports) + self._connecting >= self.pool_size:
+                return False
+            self._connecting += 1
+
+        try:
+            pooled = self._connect()
+        except Exception as e:
+            KALI_CONNECT_FAILURES.labels(self.host).inc()
+            raise KaliConnectionError(f"Failed to connect to {self.host}:{self.port}: {e}") from e
+        finally:
+            with self._cond:
+                self._connecting -= 1
+                self._cond.notify_all()
+
+        with self._cond:
+            self._transports.append(pooled)
+            self._cond.notify_all()
+        return True
+
+    def acquire_channel(self, timeout: Optional[float] = None) -> Tuple["paramiko.Channel", _PooledTransport]:
+        """Open a new session channel on the least-loaded pooled transport"""
+        start = time.monotonic()
+        deadline = start + (timeout if timeout is not None else self.acquire_timeout)
+        pooled = self._reserve(deadline)
+        acquired = time.monotonic()
+        KALI_ACQUIRE_DURATION.labels(self.host).observe(acquired - start)
+        timing.record("pool_acquire", acquired - start)
+        try:
+            channel = pooled.transport.open_session(timeout=self.connect_timeout)
+        except Exception as e:
+            self._release(pooled)
+            raise KaliConnectionError(f"Failed to open SSH channel to {self.host}: {e}") from e
+        timing.record("channel_open", time.monotonic() - acquired)
+        return channel, pooled
+
+    def _release(self, pooled: _PooledTransport):
+        with self._cond:
+            if pooled in self._transports:
+                pooled.active_channels -= 1
+                self._active_channels -= 1
+            pooled.last_used = time.monotonic()
+            self._cond.notify_all()
+
+    def release_channel(self, pooled: _PooledTransport, channel: "paramiko.Channel"):
+        """Close a channel and return its slot to the pool"""
+        try:
+            channel.close()
+        except Exception:
+            pass
+        self._release(pooled)
+
+    def evict_idle(self) -> int:
+        """Close transports that have had no open channels for `idle_timeout` seconds"""
+        now = time.monotonic()
+        with self._cond:
+            self._drop_dead()
+            idle = [
+                t for t in self._transports
+                if t.active_channels == 0 and now - t.last_used >= self.idle_timeout
+            ]
+            for pooled in idle:
+                self._transports.remove(pooled)
+            if idle:
+                self._cond.notify_all()
+        for pooled in idle:
+            pooled.close()
+        if idle:
+            logger.info(f"Evicted {len(idle)} idle SSH transport(s) to {self.host}")
+        return len(idle)
+
+    @property
+    def utilization(self) -> float:
+        return self._active_channels / self.max_channels
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "host": self.host,
+                "port": self.port,
+                "transports": len(self._transports),
+                "connecting": self._connecting,
+                "active_channels": self._active_channels,
+                "pool_size": self.pool_size,
+                "channels_per_transport": self.channels_per_transport,
+                "max_channels": self.max_channels,
+            }
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            transports = self._transports
+            self._transports = []
+            self._active_channels = 0
+            self._cond.notify_all()
+        for pooled in transports:
+            pooled.close()
+
+
+def _kill_process_group(pool: SSHConnectionPool, key: str, then: Optional[Callable[[], None]] = None):
+    """Kill the remote process group recorded under `key`, then call `then`. Blocks."""
+    try:
+        channel, pooled = pool.acquire_channel(timeout=KILL_TIMEOUT)
+    except KaliConnectionError as e:
+        logger.warning(f"Could not kill remote process group {key} on {pool.host}: {str(e)}")
+    else:
+        try:
+            channel.exec_command(kill_command(key))
+            channel.status_event.wait(KILL_TIMEOUT)
+        except Exception as e:
+            logger.warning(f"Could not kill remote process group {key} on {pool.host}: {str(e)}")
+        finally:
+            pool.release_channel(pooled, channel)
+    if then is not None:
+        then()
+
+
+def _kill_in_background(pool: SSHConnectionPool, key: str, then: Optional[Callable[[], None]] = None):
+    # Closing a channel doesn't stop what runs on it, and callers may be on the event loop
+    threading.Thread(target=_kill_process_group, args=(pool, key, then), name="kali-kill", daemon=True).start()
+
+
+def _exit_status(channel: "paramiko.Channel") -> Optional[int]:
+    """The remote exit status, or None if the channel closed without one"""
+    if not channel.exit_status_ready():
+        return None
+    # A channel closed from this side reports -1
+    status = channel.recv_exit_status()
+    return None if status == -1 else status
+
+
+class _SFTPSession:
+    """A persistent SFTP subsystem channel on a pooled transport"""
+
+    def __init__(
+        self,
+        client: "paramiko.SFTPClient",
+        channel: "paramiko.Channel",
+        pool: SSHConnectionPool,
+        pooled: _PooledTransport,
+    ):
+        self.client = client
+        self.channel = channel
+        self.pool = pool
+        self.pooled = pooled
+        self.last_used = time.monotonic()
+
+    @property
+    def alive(self) -> bool:
+        return not self.channel.closed and self.pooled.alive
+
+
+class _FramedOutput:
+    """
+    Passes one stream of a command's output through to `emit` until the
+    command's sentinel line, which ends the stream's output. The rest of
+    that line is kept as `payload`; when it starts with a number, that is
+    the command's exit status.
+    """
+
+    def __init__(self, marker: bytes, emit: Callable[[bytes], None]):
+        self.marker = marker
+        self.emit = emit
+        self.buffer = b""
+        self.done = False
+        self.status: Optional[int] = None
+        self.payload = b""
+
+    def feed(self, data: bytes):
+        if self.done:
+            # Late output of a background job from this command
+            return
+        self.buffer += data
+        index = self.buffer.find(self.marker)
+        if index == -1:
+            # Hold back a possible partial marker at the end
+            keep = len(self.marker) - 1
+            if len(self.buffer) > keep:
+                self.emit(self.buffer[:-keep])
+                self.buffer = self.buffer[-keep:]
+            return
+        if index:
+            self.emit(self.buffer[:index])
+            self.buffer = self.buffer[index:]
+        end = self.buffer.find(b"\n", len(self.marker))
+        if end == -1:
+            return
+        self.payload = self.buffer[len(self.marker):end]
+        fields = self.payload.split()
+        self.status = int(fields[0]) if fields and fields[0].isdigit() else None
+        self.buffer = b""
+        self.done = True
+
+    def flush(self):
+        if self.buffer and not self.done:
+            self.emit(self.buffer)
+        self.buffer = b""
+
+
+class _ShellSession:
+    """
+    A long-lived shell on one pooled channel. Commands are written to the
+    shell's stdin and run back-to-back in it, so cwd, environment and shell
+    variables carry over between them; each one is followed by a unique
+    sentinel on stdout and stderr that marks where its output ends. With
+    `grouped`, the shell leads its own remote process group, which is
+    killed when the session closes, and the stderr sentinel carries the
+    shell's cumulative child CPU time.
+    """
+
+    def __init__(
+        self,
+        session_id: str,
+        backend: "_Backend",
+        channel: "paramiko.Channel",
+        pooled: _PooledTransport,
+        limits: Optional[CommandLimits] = None,
+        grouped: bool = False,
+    ):
+        self.session_id = session_id
+        self.backend = backend
+        self.channel = channel
+        self.pooled = pooled
+        self.limits = limits or CommandLimits()
+        self.grouped = grouped
+        self.lock = threading.Lock()
+        self.created_at = time.time()
+        self.last_used = time.monotonic()
+        self.commands = 0
+        self.cpu_seconds = 0.0
+        self._closed = False
+        self._exited = False
+        self._close_lock = threading.Lock()
+
+    @property
+    def alive(self) -> bool:
+        return not self._closed and not self.channel.closed and self.pooled.alive
+
+    @property
+    def busy(self) -> bool:
+        return self.lock.locked()
+
+    def run(
+        self,
+        command: str,
+        timeout: Optional[float],
+        on_stdout: Callable[[bytes], None],
+        on_stderr: Callable[[bytes], None],
+    ) -> Tuple[Optional[int], bool, Dict[str, Any]]:
+        """
+        Run one command in the shell. Returns (exit_code, timed_out, usage).
+        A command that times out or exceeds the output limit is still
+        running, so the session is closed. Blocks; call with `lock` held.
+        """
+        if not self.alive:
+            raise KaliConnectionError(f"Shell session {self.session_id} is closed")
+        self.commands += 1
+        marker = f"__autopwn_{uuid.uuid4().hex}__"
+        # eval keeps state changes in this shell and turns syntax errors into
+        # a non-zero status instead of swallowing the sentinel lines
+        script = (
+            f"eval {shlex.quote(command)} < /dev/null\n"
+            f"printf '%s%d\\n' '{marker}' \"$?\"; "
+            + (session_usage_script(self.session_id, marker) if self.grouped else f"printf '%s\\n' '{marker}' >&2\n")
+        )
+        stdout = _FramedOutput(marker.encode(), on_stdout)
+        stderr = _FramedOutput(marker.encode(), on_stderr)
+        output_limit = self.limits.output_bytes
+        received = 0
+        deadline = time.monotonic() + timeout if timeout else None
+        try:
+            self.channel.sendall(script.encode())
+            while not (stdout.done and stderr.done):
+                if self.channel.recv_ready():
+                    data = self.channel.recv(RECV_CHUNK_SIZE)
+                    stdout.feed(data)
+                elif self.channel.recv_stderr_ready():
+                    data = self.channel.recv_stderr(RECV_CHUNK_SIZE)
+                    stderr.feed(data)
+                elif self.channel.exit_status_ready() or self.channel.closed:
+                    # The command ended the shell itself (`exit`, `exec`, ...)
+                    stdout.flush()
+                    stderr.flush()
+                    exit_code = _exit_status(self.channel)
+                    self._exited = exit_code is not None
+                    self.close()
+                    return exit_code, False, _usage()
+                else:
+                    wait = 1.0
+                    if deadline is not None:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            stdout.flush()
+                            stderr.flush()
+                            self.close()
+                            return None, True, _usage()
+                        wait = min(wait, remaining)
+                    select.select([self.channel], [], [], wait)
+                    continue
+
+                received += len(data)
+                if output_limit and received > output_limit:
+                    stdout.flush()
+                    stderr.flush()
+                    self.close()
+                    return None, False, _usage(limit_exceeded="output")
+        except (OSError, EOFError) as e:
+            self.close()
+            raise KaliConnectionError(f"Shell session {self.session_id} failed: {e}") from e
+        finally:
+            self.last_used = time.monotonic()
+
+        usage = _usage()
+        total = parse_cpu_times(stderr.payload) if self.grouped else None
+        if total is not None:
+            usage["cpu_seconds"] = round(max(0.0, total - self.cpu_seconds), 3)
+            self.cpu_seconds = total
+            if self.limits.cpu_seconds and (
+                stdout.status == CPU_LIMIT_EXIT_CODE or usage["cpu_seconds"] >= self.limits.cpu_seconds
+            ):
+                usage["limit_exceeded"] = "cpu"
+        return stdout.status, False, usage
+
+    def close(self):
+        """Release the channel and, unless the shell exited, kill its process group"""
+        with self._close_lock:
+            if self._closed:
+                return
+            self._closed = True
+        pool = self.backend.pool
+        if self.grouped and not self._exited:
+            # Killed first: a shell whose channel closes exits on EOF and
+            # forgets its group, leaving background jobs running
+            _kill_in_background(pool, self.session_id, lambda: pool.release_channel(self.pooled, self.channel))
+        else:
+            pool.release_channel(self.pooled, self.channel)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "session_id": self.session_id,
+            "backend": self.backend.name,
+            "alive": self.alive,
+            "busy": self.busy,
+            "commands": self.commands,
+            "cpu_seconds": round(self.cpu_seconds, 3),
+            "created_at": self.created_at,
+            "idle_seconds": round(time.monotonic() - self.last_used, 3),
+        }
+
+
+class _Backend:
+    """One Kali host: its connection pool plus routing and health state"""
+
+    def __init__(self, pool: SSHConnectionPool):
+        self.pool = pool
+        self.name = f"{pool.host}:{pool.port}"
+        self.state = ACTIVE
+        self.consecutive_failures = 0
+        self.load_average: Optional[float] = None
+        self.last_check: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "state": self.state,
+            **self.pool.stats(),
+            "utilization": round(self.pool.utilization, 3),
+            "load_average": self.load_average,
+            "consecutive_failures": self.consecutive_failures,
+            "last_check": self.last_check,
+            "last_error": self.last_error,
+        }
+
+
+# =====================================
+# Kali Service
+# =====================================
+class KaliService:
+    """
+    Executes commands on one or more Kali hosts over pools of persistent SSH
+    transports. New commands go to the least loaded active host; commands
+    given a session ID stay on the host that first ran that ID, and run in
+    that session's shell if one was opened with `open_session`. Hosts are
+    health-checked in the background and ejected after repeated failures.
+    Blocking SSH work runs on a dedicated thread pool so async callers never
+    block the event loop.
+    """
+
+    def __init__(
+        self,
+        host: Optional[str] = None,
+        port: Optional[int] = None,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        key_path: Optional[str] = None,
+        pool_size: Optional[int] = None,
+        channels_per_transport: Optional[int] = None,
+        max_channels: Optional[int] = None,
+        idle_timeout: Optional[float] = None,
+        executor_workers: Optional[int] = None,
+        hosts: Optional[List[Tuple[str, int]]] = None,
+        routing_policy: Optional[str] = None,
+    ):
+        pool_size = pool_size or _env_int("KALI_POOL_SIZE", 4)
+        channels_per_transport = channels_per_transport or _env_int("KALI_CHANNELS_PER_TRANSPORT", 8)
+
+        # KALI_HOSTS ("host[:port],...") takes precedence over KALI_HOST/KALI_PORT
+        default_port = port or _env_int("KALI_PORT", 22)
+        hosts = hosts or _parse_hosts(os.getenv("KALI_HOSTS", ""), default_port) or [
+            (host or os.getenv("KALI_HOST", "localhost"), default_port)
+        ]
+        self.backends = [
+            _Backend(SSHConnectionPool(
+                host=backend_host,
+                port=backend_port,
+                username=username or os.getenv("KALI_USER", "kali"),
+                password=password if password is not None else os.getenv("KALI_PASSWORD"),
+                key_path=key_path or os.getenv("KALI_SSH_KEY_PATH") or None,
+                pool_size=pool_size,
+                channels_per_transport=channels_per_transport,
+                max_channels=max_channels or _env_int("KALI_MAX_CHANNELS", 0) or None,
+                idle_timeout=idle_timeout or _env_int("KALI_IDLE_TIMEOUT", 300),
+                connect_timeout=_env_int("KALI_CONNECT_TIMEOUT", 10),
+                acquire_timeout=_env_int("KALI_ACQUIRE_TIMEOUT", 300),
+            ))
+            for backend_host, backend_port in hosts
+        ]
+        self.name = ",".join(backend.name for backend in self.backends)
+
+        self.routing_policy = routing_policy or os.getenv("KALI_ROUTING_POLICY", "least_channels")
+        if self.routing_policy not in ROUTING_POLICIES:
+            logger.warning(f"Unknown KALI_ROUTING_POLICY {self.routing_policy!r}, using least_channels")
+            self.routing_policy = "least_channels"
+        self.check_interval = _env_int("KALI_BACKEND_CHECK_INTERVAL", 10)
+        self.eject_threshold = _env_int("KALI_EJECT_THRESHOLD", 3)
+
+        # session_id -> backend it is pinned to, least recently used first
+        self._affinity: "OrderedDict[str, _Backend]" = OrderedDict()
+        self._routing_lock = threading.Lock()
+        self._next_backend = 0
+
+        workers = executor_workers or _env_int("KALI_EXECUTOR_WORKERS", 0) or sum(
+            backend.pool.max_channels for backend in self.backends
+        )
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="kali-ssh")
+
+        # Commands run as their own remote process group (setsid), so the whole
+        # group can be killed when a command times out or is cancelled
+        self.process_groups = os.getenv("KALI_PROCESS_GROUPS", "true").lower() == "true"
+        self.limits = CommandLimits.from_env()
+
+        # Streamed output of tools with a parser is also sent as structured events
+        self.parse_output = os.getenv("STREAM_PARSE_OUTPUT", "true").lower() == "true"
+
+        # session_id -> open channel, so sessions can be cancelled from outside
+        self._sessions: Dict[str, "paramiko.Channel"] = {}
+        self._sessions_lock = threading.Lock()
+
+        # Persistent shell sessions by ID; each holds one channel while open
+        self.shell_max_sessions = _env_int("KALI_SHELL_MAX_SESSIONS", 16)
+        self.shell_idle_timeout = _env_int("KALI_SHELL_IDLE_TIMEOUT", 600)
+        self._shells: Dict[str, _ShellSession] = {}
+        self._shells_lock = threading.Lock()
+
+        # Idle SFTP sessions kept open for reuse, most recently used last
+        self.sftp_idle_limit = _env_int("KALI_SFTP_SESSIONS", 2)
+        self._sftp_idle: List[_SFTPSession] = []
+        self._sftp_lock = threading.Lock()
+
+        self._stop_reaper = threading.Event()
+        self._reaper = threading.Thread(target=self._reap_idle, name="kali-ssh-reaper", daemon=True)
+        self._reaper.start()
+        self._monitor = threading.Thread(target=self._monitor_backends, name="kali-backend-monitor", daemon=True)
+        self._monitor.start()
+
+    # ---------------------------------
+    # Internals
+    # ---------------------------------
+    def _reap_idle(self):
+        interval = max(1.0, min([backend.pool.idle_timeout for backend in self.backends] + [self.shell_idle_timeout]) / 2)
+        while not self._stop_reaper.wait(interval):
+            try:
+                self._evict_idle_shells()
+                self._evict_idle_sftp()
+                for backend in self.backends:
+                    backend.pool.evict_idle()
+            except Exception as e:
+                logger.error(f"Idle SSH eviction failed: {str(e)}")
+
+    def _evict_idle_shells(self):
+        now = time.monotonic()
+        with self._shells_lock:
+            idle = [
+                shell for shell in self._shells.values()
+                if not shell.alive or (not shell.busy and now - shell.last_used >= self.shell_idle_timeout)
+            ]
+            for shell in idle:
+                del self._shells[shell.session_id]
+        for shell in idle:
+            shell.close()
+        if idle:
+            logger.info(f"Closed {len(idle)} idle or dead shell session(s)")
+
+    def _evict_idle_sftp(self):
+        now = time.monotonic()
+        with self._sftp_lock:
+            idle = [s for s in self._sftp_idle if not s.alive or now - s.last_used >= s.pool.idle_timeout]
+            self._sftp_idle = [s for s in self._sftp_idle if s not in idle]
+        for session in idle:
+            self._close_sftp(session)
+
+    # ---------------------------------
+    # Backend routing and health
+    # ---------------------------------
+    def _select_backend(self, session_id: Optional[str] = None) -> _Backend:
+        """
+        Pick the backend for new work. A session ID already pinned to a host
+        that hasn't been ejected stays there; otherwise the least loaded
+        active host is chosen (and pinned, if a session ID was given).
+        """
+        with self._routing_lock:
+            if session_id is not None:
+                backend = self._affinity.get(session_id)
+                if backend is not None and backend.state != EJECTED:
+                    self._affinity.move_to_end(session_id)
+                    return backend
+
+            candidates = [b for b in self.backends if b.state == ACTIVE]
+            if not candidates:
+                # Fail open: trying an ejected host beats refusing all work
+                candidates = [b for b in self.backends if b.state == EJECTED]
+            if not candidates:
+                raise KaliConnectionError("No Kali backends are accepting commands")
+
+            # Rotate tie-breaks so a burst of requests spreads across idle hosts
+            self._next_backend = (self._next_backend + 1) % len(self.backends)
+            order = {id(b): (i - self._next_backend) % len(self.backends) for i, b in enumerate(self.backends)}
+            if self.routing_policy == "load_average":
+                backend = min(candidates, key=lambda b: (b.load_average or 0.0, b.pool.utilization, order[id(b)]))
+            else:
+                backend = min(candidates, key=lambda b: (b.pool.utilization, order[id(b)]))
+
+            if session_id is not None:
+                self._affinity[session_id] = backend
+                while len(self._affinity) > AFFINITY_SIZE:
+                    self._affinity.popitem(last=False)
+            return backend
+
+    def _get_backend(self, name: str) -> _Backend:
+        for backend in self.backends:
+            if backend.name == name or backend.pool.host == name:
+                return backend
+        raise KeyError(name)
+
+    def session_backend(self, session_id: str) -> Optional[str]:
+        """Name of the host a session ID is pinned to, if any"""
+        with self._routing_lock:
+            backend = self._affinity.get(session_id)
+        return backend.name if backend is not None else None
+
+    def drain(self, name: str) -> Dict[str, Any]:
+        """Stop routing new work to a host; pinned sessions keep using it"""
+        backend = self._get_backend(name)
+        backend.state = DRAINING
+        logger.info(f"Draining Kali backend {backend.name}")
+        return backend.stats()
+
+    def activate(self, name: str) -> Dict[str, Any]:
+        """Return a drained or ejected host to service"""
+        backend = self._get_backend(name)
+        backend.state = ACTIVE
+        backend.consecutive_failures = 0
+        logger.info(f"Activated Kali backend {backend.name}")
+        return backend.stats()
+
+    def _record_failure(self, backend: _Backend, error: Exception):
+        """Count a failed check or connection; eject the host past the threshold"""
+        backend.consecutive_failures += 1
+        backend.last_error = str(error)
+        if backend.state == ACTIVE and backend.consecutive_failures >= self.eject_threshold:
+            backend.state = EJECTED
+            logger.warning(
+                f"Ejected Kali backend {backend.name} after {backend.consecutive_failures} failures: {error}"
+            )
+
+    def _check_backend(self, backend: _Backend):
+        """Probe one host for reachability and load average. Blocks."""
+        pool = backend.pool
+        if pool.utilization >= 1:
+            # Every channel is busy running commands, which proves the host is up
+            return
+
+        channel = None
+        pooled = None
+        try:
+            channel, pooled = pool.acquire_channel(timeout=pool.connect_timeout)
+            channel.settimeout(pool.connect_timeout)
+            channel.exec_command("cat /proc/loadavg")
+            output = b""
+            while True:
+                data = channel.recv(RECV_CHUNK_SIZE)
+                if not data:
+                    break
+                output += data
+            if channel.recv_exit_status() != 0:
+                raise KaliConnectionError("load average check failed")
+            backend.load_average = float(output.split()[0])
+        except Exception as e:
+            self._record_failure(backend, e)
+        else:
+            if backend.state == EJECTED:
+                logger.info(f"Kali backend {backend.name} recovered, returning it to service")
+                backend.state = ACTIVE
+            backend.consecutive_failures = 0
+            backend.last_error = None
+        finally:
+            backend.last_check = time.time()
+            if channel is not None:
+                pool.release_channel(pooled, channel)
+
+    def _monitor_backends(self):
+        while not self._stop_reaper.wait(self.check_interval):
+            for backend in self.backends:
+                if backend.state == DRAINING:
+                    continue
+                try:
+                    self._check_backend(backend)
+                except Exception as e:
+                    logger.error(f"Health check of {backend.name} crashed: {str(e)}")
+
+    def _register(self, session_id: str, channel: "paramiko.Channel"):
+        with self._sessions_lock:
+            self._sessions[session_id] = channel
+
+    def _unregister(self, session_id: str, channel: "paramiko.Channel"):
+        with self._sessions_lock:
+            if self._sessions.get(session_id) is channel:
+                del self._sessions[session_id]
+
+    def _run(
+        self,
+        command: str,
+        session_id: str,
+        timeout: Optional[float],
+        on_stdout: Callable[[bytes], None],
+        on_stderr: Callable[[bytes], None],
+        pin: bool = False,
+    ) -> Tuple[Optional[int], bool, Dict[str, Any]]:
+        """
+        Run a command on a pooled channel, feeding output to the callbacks.
+        With `pin`, the command runs on the host `session_id` is pinned to.
+        Returns (exit_code, timed_out, usage). A command that doesn't finish
+        (timeout, output limit, cancellation) has its remote process group
+        killed. Blocks; call from the executor.
+        """
+        shell = self._shells.get(session_id) if pin else None
+        if shell is not None:
+            return self._run_in_shell(shell, command, timeout, on_stdout, on_stderr)
+
+        backend = self._select_backend(session_id if pin else None)
+        pool = backend.pool
+        try:
+            channel, pooled = pool.acquire_channel()
+        except KaliConnectionError as e:
+            # Connect errors are chained; a bare timeout only means the host is busy
+            if e.__cause__ is not None:
+                self._record_failure(backend, e)
+            raise
+        self._register(session_id, channel)
+        run_id = uuid.uuid4().hex
+        usage = _usage()
+        stderr = None
+        if self.process_groups:
+            # The wrapper reports exit status and CPU time in a last stderr line
+            stderr = _FramedOutput(f"__autopwn_{run_id}__".encode(), on_stderr)
+            command = wrap_command(command, run_id, self.limits, stderr.marker.decode())
+        feed_stderr = stderr.feed if stderr is not None else on_stderr
+        output_limit = self.limits.output_bytes
+        received = 0
+        timed_out = False
+        finished = False
+        start = time.perf_counter()
+        try:
+            channel.exec_command(command)
+            deadline = time.monotonic() + timeout if timeout else None
+
+            while True:
+                if channel.recv_ready():
+                    data = channel.recv(RECV_CHUNK_SIZE)
+                    on_stdout(data)
+                elif channel.recv_stderr_ready():
+                    data = channel.recv_stderr(RECV_CHUNK_SIZE)
+                    feed_stderr(data)
+                elif channel.exit_status_ready() or channel.closed:
+                    break
+                else:
+                    wait = 1.0
+                    if deadline is not None:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            timed_out = True
+                            break
+                        wait = min(wait, remaining)
+                    select.select([channel], [], [], wait)
+                    continue
+
+                received += len(data)
+                if output_limit and received > output_limit:
+                    usage["limit_exceeded"] = "output"
+                    break
+
+            exit_code = None
+            if not timed_out and not usage["limit_exceeded"]:
+                exit_code = _exit_status(channel)
+                finished = exit_code is not None
+            if stderr is not None:
+                stderr.flush()
+                usage["cpu_seconds"] = parse_cpu_times(stderr.payload)
+                if self.limits.cpu_seconds and (
+                    exit_code == CPU_LIMIT_EXIT_CODE or (usage["cpu_seconds"] or 0) >= self.limits.cpu_seconds
+                ):
+                    usage["limit_exceeded"] = "cpu"
+            return exit_code, timed_out, usage
+        finally:
+            KALI_COMMAND_DURATION.labels(pool.host).observe(time.perf_counter() - start)
+            timing.record("remote_run", time.perf_counter() - start)
+            self._unregister(session_id, channel)
+            pool.release_channel(pooled, channel)
+            if self.process_groups and not finished:
+                _kill_in_background(pool, run_id)
+
+    def _run_in_shell(
+        self,
+        shell: _ShellSession,
+        command: str,
+        timeout: Optional[float],
+        on_stdout: Callable[[bytes], None],
+        on_stderr: Callable[[bytes], None],
+    ) -> Tuple[Optional[int], bool, Dict[str, Any]]:
+        # Commands in one shell run one at a time; waiting counts against the timeout
+        start = time.perf_counter()
+        if not shell.lock.acquire(timeout=timeout if timeout else -1):
+            return None, True, _usage()
+        try:
+            waited = time.perf_counter() - start
+            timing.record("session_wait", waited)
+            remaining = max(0.001, timeout - waited) if timeout else None
+            run_start = time.perf_counter()
+            try:
+                return shell.run(command, remaining, on_stdout, on_stderr)
+            finally:
+                KALI_COMMAND_DURATION.labels(shell.backend.pool.host).observe(time.perf_counter() - run_start)
+                timing.record("remote_run", time.perf_counter() - run_start)
+                if not shell.alive:
+                    with self._shells_lock:
+                        if self._shells.get(shell.session_id) is shell:
+                            del self._shells[shell.session_id]
+        finally:
+            shell.lock.release()
+
+    # ---------------------------------
+    # Shell Sessions
+    # ---------------------------------
+    def open_session(self, session_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Start a persistent shell and return its stats. Later commands given
+        its session ID run in it until it is closed or idles out after
+        KALI_SHELL_IDLE_TIMEOUT seconds. Blocks.
+        """
+        session_id = session_id or str(uuid.uuid4())
+        with self._shells_lock:
+            if session_id in self._shells:
+                raise ValueError(f"Session {session_id} already exists")
+            if len(self._shells) >= self.shell_max_sessions:
+                raise SessionLimitError(f"At most {self.shell_max_sessions} shell sessions can be open")
+
+        backend = self._select_backend(session_id)
+        try:
+            channel, pooled = backend.pool.acquire_channel()
+        except KaliConnectionError as e:
+            if e.__cause__ is not None:
+                self._record_failure(backend, e)
+            raise
+        try:
+            if self.process_groups:
+                channel.exec_command(wrap_shell(SHELL_COMMAND, session_id, self.limits))
+            else:
+                channel.exec_command(SHELL_COMMAND)
+        except Exception as e:
+            backend.pool.release_channel(pooled, channel)
+            raise KaliConnectionError(f"Failed to start shell on {backend.name}: {e}") from e
+        shell = _ShellSession(session_id, backend, channel, pooled, self.limits, grouped=self.process_groups)
+
+        # Re-checked, since other sessions may have opened meanwhile
+        with self._shells_lock:
+            full = len(self._shells) >= self.shell_max_sessions
+            duplicate = session_id in self._shells
+            if not full and not duplicate:
+                self._shells[session_id] = shell
+        if full or duplicate:
+            shell.close()
+            if duplicate:
+                raise ValueError(f"Session {session_id} already exists")
+            raise SessionLimitError(f"At most {self.shell_max_sessions} shell sessions can be open")
+        logger.info(f"Opened shell session {session_id} on {backend.name}")
+        return shell.stats()
+
+    def get_session(self, session_id: str) -> Dict[str, Any]:
+        """Stats of an open shell session; KeyError if there is none"""
+        with self._shells_lock:
+            shell = self._shells[session_id]
+        return shell.stats()
+
+    def list_sessions(self) -> List[Dict[str, Any]]:
+        with self._shells_lock:
+            shells = list(self._shells.values())
+        return [shell.stats() for shell in shells]
+
+    # ---------------------------------
+    # Public API
+    # ---------------------------------
+    def execute_command(
+        self,
+        command: str,
+        session_id: Optional[str] = None,
+        timeout: Optional[int] = 300,
+        sink: Optional[Any] = None,
+    ) -> Dict[str, Any]:
+        """
+        Execute a command and wait for it to finish (blocking).
+        If `sink` is given, output is written to `sink.write(stream, data)`
+        as it arrives and the returned stdout/stderr are empty.
+        Commands with an explicit `session_id` are pinned to one host.
+        """
+        pin = session_id is not None
+        session_id = session_id or str(uuid.uuid4())
+        stdout: List[bytes] = []
+        stderr: List[bytes] = []
+        if sink is not None:
+            on_stdout = lambda data: sink.write("stdout", data)
+            on_stderr = lambda data: sink.write("stderr", data)
+        else:
+            on_stdout, on_stderr = stdout.append, stderr.append
+
+        start_time = time.time()
+        exit_code, timed_out, usage = self._run(command, session_id, timeout, on_stdout, on_stderr, pin=pin)
+        execution_time = time.time() - start_time
+
+        if timed_out:
+            on_stderr(f"\nCommand execution timed out after {timeout} seconds".encode())
+        if usage["limit_exceeded"] == "output":
+            on_stderr(f"\nCommand stopped after exceeding {self.limits.output_bytes} bytes of output".encode())
+
+        return {
+            "stdout": b"".join(stdout).decode("utf-8", errors="replace"),
+            "stderr": b"".join(stderr).decode("utf-8", errors="replace"),
+            "exit_code": exit_code,
+            "success": exit_code == 0 and not timed_out and not usage["limit_exceeded"],
+            "execution_time": execution_time,
+            **usage,
+        }
+
+    async def execute_command_async(
+        self,
+        command: str,
+        session_id: Optional[str] = None,
+        timeout: Optional[int] = 300,
+        sink: Optional[Any] = None,
+    ) -> Dict[str, Any]:
+        """Execute a command on the SSH executor without blocking the event loop"""
+        loop = asyncio.get_running_loop()
+        # Copy the context so phases timed in the worker reach the request
+        return await loop.run_in_executor(
+            self._executor, contextvars.copy_context().run, self.execute_command, command, session_id, timeout, sink
+        )
+
+    async def stream_command(
+        self,
+        command: str,
+        callback: Callable[[Dict[str, Any]], Awaitable[None]],
+        session_id: Optional[str] = None,
+        timeout: Optional[int] = 300,
+    ) -> Dict[str, Any]:
+        """
+        Execute a command and await `callback` with each output chunk as
+        {"type": "stdout"|"stderr", "data": str}, followed by a final
+        {"type": "complete", ...} message. For tools with an output parser,
+        stdout chunks that complete results are followed by a
+        {"type": "parsed", "events": [...]} message, and the complete
+        message carries a `parsed` summary. The SSH reader blocks when the
+        consumer falls STREAM_QUEUE_SIZE chunks behind.
+        """
+        pin = session_id is not None
+        session_id = session_id or str(uuid.uuid4())
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=STREAM_QUEUE_SIZE)
+        cancelled = threading.Event()
+        parser = create_parser(command) if self.parse_output else None
+
+        async def put(message):
+            if cancelled.is_set():
+                raise asyncio.CancelledError()
+            await queue.put(message)
+
+        def emit(message):
+            if cancelled.is_set():
+                raise asyncio.CancelledError()
+            asyncio.run_coroutine_threadsafe(put(message), loop).result()
+
+        def emitter(stream_type):
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+            def handle(data: bytes):
+                text = decoder.decode(data)
+                if text:
+                    emit({"type": stream_type, "data": text})
+                    # Parsed on the reader thread, so the event loop only forwards events
+                    if parser is not None and stream_type == "stdout":
+                        events = parser.feed(text)
+                        if events:
+                            emit({"type": "parsed", "events": events})
+            return handle
+
+        def worker():
+            start_time = time.time()
+            try:
+                exit_code, timed_out, usage = self._run(
+                    command, session_id, timeout, emitter("stdout"), emitter("stderr"), pin=pin
+                )
+                result = {
+                    "type": "complete",
+                    "exit_code": exit_code,
+                    "success": exit_code == 0 and not timed_out and not usage["limit_exceeded"],
+                    "timed_out": timed_out,
+                    "execution_time": time.time() - start_time,
+                    **usage,
+                }
+                if parser is not None:
+                    events = parser.close()
+                    if events:
+                        emit({"type": "parsed", "events": events})
+                    result["parsed"] = parser.summary()
+            except Exception as e:
+                if cancelled.is_set():
+                    raise
+                result = {
+                    "type": "error",
+                    "message": str(e),
+                    "success": False,
+                    "execution_time": time.time() - start_time,
+                }
+            emit(result)
+            emit(None)
+            return result
+
+        future = loop.run_in_executor(self._executor, contextvars.copy_context().run, worker)
+        try:
+            while True:
+                message = await queue.get()
+                if message is None:
+                    break
+                await callback(message)
+            return await future
+        except BaseException:
+            # Stop the remote command and unblock the reader thread
+            cancelled.set()
+            self.close_session(session_id)
+            while not queue.empty():
+                queue.get_nowait()
+            future.add_done_callback(lambda f: f.cancelled() or f.exception())
+            raise
+
+    def close_session(self, session_id: str) -> bool:
+        """
+        Close the shell session or running channel under `session_id`,
+        stopping any command in it. Returns whether there was one.
+        """
+        with self._shells_lock:
+            shell = self._shells.pop(session_id, None)
+        if shell is not None:
+            shell.close()
+            logger.info(f"Closed shell session {session_id}")
+
+        with self._sessions_lock:
+            channel = self._sessions.pop(session_id, None)
+        if channel is not None:
+            try:
+                channel.close()
+            except Exception:
+                pass
+            logger.info(f"Closed SSH session {session_id}")
+        return shell is not None or channel is not None
+
+    def close_all_sessions(self) -> int:
+        """Close every shell session and running channel; returns how many were closed"""
+        with self._shells_lock:
+            session_ids = set(self._shells)
+        with self._sessions_lock:
+            session_ids.update(self._sessions)
+        return sum(1 for session_id in session_ids if self.close_session(session_id))
+
+    # ---------------------------------
+    # SFTP
+    # ---------------------------------
+    def _open_sftp(self) -> _SFTPSession:
+        # Backends are expected to share the workspace volume, so any host will do
+        pool = self._select_backend().pool
+        channel, pooled = pool.acquire_channel()
+        try:
+            channel.invoke_subsystem("sftp")
+            import paramiko
+            client = paramiko.SFTPClient(channel)
+        except Exception as e:
+            pool.release_channel(pooled, channel)
+            raise KaliConnectionError(f"Failed to start SFTP on {pool.host}: {e}") from e
+        return _SFTPSession(client, channel, pool, pooled)
+
+    def _close_sftp(self, session: _SFTPSession):
+        try:
+            session.client.close()
+        except Exception:
+            pass
+        session.pool.release_channel(session.pooled, session.channel)
+
+    def acquire_sftp(self) -> _SFTPSession:
+        """Borrow an idle SFTP session, opening one if none is free. Blocks."""
+        dead = []
+        session = None
+        with self._sftp_lock:
+            while self._sftp_idle:
+                candidate = self._sftp_idle.pop()
+                if candidate.alive:
+                    session = candidate
+                    break
+                dead.append(candidate)
+        for candidate in dead:
+            self._close_sftp(candidate)
+        return session or self._open_sftp()
+
+    def release_sftp(self, session: _SFTPSession):
+        """Return a borrowed SFTP session, keeping it open for reuse if possible"""
+        session.last_used = time.monotonic()
+        with self._sftp_lock:
+            keep = session.alive and len(self._sftp_idle) < self.sftp_idle_limit
+            if keep:
+                self._sftp_idle.append(session)
+        if not keep:
+            self._close_sftp(session)
+
+    @contextmanager
+    def sftp(self) -> Iterator["paramiko.SFTPClient"]:
+        """Borrow an SFTP client for the duration of a block. Blocks."""
+        session = self.acquire_sftp()
+        try:
+            yield session.client
+        finally:
+            self.release_sftp(session)
+
+    async def run_sftp(self, operation: Callable[["paramiko.SFTPClient"], Any]) -> Any:
+        """Run `operation(sftp_client)` on a borrowed session in the SSH executor"""
+        def call():
+            with self.sftp() as client:
+                return operation(client)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, contextvars.copy_context().run, call)
+
+    def run_blocking(self, function: Callable[..., Any], *args: Any) -> asyncio.Future:
+        """
+        Schedule a blocking SSH/SFTP call on the SSH executor. The returned
+        future can be awaited, or left alone for fire-and-forget cleanup.
+        """
+        return asyncio.get_running_loop().run_in_executor(
+            self._executor, contextvars.copy_context().run, function, *args
+        )
+
+    async def warm(self, connections: Optional[int] = None) -> int:
+        """
+        Open `connections` transports to every backend in parallel
+        (KALI_WARM_CONNECTIONS, default 1). Failures are logged, not raised.
+        Returns the number of transports opened.
+        """
+        if connections is None:
+            connections = _env_int("KALI_WARM_CONNECTIONS", 1)
+        loop = asyncio.get_running_loop()
+        attempts = [
+            loop.run_in_executor(self._executor, backend.pool.open_transport)
+            for backend in self.backends
+            for _ in range(min(connections, backend.pool.pool_size))
+        ]
+        results = await asyncio.gather(*attempts, return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                logger.warning(f"SSH warmup connection failed: {str(result)}")
+        return sum(1 for result in results if result is True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Totals across all backends, with per-host detail under "backends" """
+        with self._sessions_lock:
+            sessions = len(self._sessions)
+        with self._shells_lock:
+            shells = len(self._shells)
+        with self._sftp_lock:
+            sftp_idle = len(self._sftp_idle)
+        backends = [backend.stats() for backend in self.backends]
+        return {
+            "host": self.name,
+            "routing_policy": self.routing_policy,
+            "transports": sum(b["transports"] for b in backends),
+            "connecting": sum(b["connecting"] for b in backends),
+            "active_channels": sum(b["active_channels"] for b in backends),
+            "max_channels": sum(b["max_channels"] for b in backends),
+            "sessions": sessions,
+            "shell_sessions": shells,
+            "sftp_idle": sftp_idle,
+            "backends": backends,
+        }
+
+    def shutdown(self):
+        """Close all sessions and pooled transports and stop the executor"""
+        self.close_all_sessions()
+        with self._sftp_lock:
+            idle, self._sftp_idle = self._sftp_idle, []
+        for session in idle:
+            self._close_sftp(session)
+        self._stop_reaper.set()
+        for backend in self.backends:
+            backend.pool.close()
+        self._executor.shutdown(wait=False, cancel_futures=True)
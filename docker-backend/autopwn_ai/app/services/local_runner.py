@@ -0,0 +1,154 @@
+from typing import Any, Dict, Optional
+import os
+import time
+import signal
+import asyncio
+import resource
+from loguru import logger
+
+from app.services.governor import CommandLimits
+
+# =====================================
+# Local Runner Configuration
+# =====================================
+
+# Native binary that executes commands read from stdin
+DEFAULT_RUNNER_PATH = "./binaries/autopwn-runner"
+
+# Seconds to wait for a killed runner to exit before giving up on it
+KILL_GRACE_PERIOD = 5
+
+# Bytes read from the runner's stdout/stderr per read() call
+READ_CHUNK_SIZE = 65536
+
+
+class LocalRunner:
+    """
+    Runs commands through the native autopwn-runner binary using asyncio
+    subprocesses. At most `max_concurrency` runners execute at once; further
+    callers wait their turn, and that wait is reported as `queue_time`.
+    Runners get the same CPU, memory and output limits as remote commands.
+    """
+
+    def __init__(
+        self,
+        runner_path: Optional[str] = None,
+        max_concurrency: Optional[int] = None,
+        limits: Optional[CommandLimits] = None,
+    ):
+        self.runner_path = runner_path or os.getenv("LOCAL_RUNNER_PATH", DEFAULT_RUNNER_PATH)
+        self.max_concurrency = max_concurrency or int(os.getenv("LOCAL_RUNNER_MAX_CONCURRENCY", "4"))
+        self.limits = limits or CommandLimits.from_env()
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._running = 0
+
+    @property
+    def running(self) -> int:
+        return self._running
+
+    async def _kill(self, process: asyncio.subprocess.Process):
+        """Kill the runner and anything it spawned, then reap it"""
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            return
+        try:
+            await asyncio.wait_for(process.wait(), timeout=KILL_GRACE_PERIOD)
+        except asyncio.TimeoutError:
+            logger.error(f"Local runner pid {process.pid} did not exit after kill")
+
+    def _apply_limits(self, pid: int):
+        # The runner waits for its command on stdin, so limits set now cover everything it starts
+        if not hasattr(resource, "prlimit"):
+            return
+        try:
+            if self.limits.cpu_seconds:
+                resource.prlimit(pid, resource.RLIMIT_CPU, (self.limits.cpu_seconds, self.limits.cpu_seconds + 1))
+            if self.limits.memory_mb:
+                memory = self.limits.memory_mb * 1024 * 1024
+                resource.prlimit(pid, resource.RLIMIT_AS, (memory, memory))
+        except OSError as e:
+            logger.warning(f"Could not set limits on local runner pid {pid}: {str(e)}")
+
+    async def _communicate(self, process: asyncio.subprocess.Process, command: str) -> Dict[str, Any]:
+        """Send the command and collect output, killing the runner if it exceeds the output limit"""
+        received = 0
+        exceeded = False
+
+        async def read(stream: asyncio.StreamReader) -> bytes:
+            nonlocal received, exceeded
+            chunks = []
+            while chunk := await stream.read(READ_CHUNK_SIZE):
+                received += len(chunk)
+                if self.limits.output_bytes and received > self.limits.output_bytes:
+                    if not exceeded:
+                        exceeded = True
+                        try:
+                            os.killpg(process.pid, signal.SIGKILL)
+                        except ProcessLookupError:
+                            pass
+                    break
+                chunks.append(chunk)
+            return b"".join(chunks)
+
+        try:
+            process.stdin.write(command.encode())
+            await process.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        process.stdin.close()
+        stdout, stderr = await asyncio.gather(read(process.stdout), read(process.stderr))
+        await process.wait()
+        return {"stdout": stdout, "stderr": stderr, "exceeded": exceeded}
+
+    async def run(self, command: str, timeout: Optional[int] = 300) -> Dict[str, Any]:
+        """Execute a command via the runner, sending it over stdin"""
+        queued_at = time.time()
+        async with self._semaphore:
+            start_time = time.time()
+            queue_time = start_time - queued_at
+            self._running += 1
+            try:
+                process = await asyncio.create_subprocess_exec(
+                    self.runner_path,
+                    stdin=asyncio.subprocess.PIPE,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE,
+                    start_new_session=True,
+                )
+                self._apply_limits(process.pid)
+                try:
+                    output = await asyncio.wait_for(self._communicate(process, command), timeout=timeout)
+                except asyncio.TimeoutError:
+                    await self._kill(process)
+                    return {
+                        "stdout": "",
+                        "stderr": "Command execution timed out",
+                        "exit_code": None,
+                        "success": False,
+                        "execution_time": time.time() - start_time,
+                        "queue_time": queue_time,
+                        "limit_exceeded": None,
+                    }
+                except asyncio.CancelledError:
+                    await self._kill(process)
+                    raise
+
+                stderr = output["stderr"].decode("utf-8", errors="replace")
+                limit_exceeded = None
+                if output["exceeded"]:
+                    limit_exceeded = "output"
+                    stderr += f"\nCommand stopped after exceeding {self.limits.output_bytes} bytes of output"
+                elif process.returncode == -signal.SIGXCPU:
+                    limit_exceeded = "cpu"
+                return {
+                    "stdout": output["stdout"].decode("utf-8", errors="replace"),
+                    "stderr": stderr,
+                    "exit_code": process.returncode,
+                    "success": process.returncode == 0 and limit_exceeded is None,
+                    "execution_time": time.time() - start_time,
+                    "queue_time": queue_time,
+                    "limit_exceeded": limit_exceeded,
+                }
+            finally:
+                self._running -= 1
@@ -0,0 +1,290 @@
+from typing import Callable, Dict, List, Optional
+import re
+import xml.etree.ElementTree as ET
+from loguru import logger
+
+from app.utils.tool_validator import get_base_command
+
+# =====================================
+# Output Parser Configuration
+# =====================================
+
+# Longest line a line parser buffers; the rest of a longer line is skipped
+MAX_LINE_LENGTH = 64 * 1024
+
+Event = Dict[str, object]
+
+
+class OutputParser:
+    """
+    Turns a tool's stdout into structured events ({"kind": "host"|"port"|
+    "finding", ...}) as it arrives. Parsers keep only the state needed for
+    the next event, so memory use does not grow with the output. A parser
+    that hits an error stops parsing rather than failing the command.
+    """
+
+    tool = ""
+
+    def __init__(self):
+        self.counts: Dict[str, int] = {}
+        self.failed = False
+
+    def _event(self, kind: str, **fields) -> Event:
+        self.counts[kind] = self.counts.get(kind, 0) + 1
+        return {"kind": kind, **fields}
+
+    def _parse(self, text: str) -> List[Event]:
+        raise NotImplementedError
+
+    def _finish(self) -> List[Event]:
+        return []
+
+    def _guard(self, parse: Callable[[], List[Event]]) -> List[Event]:
+        if self.failed:
+            return []
+        try:
+            return parse()
+        except Exception as e:
+            logger.warning(f"{self.tool} output parser failed, no more events for this command: {str(e)}")
+            self.failed = True
+            return []
+
+    def feed(self, text: str) -> List[Event]:
+        """Events completed by the next piece of output"""
+        return self._guard(lambda: self._parse(text))
+
+    def close(self) -> List[Event]:
+        """Events still pending once the output has ended"""
+        return self._guard(self._finish)
+
+    def summary(self) -> Dict[str, object]:
+        return {"tool": self.tool, "events": dict(self.counts), "failed": self.failed}
+
+
+class LineParser(OutputParser):
+    """Parser for tools that report one result per line"""
+
+    def __init__(self):
+        super().__init__()
+        self._partial = ""
+        self._skipping = False
+
+    def parse_line(self, line: str) -> Optional[Event]:
+        raise NotImplementedError
+
+    def _lines(self, lines: List[str]) -> List[Event]:
+        events = []
+        for line in lines:
+            event = self.parse_line(line.rstrip("\r"))
+            if event is not None:
+                events.append(event)
+        return events
+
+    def _parse(self, text: str) -> List[Event]:
+        lines = (self._partial + text).split("\n")
+        self._partial = lines.pop()
+        if self._skipping and lines:
+            # The first completed line is the tail of an overlong one
+            lines.pop(0)
+            self._skipping = False
+        if len(self._partial) > MAX_LINE_LENGTH:
+            self._partial = ""
+            self._skipping = True
+        return self._lines(lines)
+
+    def _finish(self) -> List[Event]:
+        partial, self._partial = self._partial, ""
+        return self._lines([partial]) if partial and not self._skipping else []
+
+
+# =====================================
+# Tool Parsers
+# =====================================
+
+
+class NmapTextParser(LineParser):
+    """nmap's normal output: report headers, port table rows and script output"""
+
+    tool = "nmap"
+
+    _HOST = re.compile(r"^Nmap scan report for (?:(\S+) \()?([^\s()]+)\)?$")
+    _PORT = re.compile(r"^(\d+)/(tcp|udp|sctp)\s+(\S+)\s+(\S+)(?:\s+(.+))?$")
+    _SCRIPT = re.compile(r"^\|[_ ]([\w.-]+):\s?(.*)$")
+    _OS = re.compile(r"^(?:OS details|Running): (.+)$")
+
+    def __init__(self):
+        super().__init__()
+        self._host: Optional[str] = None
+        self._port: Optional[int] = None
+
+    def parse_line(self, line: str) -> Optional[Event]:
+        match = self._HOST.match(line)
+        if match:
+            hostname, address = match.groups()
+            self._host, self._port = address, None
+            return self._event("host", host=address, hostname=hostname)
+        match = self._PORT.match(line)
+        if match:
+            port, protocol, state, service, version = match.groups()
+            self._port = int(port)
+            return self._event(
+                "port", host=self._host, port=self._port, protocol=protocol,
+                state=state, service=service, version=version
+            )
+        match = self._SCRIPT.match(line)
+        if match:
+            script, output = match.groups()
+            return self._event("finding", host=self._host, port=self._port, source=script, detail=output)
+        match = self._OS.match(line)
+        if match:
+            return self._event("os", host=self._host, detail=match.group(1))
+        return None
+
+
+class NmapXmlParser(OutputParser):
+    """
+    nmap's XML output (`-oX -`), parsed incrementally. Each <host> element
+    is turned into events and discarded as soon as it is complete.
+    """
+
+    tool = "nmap"
+
+    def __init__(self):
+        super().__init__()
+        self._parser = ET.XMLPullParser(events=("start", "end"))
+        self._root: Optional[ET.Element] = None
+
+    def _host_events(self, host: ET.Element) -> List[Event]:
+        addresses = {a.get("addrtype"): a.get("addr") for a in host.iter("address")}
+        address = addresses.get("ipv4") or addresses.get("ipv6") or next(iter(addresses.values()), None)
+        hostname = host.find("hostnames/hostname")
+        status = host.find("status")
+        events = [self._event(
+            "host",
+            host=address,
+            hostname=hostname.get("name") if hostname is not None else None,
+            state=status.get("state") if status is not None else None,
+        )]
+        for port in host.iter("port"):
+            state = port.find("state")
+            service = port.find("service")
+            version = None
+            if service is not None:
+                version = " ".join(filter(None, (service.get(k) for k in ("product", "version", "extrainfo")))) or None
+            events.append(self._event(
+                "port",
+                host=address,
+                port=int(port.get("portid", 0)),
+                protocol=port.get("protocol"),
+                state=state.get("state") if state is not None else None,
+                service=service.get("name") if service is not None else None,
+                version=version,
+            ))
+            for script in port.iter("script"):
+                events.append(self._event(
+                    "finding", host=address, port=int(port.get("portid", 0)),
+                    source=script.get("id"), detail=(script.get("output") or "").strip()
+                ))
+        for script in host.findall("hostscript/script"):
+            events.append(self._event(
+                "finding", host=address, port=None, source=script.get("id"),
+                detail=(script.get("output") or "").strip()
+            ))
+        return events
+
+    def _drain(self) -> List[Event]:
+        events = []
+        for kind, element in self._parser.read_events():
+            if kind == "start":
+                if self._root is None:
+                    self._root = element
+                continue
+            if element.tag == "host":
+                events.extend(self._host_events(element))
+                # Drop finished hosts and everything before them from the tree
+                if self._root is not None:
+                    self._root.clear()
+        return events
+
+    def _parse(self, text: str) -> List[Event]:
+        self._parser.feed(text)
+        return self._drain()
+
+    def _finish(self) -> List[Event]:
+        self._parser.close()
+        return self._drain()
+
+
+class MasscanParser(LineParser):
+    """masscan's console output"""
+
+    tool = "masscan"
+
+    _PORT = re.compile(r"^Discovered open port (\d+)/(\w+) on (\S+)")
+
+    def parse_line(self, line: str) -> Optional[Event]:
+        match = self._PORT.match(line)
+        if match is None:
+            return None
+        port, protocol, host = match.groups()
+        return self._event("port", host=host, port=int(port), protocol=protocol, state="open")
+
+
+class GobusterParser(LineParser):
+    """gobuster dir/vhost results"""
+
+    tool = "gobuster"
+
+    _RESULT = re.compile(r"^(?:Found: )?(\S+)\s+\(Status: (\d+)\)(?:\s+\[Size: (\d+)\])?(?:\s+\[--> (\S+)\])?")
+
+    def parse_line(self, line: str) -> Optional[Event]:
+        match = self._RESULT.match(line)
+        if match is None:
+            return None
+        path, status, size, redirect = match.groups()
+        return self._event(
+            "finding", path=path, status=int(status), size=int(size) if size else None, redirect=redirect
+        )
+
+
+class NiktoParser(LineParser):
+    """nikto's "+ " result lines, skipping the scan metadata"""
+
+    tool = "nikto"
+
+    _FINDING = re.compile(r"^\+ (?:\[(\d+)\] )?(?:(OSVDB-\d+): )?(?:(/\S*): )?(.+)$")
+    _METADATA = re.compile(
+        r"^\+ (Target (IP|Hostname|Port)|Start Time|End Time|SSL Info|\d+ host\(s\) tested|"
+        r"\d+ requests?:|ERROR:|No CGI Directories)"
+    )
+
+    def parse_line(self, line: str) -> Optional[Event]:
+        if self._METADATA.match(line):
+            return None
+        match = self._FINDING.match(line)
+        if match is None:
+            return None
+        test_id, osvdb, path, message = match.groups()
+        return self._event("finding", path=path, reference=osvdb or test_id, detail=message)
+
+
+def _nmap_parser(command: str) -> OutputParser:
+    # Only `-oX -` sends XML to stdout; any other -oX target leaves stdout as text
+    if re.search(r"(?:^|\s)-oX\s+-(?:\s|$)", command):
+        return NmapXmlParser()
+    return NmapTextParser()
+
+
+# Parser factories by executable name, as derived by the command validator
+PARSERS: Dict[str, Callable[[str], OutputParser]] = {
+    "nmap": _nmap_parser,
+    "masscan": lambda command: MasscanParser(),
+    "gobuster": lambda command: GobusterParser(),
+    "nikto": lambda command: NiktoParser(),
+}
+
+
+def create_parser(command: str) -> Optional[OutputParser]:
+    """Parser for the output of `command`, or None if its tool has none"""
+    factory = PARSERS.get(get_base_command(command).lower())
+    return factory(command) if factory else None
@@ -0,0 +1,296 @@
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from collections import OrderedDict
+import os
+import time
+import uuid
+import zlib
+import bisect
+import threading
+from loguru import logger
+
+# =====================================
+# Output Store Configuration
+# =====================================
+
+# Uncompressed bytes per on-disk block; each block is compressed independently
+# so ranges can be served by decompressing only the blocks they touch
+BLOCK_SIZE = 256 * 1024
+
+STREAMS = ("stdout", "stderr")
+
+
+class OutputStream:
+    """
+    Captured output of one stream (stdout or stderr).
+    Output stays in memory until it exceeds `spill_threshold`, then is written
+    to a segment file as independently zlib-compressed blocks. The first and
+    last `preview_bytes` are always kept in memory for response previews.
+    """
+
+    def __init__(self, path: str, spill_threshold: int, preview_bytes: int):
+        self.path = path
+        self.spill_threshold = spill_threshold
+        self.preview_bytes = preview_bytes
+
+        self.size = 0
+        self.lines = 0
+        self.head = bytearray()
+        self.tail = bytearray()
+
+        self._pending = bytearray()
+        self._file = None
+        # Per spilled block: uncompressed offset, newlines before it,
+        # and (file offset, compressed length, uncompressed length)
+        self._block_offsets: List[int] = []
+        self._block_lines: List[int] = []
+        self._blocks: List[Tuple[int, int, int]] = []
+        self._file_size = 0
+        self._discarded = False
+        self._lock = threading.Lock()
+
+    @property
+    def spilled(self) -> bool:
+        return self._file is not None
+
+    def write(self, data: bytes):
+        if not data:
+            return
+        with self._lock:
+            if self._discarded:
+                # A cancelled command's reader can still be delivering output
+                return
+            if len(self.head) < self.preview_bytes:
+                self.head += data[:self.preview_bytes - len(self.head)]
+            self.tail += data[-self.preview_bytes:]
+            del self.tail[:-self.preview_bytes]
+
+            self.size += len(data)
+            self._pending += data
+
+            if self._file is None and len(self._pending) > self.spill_threshold:
+                self._file = open(self.path, "wb")
+            if self._file is not None:
+                while len(self._pending) >= BLOCK_SIZE:
+                    self._flush_block(bytes(self._pending[:BLOCK_SIZE]))
+                    del self._pending[:BLOCK_SIZE]
+
+    def _flush_block(self, block: bytes):
+        compressed = zlib.compress(block, 6)
+        self._file.write(compressed)
+        self._block_offsets.append(self.size - len(self._pending))
+        self._block_lines.append(self.lines)
+        self._blocks.append((self._file_size, len(compressed), len(block)))
+        self._file_size += len(compressed)
+        self.lines += block.count(b"\n")
+
+    def close(self, spill: bool = False):
+        """
+        Flush buffered output once the command has finished. With `spill`,
+        output still held in memory is moved to disk as well.
+        """
+        with self._lock:
+            if self._file is None and spill and self._pending:
+                self._file = open(self.path, "wb")
+            if self._file is not None:
+                while self._pending:
+                    self._flush_block(bytes(self._pending[:BLOCK_SIZE]))
+                    del self._pending[:BLOCK_SIZE]
+                self._file.close()
+            else:
+                self.lines = self._pending.count(b"\n")
+        # Count a trailing unterminated line
+        if self.size and not self.tail.endswith(b"\n"):
+            self.lines += 1
+
+    def discard(self):
+        """Close and delete the segment; later writes are ignored"""
+        with self._lock:
+            self._discarded = True
+            self._pending = bytearray()
+            if self._file is not None:
+                self._file.close()
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+    def _iter_blocks(self, first: int) -> Iterator[bytes]:
+        """Yield uncompressed blocks starting at block index `first`"""
+        if not self.spilled:
+            yield bytes(self._pending)
+            return
+        with open(self.path, "rb") as f:
+            for file_offset, compressed_len, _ in self._blocks[first:]:
+                f.seek(file_offset)
+                yield zlib.decompress(f.read(compressed_len))
+
+    def read_bytes(self, offset: int, limit: int) -> Iterator[bytes]:
+        """Yield up to `limit` bytes starting at byte `offset`"""
+        if offset >= self.size or limit <= 0:
+            return
+        first = max(0, bisect.bisect_right(self._block_offsets, offset) - 1) if self.spilled else 0
+        position = self._block_offsets[first] if self.spilled else 0
+        for block in self._iter_blocks(first):
+            start = max(0, offset - position)
+            position += len(block)
+            if start >= len(block):
+                continue
+            chunk = block[start:start + limit]
+            limit -= len(chunk)
+            yield chunk
+            if limit <= 0:
+                return
+
+    def read_lines(self, offset: int, limit: int) -> Iterator[bytes]:
+        """Yield up to `limit` lines starting at line `offset` (0-based)"""
+        if limit <= 0:
+            return
+        # The line starts after newline number `offset`, in the last block
+        # with fewer newlines than that before it
+        first = max(0, bisect.bisect_left(self._block_lines, offset) - 1) if self.spilled else 0
+        skip = offset - (self._block_lines[first] if self.spilled else 0)
+        for block in self._iter_blocks(first):
+            start = 0
+            while skip > 0:
+                newline = block.find(b"\n", start)
+                if newline < 0:
+                    break
+                start = newline + 1
+                skip -= 1
+            if skip > 0:
+                continue
+
+            end = start
+            while limit > 0:
+                newline = block.find(b"\n", end)
+                if newline < 0:
+                    end = len(block)
+                    break
+                end = newline + 1
+                limit -= 1
+            if end > start:
+                yield block[start:end]
+            if limit <= 0:
+                return
+
+
+class OutputCapture:
+    """Sink for one command's stdout and stderr, passed to KaliService"""
+
+    def __init__(self, output_id: str, directory: str, spill_threshold: int, preview_bytes: int):
+        self.output_id = output_id
+        self.created_at = time.time()
+        self.streams = {
+            name: OutputStream(
+                os.path.join(directory, f"{output_id}.{name}.seg"), spill_threshold, preview_bytes
+            )
+            for name in STREAMS
+        }
+
+    def write(self, stream: str, data: bytes):
+        self.streams[stream].write(data)
+
+    def close(self, spill: bool = False):
+        for stream in self.streams.values():
+            stream.close(spill)
+
+    def discard(self):
+        for stream in self.streams.values():
+            stream.discard()
+
+    @property
+    def truncated(self) -> bool:
+        return any(s.size > 2 * s.preview_bytes for s in self.streams.values())
+
+    def preview(self, name: str) -> str:
+        """Full output if small, otherwise its head and tail around a marker"""
+        stream = self.streams[name]
+        if stream.size <= 2 * stream.preview_bytes:
+            rest = stream.size - len(stream.head)
+            data = bytes(stream.head) + (bytes(stream.tail[-rest:]) if rest else b"")
+            return data.decode("utf-8", errors="replace")
+        omitted = stream.size - len(stream.head) - len(stream.tail)
+        return (
+            stream.head.decode("utf-8", errors="replace")
+            + f"\n... [{omitted} bytes truncated, fetch /outputs/{self.output_id}?stream={name}] ...\n"
+            + stream.tail.decode("utf-8", errors="replace")
+        )
+
+    def response_fields(self) -> Dict[str, Any]:
+        """CommandResponse fields describing this output"""
+        return {
+            "stdout": self.preview("stdout"),
+            "stderr": self.preview("stderr"),
+            "output_id": self.output_id if self.truncated else None,
+            "truncated": self.truncated,
+            "stdout_size": self.streams["stdout"].size,
+            "stderr_size": self.streams["stderr"].size,
+        }
+
+
+class OutputStore:
+    """
+    Keeps captured outputs that were too large to return inline, so they can
+    be fetched in ranges later. Entries expire after `retention` seconds and
+    the oldest are evicted beyond `max_entries`.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        spill_threshold: Optional[int] = None,
+        preview_bytes: Optional[int] = None,
+        retention: Optional[float] = None,
+        max_entries: Optional[int] = None,
+    ):
+        self.directory = directory or os.getenv("OUTPUT_STORE_DIR", "outputs")
+        self.spill_threshold = spill_threshold or int(os.getenv("OUTPUT_SPILL_THRESHOLD", str(1024 * 1024)))
+        self.preview_bytes = preview_bytes or int(os.getenv("OUTPUT_PREVIEW_BYTES", str(16 * 1024)))
+        self.retention = retention or float(os.getenv("OUTPUT_RETENTION", "3600"))
+        self.max_entries = max_entries or int(os.getenv("OUTPUT_MAX_ENTRIES", "256"))
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._outputs: "OrderedDict[str, OutputCapture]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, output_id: Optional[str] = None) -> OutputCapture:
+        return OutputCapture(
+            output_id or str(uuid.uuid4()), self.directory, self.spill_threshold, self.preview_bytes
+        )
+
+    def finish(self, capture: OutputCapture):
+        """Close a capture, keeping it on disk only if its output was truncated"""
+        capture.close(spill=capture.truncated)
+        if not capture.truncated:
+            capture.discard()
+            return
+
+        with self._lock:
+            self._outputs[capture.output_id] = capture
+            evicted = self._expire()
+        for old in evicted:
+            old.discard()
+
+    def _expire(self) -> List[OutputCapture]:
+        cutoff = time.time() - self.retention
+        evicted = []
+        while self._outputs:
+            output_id, capture = next(iter(self._outputs.items()))
+            if capture.created_at >= cutoff and len(self._outputs) <= self.max_entries:
+                break
+            del self._outputs[output_id]
+            evicted.append(capture)
+        if evicted:
+            logger.debug(f"Evicted {len(evicted)} stored output(s)")
+        return evicted
+
+    def get(self, output_id: str) -> Optional[OutputCapture]:
+        with self._lock:
+            return self._outputs.get(output_id)
+
+    def clear(self):
+        with self._lock:
+            outputs = list(self._outputs.values())
+            self._outputs.clear()
+        for capture in outputs:
+            capture.discard()
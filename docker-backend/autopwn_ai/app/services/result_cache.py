@@ -0,0 +1,180 @@
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+from collections import OrderedDict
+import os
+import time
+import shlex
+import asyncio
+
+from app.services.governor import QuotaExceededError
+from app.utils.tool_validator import get_base_command
+
+# =====================================
+# Result Cache Configuration
+# =====================================
+
+# Shell syntax that can chain, redirect or substitute; commands containing
+# any of it are never cached. Newlines separate commands like ";" does.
+UNCACHEABLE_CHARS = frozenset(";&|<>`$\n\r")
+
+# Cache statuses reported to callers
+HIT = "HIT"
+MISS = "MISS"
+COALESCED = "COALESCED"
+BYPASS = "BYPASS"
+UNCACHEABLE = "UNCACHEABLE"
+
+
+def normalize_command(command: str) -> str:
+    """Canonical form of a command, so spacing and quoting style don't matter"""
+    try:
+        return shlex.join(shlex.split(command))
+    except ValueError:
+        return " ".join(command.split())
+
+
+class _Flight:
+    """One shared execution and the number of requests waiting on it"""
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class ResultCache:
+    """
+    Opt-in TTL/LRU cache for read-only commands.
+    Only commands whose base command is in `allowlist` and that contain no
+    chaining or redirection are cached. Concurrent identical requests share
+    a single execution, whether or not a cached result exists yet. The
+    execution runs as its own task and is cancelled only once every request
+    waiting on it has gone.
+    """
+
+    def __init__(
+        self,
+        allowlist: Optional[Set[str]] = None,
+        ttl: Optional[float] = None,
+        max_entries: Optional[int] = None,
+    ):
+        if allowlist is None:
+            allowlist = {
+                name.strip() for name in os.getenv("RESULT_CACHE_ALLOWLIST", "").split(",") if name.strip()
+            }
+        self.allowlist = allowlist
+        self.ttl = ttl or float(os.getenv("RESULT_CACHE_TTL", "30"))
+        self.max_entries = max_entries or int(os.getenv("RESULT_CACHE_SIZE", "512"))
+
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._inflight: Dict[Tuple[str, str], _Flight] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.bypassed = 0
+
+    def is_cacheable(self, command: str) -> bool:
+        if not self.allowlist or not UNCACHEABLE_CHARS.isdisjoint(command):
+            return False
+        return get_base_command(command) in self.allowlist
+
+    def _lookup(self, key: Tuple[str, str]) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, result = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return result
+
+    def _store(self, key: Tuple[str, str], result: Dict[str, Any]):
+        self._entries[key] = (time.monotonic() + self.ttl, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _start(self, key: Tuple[str, str], execute: Callable[[], Awaitable[Dict[str, Any]]]) -> _Flight:
+        flight = _Flight(asyncio.ensure_future(execute()))
+        self._inflight[key] = flight
+
+        def finished(task: asyncio.Task):
+            if self._inflight.get(key) is flight:
+                del self._inflight[key]
+            if task.cancelled():
+                return
+            # Retrieved so a failure nobody waited for isn't logged as unhandled
+            if task.exception() is None and task.result().get("success"):
+                self._store(key, task.result())
+        flight.task.add_done_callback(finished)
+        return flight
+
+    async def _wait(self, flight: _Flight) -> Dict[str, Any]:
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if not flight.waiters and not flight.task.done():
+                flight.task.cancel()
+
+    async def run(
+        self,
+        command: str,
+        context: str,
+        execute: Callable[[], Awaitable[Dict[str, Any]]],
+        bypass: bool = False,
+        admit: Optional[Callable[[], Awaitable[None]]] = None,
+    ) -> Tuple[Dict[str, Any], str]:
+        """
+        Return a result for `command` in `context`, executing it only if no
+        fresh cached or in-flight result can be used. `admit` is awaited
+        before a caller starts or joins an execution and may raise, e.g.
+        when the caller is over quota. Returns (result, cache_status).
+        """
+        if not self.is_cacheable(command):
+            if admit is not None:
+                await admit()
+            return await execute(), UNCACHEABLE
+
+        key = (normalize_command(command), context)
+        if bypass:
+            self.bypassed += 1
+        else:
+            result = self._lookup(key)
+            if result is not None:
+                self.hits += 1
+                return result, HIT
+        if admit is not None:
+            await admit()
+
+        while True:
+            flight = None if bypass else self._inflight.get(key)
+            if flight is None:
+                if not bypass:
+                    self.misses += 1
+                return await self._wait(self._start(key, execute)), BYPASS if bypass else MISS
+            self.coalesced += 1
+            try:
+                return await self._wait(flight), COALESCED
+            except QuotaExceededError:
+                # The quota of whoever started the execution ran out; this
+                # caller was admitted on its own, so run it under its own key
+                continue
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "bypassed": self.bypassed,
+            "hit_ratio": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+            "in_flight": len(self._inflight),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "allowlist": sorted(self.allowlist),
+        }
+
+    def clear(self):
+        self._entries.clear()
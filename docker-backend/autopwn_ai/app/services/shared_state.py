@@ -0,0 +1,415 @@
+from typing import Any, Callable, Dict, Optional, Tuple, TypeVar
+from concurrent.futures import ThreadPoolExecutor
+import os
+import time
+import uuid
+import asyncio
+import sqlite3
+import functools
+import threading
+from loguru import logger
+
+# =====================================
+# Shared State Configuration
+# =====================================
+# State that has to agree across uvicorn workers: rate-limit windows, which
+# worker owns a job/session/output/upload, and where each worker can be
+# reached. With SHARED_STATE_BACKEND=memory (the default) none of this is
+# shared and the service behaves as a single process.
+
+BACKENDS = ("memory", "sqlite", "redis")
+
+T = TypeVar("T")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rate_buckets (
+    bucket TEXT PRIMARY KEY,
+    next_slot INTEGER NOT NULL,
+    last_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS rate_slots (
+    bucket TEXT NOT NULL,
+    slot INTEGER NOT NULL,
+    at REAL NOT NULL,
+    PRIMARY KEY (bucket, slot)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_rate_buckets_last ON rate_buckets (last_at);
+CREATE TABLE IF NOT EXISTS owners (
+    resource_id TEXT PRIMARY KEY,
+    worker_id TEXT NOT NULL,
+    claimed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS workers (
+    worker_id TEXT PRIMARY KEY,
+    address TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS quota_running (
+    key TEXT NOT NULL,
+    worker_id TEXT NOT NULL,
+    running INTEGER NOT NULL,
+    PRIMARY KEY (key, worker_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS quota_cpu (
+    key TEXT NOT NULL,
+    at REAL NOT NULL,
+    seconds REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_quota_cpu_key_at ON quota_cpu (key, at);
+"""
+
+# Sliding-window check-and-add, atomic on the Redis server
+REDIS_HIT_SCRIPT = """
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - window)
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[3]) then
+    local oldest = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+    return {0, tostring(tonumber(oldest[2]) + window - now)}
+end
+redis.call('ZADD', KEYS[1], now, ARGV[4])
+redis.call('PEXPIRE', KEYS[1], math.ceil(window * 1000))
+return {1, '0'}
+"""
+
+# Running-command count across live workers, incremented only if under the limit
+REDIS_ACQUIRE_SCRIPT = """
+local total = 0
+local running = redis.call('HGETALL', KEYS[1])
+for i = 1, #running, 2 do
+    if running[i] == ARGV[1] or redis.call('EXISTS', ARGV[3] .. running[i]) == 1 then
+        total = total + tonumber(running[i + 1])
+    else
+        redis.call('HDEL', KEYS[1], running[i])
+    end
+end
+if tonumber(ARGV[2]) > 0 and total >= tonumber(ARGV[2]) then
+    return -1
+end
+redis.call('HINCRBY', KEYS[1], ARGV[1], 1)
+return total + 1
+"""
+
+
+class SharedState:
+    """
+    Interface of a shared-state backend. Calls are blocking: a SQLite write
+    can wait seconds for another worker's lock and Redis calls are network
+    round trips. Async code makes them through run(), which uses a small
+    thread pool so the event loop never waits on the backend.
+    """
+
+    name = "shared"
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("SHARED_STATE_THREADS", "4")), thread_name_prefix="shared-state"
+        )
+
+    async def run(self, method: Callable[..., T], *args: Any) -> T:
+        """Await a blocking backend call on the shared-state thread pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(method, *args))
+
+    def hit(self, bucket: str, limit: int, window: float) -> Tuple[bool, float]:
+        """Record a request in a sliding window; returns (allowed, retry_after_seconds)"""
+        raise NotImplementedError
+
+    def sweep_hits(self, window: float) -> int:
+        """Drop rate-limit buckets idle for `window`"""
+        return 0
+
+    def claim(self, resource_id: str, worker_id: str):
+        """Record `worker_id` as the owner of a job, session, output or upload"""
+        raise NotImplementedError
+
+    def release(self, resource_id: str):
+        raise NotImplementedError
+
+    def owner(self, resource_id: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def register_worker(self, worker_id: str, address: str, ttl: float):
+        """Advertise (or refresh) a worker's internal address for `ttl` seconds"""
+        raise NotImplementedError
+
+    def unregister_worker(self, worker_id: str):
+        raise NotImplementedError
+
+    def worker_address(self, worker_id: str) -> Optional[str]:
+        """Internal address of a live worker, or None if it stopped heartbeating"""
+        raise NotImplementedError
+
+    def sweep_owners(self, max_age: float) -> int:
+        """Drop ownership records older than `max_age` or held by dead workers"""
+        return 0
+
+    def try_acquire_slot(self, key: str, worker_id: str, limit: int) -> bool:
+        """Count a running command for `key` unless live workers already run `limit` (0: no limit)"""
+        raise NotImplementedError
+
+    def release_slot(self, key: str, worker_id: str):
+        raise NotImplementedError
+
+    def running(self, key: str) -> int:
+        """Commands running for `key` on live workers"""
+        raise NotImplementedError
+
+    def add_cpu(self, key: str, seconds: float):
+        """Charge CPU seconds used by a finished command to `key`"""
+        raise NotImplementedError
+
+    def cpu_used(self, key: str, window: float) -> float:
+        """CPU seconds charged to `key` within the last `window` seconds"""
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name}
+
+
+class SQLiteSharedState(SharedState):
+    """
+    Shared state in a SQLite database in WAL mode, for workers on one host.
+    Each thread gets its own connection. A rate-limit bucket is a ring of
+    `limit` timestamp slots, like the in-process limiter's deque, so a check
+    is a few primary-key lookups however large the limit; it runs in an
+    IMMEDIATE transaction so concurrent workers can't both take the last slot.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: Optional[str] = None):
+        super().__init__()
+        self.path = path or os.getenv("SHARED_STATE_PATH", "data/shared-state.db")
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def hit(self, bucket: str, limit: int, window: float) -> Tuple[bool, float]:
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT next_slot FROM rate_buckets WHERE bucket = ?", (bucket,)).fetchone()
+            slot = row[0] % limit if row else 0
+            # The slot about to be overwritten holds the oldest timestamp in the ring
+            row = conn.execute("SELECT at FROM rate_slots WHERE bucket = ? AND slot = ?", (bucket, slot)).fetchone()
+            if row is not None and now - row[0] < window:
+                return False, window - (now - row[0])
+            conn.execute("INSERT OR REPLACE INTO rate_slots (bucket, slot, at) VALUES (?, ?, ?)", (bucket, slot, now))
+            conn.execute(
+                "INSERT OR REPLACE INTO rate_buckets (bucket, next_slot, last_at) VALUES (?, ?, ?)",
+                (bucket, (slot + 1) % limit, now),
+            )
+        return True, 0.0
+
+    def sweep_hits(self, window: float) -> int:
+        """Drop buckets with no requests inside the window"""
+        cutoff = time.time() - window
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "DELETE FROM rate_slots WHERE bucket IN (SELECT bucket FROM rate_buckets WHERE last_at <= ?)", (cutoff,)
+            )
+            return conn.execute("DELETE FROM rate_buckets WHERE last_at <= ?", (cutoff,)).rowcount
+
+    def claim(self, resource_id: str, worker_id: str):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO owners (resource_id, worker_id, claimed_at) VALUES (?, ?, ?)",
+            (resource_id, worker_id, time.time()),
+        )
+
+    def release(self, resource_id: str):
+        self._conn().execute("DELETE FROM owners WHERE resource_id = ?", (resource_id,))
+
+    def owner(self, resource_id: str) -> Optional[str]:
+        row = self._conn().execute("SELECT worker_id FROM owners WHERE resource_id = ?", (resource_id,)).fetchone()
+        return row[0] if row else None
+
+    def register_worker(self, worker_id: str, address: str, ttl: float):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO workers (worker_id, address, expires_at) VALUES (?, ?, ?)",
+            (worker_id, address, time.time() + ttl),
+        )
+
+    def unregister_worker(self, worker_id: str):
+        self._conn().execute("DELETE FROM workers WHERE worker_id = ?", (worker_id,))
+
+    def worker_address(self, worker_id: str) -> Optional[str]:
+        row = self._conn().execute(
+            "SELECT address FROM workers WHERE worker_id = ? AND expires_at > ?", (worker_id, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def sweep_owners(self, max_age: float) -> int:
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM workers WHERE expires_at <= ?", (now,))
+            conn.execute("DELETE FROM quota_running WHERE worker_id NOT IN (SELECT worker_id FROM workers)")
+            return conn.execute(
+                "DELETE FROM owners WHERE claimed_at <= ? OR worker_id NOT IN (SELECT worker_id FROM workers)",
+                (now - max_age,),
+            ).rowcount
+
+    def _running(self, conn: sqlite3.Connection, key: str, worker_id: Optional[str] = None) -> int:
+        # Counts held by workers that stopped heartbeating don't count
+        return conn.execute(
+            "SELECT COALESCE(SUM(running), 0) FROM quota_running WHERE key = ? AND (worker_id = ? OR worker_id IN "
+            "(SELECT worker_id FROM workers WHERE expires_at > ?))",
+            (key, worker_id, time.time()),
+        ).fetchone()[0]
+
+    def try_acquire_slot(self, key: str, worker_id: str, limit: int) -> bool:
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            if limit and self._running(conn, key, worker_id) >= limit:
+                return False
+            conn.execute(
+                "INSERT INTO quota_running (key, worker_id, running) VALUES (?, ?, 1) "
+                "ON CONFLICT (key, worker_id) DO UPDATE SET running = running + 1",
+                (key, worker_id),
+            )
+        return True
+
+    def release_slot(self, key: str, worker_id: str):
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "UPDATE quota_running SET running = running - 1 WHERE key = ? AND worker_id = ?", (key, worker_id)
+            )
+            conn.execute("DELETE FROM quota_running WHERE key = ? AND worker_id = ? AND running <= 0", (key, worker_id))
+
+    def running(self, key: str) -> int:
+        return self._running(self._conn(), key)
+
+    def add_cpu(self, key: str, seconds: float):
+        self._conn().execute("INSERT INTO quota_cpu (key, at, seconds) VALUES (?, ?, ?)", (key, time.time(), seconds))
+
+    def cpu_used(self, key: str, window: float) -> float:
+        conn = self._conn()
+        cutoff = time.time() - window
+        conn.execute("DELETE FROM quota_cpu WHERE key = ? AND at <= ?", (key, cutoff))
+        return conn.execute("SELECT COALESCE(SUM(seconds), 0) FROM quota_cpu WHERE key = ?", (key,)).fetchone()[0]
+
+    def stats(self) -> Dict[str, Any]:
+        conn = self._conn()
+        return {
+            "backend": self.name,
+            "path": self.path,
+            "workers": conn.execute("SELECT COUNT(*) FROM workers WHERE expires_at > ?", (time.time(),)).fetchone()[0],
+            "owned_resources": conn.execute("SELECT COUNT(*) FROM owners").fetchone()[0],
+        }
+
+
+class RedisSharedState(SharedState):
+    """
+    Shared state in Redis (or anything speaking its protocol), for workers
+    spread over several hosts. Rate-limit windows are sorted sets updated by
+    a server-side script; ownership and worker records are plain keys with
+    expiry, so nothing needs sweeping.
+    """
+
+    name = "redis"
+
+    def __init__(self, url: Optional[str] = None, prefix: Optional[str] = None, owner_ttl: Optional[float] = None):
+        # Optional dependency, only needed for this backend
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("SHARED_STATE_BACKEND=redis requires the 'redis' package") from e
+        super().__init__()
+
+        self.url = url or os.getenv("SHARED_STATE_URL", "redis://localhost:6379/0")
+        self.prefix = prefix or os.getenv("SHARED_STATE_PREFIX", "autopwn")
+        self.owner_ttl = int(owner_ttl or float(os.getenv("SHARED_STATE_OWNER_TTL", "86400")))
+        self._redis = redis.Redis.from_url(self.url, decode_responses=True)
+        self._hit_script = self._redis.register_script(REDIS_HIT_SCRIPT)
+        self._acquire_script = self._redis.register_script(REDIS_ACQUIRE_SCRIPT)
+
+    def _key(self, *parts: str) -> str:
+        return ":".join((self.prefix,) + parts)
+
+    def hit(self, bucket: str, limit: int, window: float) -> Tuple[bool, float]:
+        allowed, retry_after = self._hit_script(
+            keys=[self._key("rate", bucket)], args=[time.time(), window, limit, uuid.uuid4().hex]
+        )
+        return bool(int(allowed)), float(retry_after)
+
+    def claim(self, resource_id: str, worker_id: str):
+        self._redis.set(self._key("owner", resource_id), worker_id, ex=self.owner_ttl)
+
+    def release(self, resource_id: str):
+        self._redis.delete(self._key("owner", resource_id))
+
+    def owner(self, resource_id: str) -> Optional[str]:
+        return self._redis.get(self._key("owner", resource_id))
+
+    def register_worker(self, worker_id: str, address: str, ttl: float):
+        self._redis.set(self._key("worker", worker_id), address, px=int(ttl * 1000))
+
+    def unregister_worker(self, worker_id: str):
+        self._redis.delete(self._key("worker", worker_id))
+
+    def worker_address(self, worker_id: str) -> Optional[str]:
+        return self._redis.get(self._key("worker", worker_id))
+
+    def try_acquire_slot(self, key: str, worker_id: str, limit: int) -> bool:
+        result = self._acquire_script(
+            keys=[self._key("running", key)], args=[worker_id, limit, self._key("worker", "")]
+        )
+        return int(result) >= 0
+
+    def release_slot(self, key: str, worker_id: str):
+        running_key = self._key("running", key)
+        if self._redis.hincrby(running_key, worker_id, -1) <= 0:
+            self._redis.hdel(running_key, worker_id)
+
+    def running(self, key: str) -> int:
+        # Counts held by workers that stopped heartbeating don't count
+        running = self._redis.hgetall(self._key("running", key))
+        return sum(
+            int(count) for worker_id, count in running.items() if self._redis.exists(self._key("worker", worker_id))
+        )
+
+    def add_cpu(self, key: str, seconds: float):
+        now = time.time()
+        cpu_key = self._key("cpu", key)
+        self._redis.zadd(cpu_key, {f"{uuid.uuid4().hex}:{seconds}": now})
+        self._redis.expire(cpu_key, int(os.getenv("QUOTA_WINDOW", "3600")))
+
+    def cpu_used(self, key: str, window: float) -> float:
+        cpu_key = self._key("cpu", key)
+        self._redis.zremrangebyscore(cpu_key, "-inf", time.time() - window)
+        return sum(float(member.split(":", 1)[1]) for member in self._redis.zrange(cpu_key, 0, -1))
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name, "url": self.url.split("@")[-1], "prefix": self.prefix}
+
+
+def create_shared_state() -> Optional[SharedState]:
+    """The backend named by SHARED_STATE_BACKEND, or None for in-process state"""
+    backend = os.getenv("SHARED_STATE_BACKEND", "memory").lower()
+    if backend not in BACKENDS:
+        logger.warning(f"Unknown SHARED_STATE_BACKEND {backend!r}, using memory")
+        backend = "memory"
+    if backend == "sqlite":
+        return SQLiteSharedState()
+    if backend == "redis":
+        return RedisSharedState()
+    return None
@@ -0,0 +1,269 @@
+from typing import Any, Dict, List, Optional
+from collections import deque
+import os
+import time
+import asyncio
+from loguru import logger
+
+from app.services.governor import QuotaExceededError, charged_cpu_seconds
+from app.utils.metrics import STREAMED_BYTES
+
+# =====================================
+# Stream Hub Configuration
+# =====================================
+
+# What a subscriber does when its frame queue is full:
+#   "block" - wait for the client, pausing the shared SSH reader
+#   "drop"  - discard frames and send a "dropped" summary once there is room
+OVERFLOW_POLICIES = ("block", "drop")
+
+
+class Subscriber:
+    """A bounded queue of frames waiting to be sent to one client"""
+
+    def __init__(self, max_frames: int, overflow_policy: str):
+        self.max_frames = max_frames
+        self.overflow_policy = overflow_policy
+        self.dropped_frames = 0
+        self.dropped_bytes = 0
+        self.closed = False
+
+        self._frames: deque = deque()
+        self._ready = asyncio.Event()
+        self._space = asyncio.Event()
+
+    async def offer(self, frame: Dict[str, Any]):
+        """Queue a frame, waiting or dropping according to the overflow policy"""
+        while len(self._frames) >= self.max_frames and not self.closed:
+            if self.overflow_policy == "drop":
+                self.dropped_frames += 1
+                self.dropped_bytes += len(frame.get("data", ""))
+                return
+            self._space.clear()
+            await self._space.wait()
+        if self.closed:
+            return
+
+        if self.dropped_frames:
+            self._frames.append({
+                "type": "dropped",
+                "frames": self.dropped_frames,
+                "bytes": self.dropped_bytes,
+            })
+            self.dropped_frames = self.dropped_bytes = 0
+        self._frames.append(frame)
+        self._ready.set()
+
+    async def get(self) -> Optional[Dict[str, Any]]:
+        """Next frame to send, or None once the stream is finished"""
+        while not self._frames:
+            if self.closed:
+                return None
+            self._ready.clear()
+            await self._ready.wait()
+        frame = self._frames.popleft()
+        self._space.set()
+        return frame
+
+    def close(self):
+        self.closed = True
+        self._ready.set()
+        self._space.set()
+
+
+class SharedStream:
+    """
+    One command execution whose output is coalesced into frames and fanned
+    out to every attached subscriber. Consecutive chunks of the same stream
+    type are merged until `max_frame_bytes` is reached or `flush_interval`
+    has passed since the first buffered chunk.
+    """
+
+    def __init__(self, command_id: str, command: str, flush_interval: float, max_frame_bytes: int):
+        self.command_id = command_id
+        self.command = command
+        self.flush_interval = flush_interval
+        self.max_frame_bytes = max_frame_bytes
+        self.subscribers: List[Subscriber] = []
+        self.task: Optional[asyncio.Task] = None
+        self.owner: Optional[str] = None
+        self.done = False
+        self.bytes_sent = 0
+
+        # Buffered [stream_type, [chunks]] segments, in arrival order
+        self._segments: List[list] = []
+        self._buffered = 0
+        self._flush_timer: Optional[asyncio.TimerHandle] = None
+        self._send_lock = asyncio.Lock()
+
+    async def _broadcast(self, frame: Dict[str, Any]):
+        for subscriber in list(self.subscribers):
+            await subscriber.offer(frame)
+
+    async def flush(self):
+        async with self._send_lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            segments, self._segments, self._buffered = self._segments, [], 0
+            for stream_type, chunks in segments:
+                if stream_type == "parsed":
+                    await self._broadcast({"type": "parsed", "events": [e for events in chunks for e in events]})
+                    continue
+                data = "".join(chunks)
+                self.bytes_sent += len(data)
+                STREAMED_BYTES.inc(len(data))
+                await self._broadcast({"type": stream_type, "data": data})
+
+    async def on_output(self, message: Dict[str, Any]):
+        """KaliService.stream_command callback"""
+        stream_type = message.get("type")
+        if stream_type not in ("stdout", "stderr", "parsed"):
+            # Completion or error: flush pending output, then forward as-is
+            await self.flush()
+            async with self._send_lock:
+                await self._broadcast(message)
+            return
+
+        # Parsed events are batched like output; they follow the output they came from
+        item = message["events"] if stream_type == "parsed" else message["data"]
+        if self._segments and self._segments[-1][0] == stream_type:
+            self._segments[-1][1].append(item)
+        else:
+            self._segments.append([stream_type, [item]])
+        if stream_type != "parsed":
+            self._buffered += len(item)
+
+        if self._buffered >= self.max_frame_bytes:
+            await self.flush()
+        elif self._flush_timer is None:
+            loop = asyncio.get_running_loop()
+            self._flush_timer = loop.call_later(
+                self.flush_interval, lambda: asyncio.ensure_future(self.flush())
+            )
+
+
+class StreamHub:
+    """
+    Tracks running streamed executions by command_id so several clients can
+    attach to the same command and share one SSH execution.
+    """
+
+    def __init__(
+        self,
+        kali_service: Any,
+        flush_interval: Optional[float] = None,
+        max_frame_bytes: Optional[int] = None,
+        subscriber_queue_size: Optional[int] = None,
+        overflow_policy: Optional[str] = None,
+        history: Optional[Any] = None,
+        quotas: Optional[Any] = None,
+    ):
+        self.kali_service = kali_service
+        self.history = history
+        self.quotas = quotas
+        self.flush_interval = flush_interval or int(os.getenv("STREAM_FLUSH_INTERVAL_MS", "50")) / 1000
+        self.max_frame_bytes = max_frame_bytes or int(os.getenv("STREAM_MAX_FRAME_BYTES", str(64 * 1024)))
+        self.subscriber_queue_size = subscriber_queue_size or int(os.getenv("STREAM_SUBSCRIBER_QUEUE", "64"))
+        self.overflow_policy = overflow_policy or os.getenv("STREAM_OVERFLOW_POLICY", "block")
+        self._streams: Dict[str, SharedStream] = {}
+
+    def get(self, command_id: str) -> Optional[SharedStream]:
+        return self._streams.get(command_id)
+
+    @property
+    def active_streams(self) -> int:
+        return len(self._streams)
+
+    @property
+    def subscribers(self) -> int:
+        return sum(len(stream.subscribers) for stream in self._streams.values())
+
+    def subscribe(
+        self,
+        command_id: str,
+        command: str,
+        timeout: Optional[int] = 300,
+        overflow_policy: Optional[str] = None,
+        owner: Optional[str] = None,
+    ) -> Subscriber:
+        """
+        Attach to the execution running under `command_id`, starting it if
+        there is none. Raises ValueError if a different command is running
+        under that ID. `owner` is the API key that started the execution.
+        """
+        overflow_policy = overflow_policy or self.overflow_policy
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Invalid overflow policy. Must be one of: {list(OVERFLOW_POLICIES)}")
+
+        stream = self._streams.get(command_id)
+        if stream is not None and command and command != stream.command:
+            raise ValueError(f"Command {command_id} is already running a different command")
+
+        subscriber = Subscriber(self.subscriber_queue_size, overflow_policy)
+        if stream is None:
+            stream = SharedStream(command_id, command, self.flush_interval, self.max_frame_bytes)
+            stream.owner = owner
+            stream.subscribers.append(subscriber)
+            self._streams[command_id] = stream
+            stream.task = asyncio.create_task(self._run(stream, timeout))
+        else:
+            stream.subscribers.append(subscriber)
+            logger.info(f"Client attached to running command {command_id}")
+        return subscriber
+
+    def unsubscribe(self, command_id: str, subscriber: Subscriber):
+        """Detach a client; the execution is stopped when its last client leaves"""
+        subscriber.close()
+        stream = self._streams.get(command_id)
+        if stream is None or subscriber not in stream.subscribers:
+            return
+        stream.subscribers.remove(subscriber)
+        if not stream.subscribers and not stream.done:
+            logger.info(f"Last client left command {command_id}, stopping it")
+            stream.task.cancel()
+            self.kali_service.close_session(command_id)
+
+    async def _run(self, stream: SharedStream, timeout: Optional[int]):
+        result: Dict[str, Any] = {}
+        reserved = False
+        started = time.time()
+        try:
+            # Streams count against their owner's quotas like any other command
+            if self.quotas is not None:
+                await self.quotas.acquire(stream.owner)
+                reserved = True
+            result = await self.kali_service.stream_command(
+                stream.command,
+                stream.on_output,
+                session_id=stream.command_id,
+                timeout=timeout
+            )
+        except asyncio.CancelledError:
+            pass
+        except QuotaExceededError as e:
+            await stream._broadcast({"type": "error", "message": str(e), "quota": e.quota})
+        except Exception as e:
+            logger.error(f"Stream for command {stream.command_id} failed: {str(e)}")
+            await stream.flush()
+            await stream._broadcast({"type": "error", "message": str(e)})
+        finally:
+            stream.done = True
+            if reserved:
+                # Cancelled streams have no result and are charged the time they ran
+                await self.quotas.release(stream.owner, charged_cpu_seconds(result) if result else time.time() - started)
+            if self.history is not None:
+                self.history.record(
+                    stream.command,
+                    "stream",
+                    result.get("success", False),
+                    api_key=stream.owner,
+                    command_id=stream.command_id,
+                    exit_code=result.get("exit_code"),
+                    timed_out=result.get("timed_out"),
+                    execution_time=result.get("execution_time"),
+                )
+            if self._streams.get(stream.command_id) is stream:
+                del self._streams[stream.command_id]
+            for subscriber in stream.subscribers:
+                subscriber.close()
@@ -0,0 +1,129 @@
+from typing import Any, List, Optional, Tuple
+import os
+import time
+import bisect
+import asyncio
+import hashlib
+from loguru import logger
+
+# =====================================
+# Tool Inventory Configuration
+# =====================================
+
+# Directories scanned for executables on the Kali host
+TOOL_DIRECTORIES = ["/usr/bin", "/usr/sbin"]
+
+# Separates the directory mtimes from the tool listing in the scan output
+SCAN_SEPARATOR = "--autopwn-tools--"
+
+
+class ToolInventory:
+    """
+    In-memory index of the executables available on the Kali host.
+    The index is built once and refreshed in the background: directory
+    mtimes are checked every `check_interval` seconds, and the listing is
+    rebuilt when they change or when it is older than `ttl`.
+    """
+
+    def __init__(self, kali_service: Any, ttl: Optional[float] = None, check_interval: Optional[float] = None):
+        self.kali_service = kali_service
+        self.ttl = ttl or float(os.getenv("TOOL_INVENTORY_TTL", "3600"))
+        self.check_interval = check_interval or float(os.getenv("TOOL_INVENTORY_CHECK_INTERVAL", "60"))
+
+        self.tools: List[str] = []
+        self._lowered: List[str] = []
+        self.etag: Optional[str] = None
+        self.built_at: Optional[float] = None
+        self._mtimes: Optional[str] = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self.etag is not None
+
+    def _scan_command(self) -> str:
+        directories = " ".join(TOOL_DIRECTORIES)
+        return (
+            f"stat -c %Y {directories}; echo {SCAN_SEPARATOR}; "
+            f"find {directories} -type f -executable -size +1k ! -name '*.so' -printf '%f\\n'"
+        )
+
+    def _mtime_command(self) -> str:
+        return f"stat -c %Y {' '.join(TOOL_DIRECTORIES)}"
+
+    async def rebuild(self):
+        """Rescan the tool directories and replace the index"""
+        result = await self.kali_service.execute_command_async(self._scan_command())
+        if not result["success"]:
+            raise RuntimeError(f"Failed to retrieve tools: {result['stderr'].strip()}")
+
+        mtimes, _, listing = result["stdout"].partition(f"{SCAN_SEPARATOR}\n")
+        tools = sorted({tool.strip() for tool in listing.split("\n") if tool.strip()})
+        etag = '"' + hashlib.sha1("\n".join(tools).encode()).hexdigest()[:20] + '"'
+
+        if etag != self.etag:
+            logger.info(f"Tool inventory rebuilt: {len(tools)} tools")
+        self.tools = tools
+        self._lowered = [tool.lower() for tool in tools]
+        self.etag = etag
+        self._mtimes = mtimes.strip()
+        self.built_at = time.time()
+
+    async def ensure_loaded(self):
+        """Build the index on first use; concurrent callers share one build"""
+        if self.loaded:
+            return
+        async with self._lock:
+            if not self.loaded:
+                await self.rebuild()
+
+    async def refresh(self) -> bool:
+        """Rebuild the index if directory mtimes changed or the TTL expired"""
+        async with self._lock:
+            if not self.loaded or time.time() - self.built_at >= self.ttl:
+                await self.rebuild()
+                return True
+
+            result = await self.kali_service.execute_command_async(self._mtime_command())
+            if result["success"] and result["stdout"].strip() != self._mtimes:
+                await self.rebuild()
+                return True
+            return False
+
+    async def run_refresher(self):
+        """Keep the index fresh until cancelled"""
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Tool inventory refresh failed: {str(e)}")
+            await asyncio.sleep(self.check_interval)
+
+    def query(
+        self,
+        prefix: Optional[str] = None,
+        contains: Optional[str] = None,
+        offset: int = 0,
+        limit: Optional[int] = None,
+    ) -> Tuple[int, List[str]]:
+        """
+        Filter the index by name prefix and/or case-insensitive substring.
+        Returns (total_matches, page).
+        """
+        tools = self.tools
+        if prefix:
+            # Sorted list: the prefix matches form one contiguous slice
+            start = bisect.bisect_left(tools, prefix)
+            end = bisect.bisect_left(tools, prefix + "\U0010ffff", lo=start)
+            indexes = range(start, end)
+        else:
+            indexes = range(len(tools))
+
+        if contains:
+            needle = contains.lower()
+            matches = [tools[i] for i in indexes if needle in self._lowered[i]]
+        else:
+            matches = tools[indexes.start:indexes.stop]
+
+        end = offset + limit if limit is not None else None
+        return len(matches), matches[offset:end]
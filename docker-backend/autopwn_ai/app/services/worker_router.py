@@ -0,0 +1,313 @@
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, List, Optional, Tuple
+from collections import OrderedDict
+from contextlib import contextmanager
+import os
+import re
+import hmac
+import json
+import time
+import socket
+import asyncio
+import ipaddress
+from loguru import logger
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.services.shared_state import SharedState
+
+if TYPE_CHECKING:
+    import httpx
+
+# =====================================
+# Worker Routing Configuration
+# =====================================
+
+# Paths that address a resource living in one worker's memory (jobs, shell
+# sessions, stored outputs, uploads); group 1 is the resource ID
+OWNED_PATHS = re.compile(r"^/(?:jobs|sessions|outputs|files/uploads)/([^/]+)")
+
+# Set in the scope of requests that arrived on a worker's internal listener
+INTERNAL_SCOPE_KEY = "autopwn.internal"
+
+# Resource ownership entries cached per worker
+OWNER_CACHE_SIZE = 4096
+
+# Header carrying WORKER_INTERNAL_SECRET on requests between workers
+SECRET_HEADER = b"x-worker-secret"
+
+# Connection-level headers that are not passed through when forwarding
+HOP_HEADERS = frozenset((
+    b"connection", b"keep-alive", b"transfer-encoding", b"te", b"trailer",
+    b"upgrade", b"proxy-authorization", b"proxy-authenticate", b"host",
+))
+
+
+def resource_for_path(path: str) -> Optional[str]:
+    """ID of the per-worker resource a request path addresses, if any"""
+    match = OWNED_PATHS.match(path)
+    return match.group(1) if match else None
+
+
+def is_internal(request: Request) -> bool:
+    return bool(request.scope.get(INTERNAL_SCOPE_KEY))
+
+
+class WorkerRouter:
+    """
+    Lets uvicorn worker processes hand requests to each other. Each worker
+    serves the app on a private internal listener (a Unix socket unless
+    WORKER_INTERNAL_HOST is set), advertises it in shared state and keeps
+    it alive with heartbeats. Resources created on a worker are claimed in
+    shared state; requests for them that land on another worker are
+    forwarded to the owner over its internal listener.
+
+    Requests on the internal listener skip rate limiting and API key checks
+    on internal routes. With WORKER_INTERNAL_SECRET set, only requests
+    carrying it are served there. A TCP listener on a non-loopback address
+    is refused without a secret.
+    """
+
+    def __init__(
+        self,
+        state: SharedState,
+        app: ASGIApp,
+        socket_dir: Optional[str] = None,
+        heartbeat_interval: Optional[float] = None,
+    ):
+        self.state = state
+        self.app = app
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}"
+        self.socket_dir = socket_dir or os.getenv("WORKER_SOCKET_DIR", "data/workers")
+        # TCP instead of a Unix socket, for workers on several hosts sharing Redis
+        self.internal_host = os.getenv("WORKER_INTERNAL_HOST")
+        self.secret = os.getenv("WORKER_INTERNAL_SECRET") or None
+        self.heartbeat_interval = heartbeat_interval or float(os.getenv("WORKER_HEARTBEAT_INTERVAL", "5"))
+        self.owner_ttl = float(os.getenv("SHARED_STATE_OWNER_TTL", "86400"))
+        # How long another worker's ownership of a resource is trusted without asking shared state
+        self.owner_cache_ttl = float(os.getenv("WORKER_OWNER_CACHE_TTL", "5"))
+
+        self.address: Optional[str] = None
+        self.forwarded = 0
+        self.forward_failures = 0
+        self._socket_path: Optional[str] = None
+        self._server: Any = None
+        self._tasks: List[asyncio.Task] = []
+        self._clients: Dict[str, "httpx.AsyncClient"] = {}
+        # resource_id -> (owner address or None if owned here, expiry)
+        self._owners: "OrderedDict[str, Tuple[Optional[str], float]]" = OrderedDict()
+
+    # ---------------------------------
+    # Lifecycle
+    # ---------------------------------
+    def _authorized(self, scope: Scope) -> bool:
+        if self.secret is None:
+            return True
+        presented = dict(scope.get("headers") or ()).get(SECRET_HEADER, b"")
+        return hmac.compare_digest(presented, self.secret.encode())
+
+    async def _internal_app(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] in ("http", "websocket"):
+            if not self._authorized(scope):
+                if scope["type"] == "http":
+                    await JSONResponse(status_code=403, content={"detail": "Forbidden"})(scope, receive, send)
+                else:
+                    await send({"type": "websocket.close", "code": 1008})
+                return
+            scope = {**scope, INTERNAL_SCOPE_KEY: True}
+        await self.app(scope, receive, send)
+
+    def _bind(self) -> socket.socket:
+        if self.internal_host:
+            sock = socket.socket(socket.AF_INET6 if ":" in self.internal_host else socket.AF_INET)
+            sock.bind((self.internal_host, 0))
+            host, port = sock.getsockname()[:2]
+            if self.secret is None and not ipaddress.ip_address(host).is_loopback:
+                sock.close()
+                raise RuntimeError(
+                    f"WORKER_INTERNAL_HOST {self.internal_host} is not a loopback address; "
+                    "set WORKER_INTERNAL_SECRET so other hosts can't use the internal listener"
+                )
+            self.address = f"http://{host}:{port}" if ":" not in host else f"http://[{host}]:{port}"
+        else:
+            os.makedirs(self.socket_dir, exist_ok=True)
+            self._socket_path = os.path.join(self.socket_dir, f"{self.worker_id}.sock")
+            if os.path.exists(self._socket_path):
+                os.unlink(self._socket_path)
+            sock = socket.socket(socket.AF_UNIX)
+            sock.bind(self._socket_path)
+            self.address = f"unix:{os.path.abspath(self._socket_path)}"
+        return sock
+
+    async def start(self):
+        """Open the internal listener, register this worker and start heartbeating"""
+        import uvicorn
+
+        class InternalServer(uvicorn.Server):
+            # The outer server owns the process's signals
+            def install_signal_handlers(self):
+                pass
+
+            @contextmanager
+            def capture_signals(self):
+                yield
+
+        sock = self._bind()
+        config = uvicorn.Config(
+            self._internal_app, interface="asgi3", lifespan="off", log_level="warning", access_log=False
+        )
+        self._server = InternalServer(config)
+        self._tasks.append(asyncio.create_task(self._server.serve(sockets=[sock]), name="worker-internal-server"))
+        await self.state.run(self.state.register_worker, self.worker_id, self.address, self.heartbeat_interval * 3)
+        self._tasks.append(asyncio.create_task(self._heartbeat(), name="worker-heartbeat"))
+        logger.info(f"Worker {self.worker_id} reachable for forwarded requests at {self.address}")
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                await self.state.run(
+                    self.state.register_worker, self.worker_id, self.address, self.heartbeat_interval * 3
+                )
+                await self.state.run(self.state.sweep_owners, self.owner_ttl)
+            except Exception as e:
+                logger.error(f"Worker heartbeat failed: {str(e)}")
+
+    async def stop(self):
+        for task in self._tasks[1:]:
+            task.cancel()
+        try:
+            await self.state.run(self.state.unregister_worker, self.worker_id)
+        except Exception as e:
+            logger.warning(f"Could not unregister worker {self.worker_id}: {str(e)}")
+        if self._server is not None:
+            self._server.should_exit = True
+            await asyncio.gather(self._tasks[0], return_exceptions=True)
+        for client in self._clients.values():
+            await client.aclose()
+        if self._socket_path and os.path.exists(self._socket_path):
+            os.unlink(self._socket_path)
+
+    # ---------------------------------
+    # Ownership
+    # ---------------------------------
+    def _remember(self, resource_id: str, address: Optional[str], ttl: float):
+        self._owners[resource_id] = (address, time.monotonic() + ttl)
+        self._owners.move_to_end(resource_id)
+        while len(self._owners) > OWNER_CACHE_SIZE:
+            self._owners.popitem(last=False)
+
+    async def claim(self, resource_id: str):
+        """Mark a resource created here as owned by this worker"""
+        self._remember(resource_id, None, float("inf"))
+        try:
+            await self.state.run(self.state.claim, resource_id, self.worker_id)
+        except Exception as e:
+            # The resource still works for requests that land on this worker
+            logger.error(f"Could not claim {resource_id} in shared state: {str(e)}")
+
+    async def release(self, resource_id: str):
+        self._owners.pop(resource_id, None)
+        try:
+            await self.state.run(self.state.release, resource_id)
+        except Exception as e:
+            logger.warning(f"Could not release {resource_id} in shared state: {str(e)}")
+
+    def _lookup_owner(self, resource_id: str) -> Optional[str]:
+        owner = self.state.owner(resource_id)
+        if owner is None or owner == self.worker_id:
+            return None
+        return self.state.worker_address(owner)
+
+    async def owner_address(self, resource_id: str) -> Optional[str]:
+        """
+        Internal address of the live worker owning a resource, or None when
+        this worker should handle it (owned here, unknown, or owner gone).
+        Resources claimed here are answered locally; other workers' are
+        cached for `owner_cache_ttl`.
+        """
+        cached = self._owners.get(resource_id)
+        if cached is not None and cached[1] > time.monotonic():
+            return cached[0]
+        address = await self.state.run(self._lookup_owner, resource_id)
+        if address is not None:
+            self._remember(resource_id, address, self.owner_cache_ttl)
+        else:
+            self._owners.pop(resource_id, None)
+        return address
+
+    # ---------------------------------
+    # Forwarding
+    # ---------------------------------
+    def _client(self, address: str) -> "httpx.AsyncClient":
+        client = self._clients.get(address)
+        if client is None:
+            import httpx
+
+            # Commands can legitimately run for minutes, so only connecting is bounded
+            timeout = httpx.Timeout(None, connect=5.0)
+            headers = {SECRET_HEADER.decode(): self.secret} if self.secret else None
+            if address.startswith("unix:"):
+                transport = httpx.AsyncHTTPTransport(uds=address[len("unix:"):])
+                client = httpx.AsyncClient(
+                    transport=transport, base_url="http://worker", timeout=timeout, headers=headers
+                )
+            else:
+                client = httpx.AsyncClient(base_url=address, timeout=timeout, headers=headers)
+            self._clients[address] = client
+        return client
+
+    async def forward(self, request: Request, address: str) -> Response:
+        """Replay a request on the owning worker and stream its response back"""
+        import httpx
+
+        client = self._client(address)
+        url = request.url.path + (f"?{request.url.query}" if request.url.query else "")
+        headers = [
+            (key, value) for key, value in request.headers.raw
+            if key.lower() not in HOP_HEADERS and key.lower() != SECRET_HEADER
+        ]
+        try:
+            upstream = await client.send(
+                client.build_request(request.method, url, headers=headers, content=request.stream()),
+                stream=True,
+            )
+        except httpx.HTTPError as e:
+            self.forward_failures += 1
+            # The owner may have gone; look it up again next time
+            self._owners.pop(resource_for_path(request.url.path), None)
+            logger.error(f"Forwarding {request.method} {request.url.path} to {address} failed: {str(e)}")
+            return JSONResponse(status_code=502, content={"detail": "Owning worker is unavailable"})
+        self.forwarded += 1
+
+        async def body() -> AsyncIterator[bytes]:
+            try:
+                async for chunk in upstream.aiter_raw():
+                    yield chunk
+            finally:
+                await upstream.aclose()
+
+        response = StreamingResponse(body(), status_code=upstream.status_code)
+        response.raw_headers = [
+            (key.lower(), value) for key, value in upstream.headers.raw if key.lower() not in HOP_HEADERS
+        ]
+        return response
+
+    async def relay_stream(self, address: str, command_id: str) -> AsyncIterator[Dict[str, Any]]:
+        """Frames of a stream running on another worker, read from its internal NDJSON feed"""
+        async with self._client(address).stream("GET", f"/internal/streams/{command_id}") as response:
+            if response.status_code != 200:
+                return
+            async for line in response.aiter_lines():
+                if line:
+                    yield json.loads(line)
+
+    async def stats(self) -> Dict[str, Any]:
+        return {
+            "worker_id": self.worker_id,
+            "address": self.address,
+            "forwarded": self.forwarded,
+            "forward_failures": self.forward_failures,
+            "cached_owners": len(self._owners),
+            **await self.state.run(self.state.stats),
+        }
@@ -0,0 +1,225 @@
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from collections import OrderedDict, deque
+import os
+import json
+import stat
+import time
+import base64
+import bisect
+import asyncio
+import posixpath
+
+# =====================================
+# Workspace Configuration
+# =====================================
+
+SORT_KEYS = ("name", "size", "mtime", "type")
+
+# Directories listed concurrently during a recursive walk
+WALK_CONCURRENCY = 4
+
+
+def _entry_type(mode: Optional[int]) -> str:
+    if mode is None:
+        return "other"
+    if stat.S_ISDIR(mode):
+        return "dir"
+    if stat.S_ISLNK(mode):
+        return "symlink"
+    if stat.S_ISREG(mode):
+        return "file"
+    return "other"
+
+
+def _sort_key(entry: Dict[str, Any], sort: str) -> Tuple:
+    if sort == "name":
+        return (entry["name"],)
+    return (entry[sort], entry["name"])
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a pagination cursor cannot be decoded or doesn't match the query"""
+
+
+class _Listing:
+    """One cached directory listing, with sorted views built on demand"""
+
+    def __init__(self, entries: List[Dict[str, Any]], expires_at: float):
+        self.entries = entries
+        self.expires_at = expires_at
+        self._views: Dict[str, Tuple[List[Tuple], List[Dict[str, Any]]]] = {}
+
+    def view(self, sort: str) -> Tuple[List[Tuple], List[Dict[str, Any]]]:
+        """(sort keys, entries) in ascending order of `sort`"""
+        view = self._views.get(sort)
+        if view is None:
+            ordered = sorted(self.entries, key=lambda entry: _sort_key(entry, sort))
+            view = ([_sort_key(entry, sort) for entry in ordered], ordered)
+            self._views[sort] = view
+        return view
+
+
+class WorkspaceService:
+    """
+    Browses the Kali workspace over persistent SFTP sessions.
+    Directory listings are cached for `cache_ttl` seconds and dropped when
+    the workspace is written through this service. Pages are addressed by
+    keyset cursors, so paging stays stable while the directory changes.
+    """
+
+    def __init__(
+        self,
+        kali_service: Any,
+        root: Optional[str] = None,
+        cache_ttl: Optional[float] = None,
+        cache_size: Optional[int] = None,
+    ):
+        self.kali_service = kali_service
+        self.root = posixpath.normpath(root or os.getenv("KALI_WORKSPACE", "/home/kaliuser/workspace"))
+        self.cache_ttl = cache_ttl if cache_ttl is not None else float(os.getenv("WORKSPACE_CACHE_TTL", "5"))
+        self.cache_size = cache_size or int(os.getenv("WORKSPACE_CACHE_SIZE", "256"))
+        self._cache: "OrderedDict[str, _Listing]" = OrderedDict()
+
+    # ---------------------------------
+    # Paths
+    # ---------------------------------
+    def resolve(self, path: str) -> str:
+        """Absolute remote path for a workspace-relative path; rejects traversal"""
+        if ".." in path.split("/"):
+            raise ValueError("Path cannot contain '..'")
+        return posixpath.normpath(posixpath.join(self.root, path.lstrip("/")))
+
+    def relative(self, remote_path: str) -> str:
+        return posixpath.relpath(remote_path, self.root) if remote_path != self.root else ""
+
+    # ---------------------------------
+    # Listing cache
+    # ---------------------------------
+    def invalidate(self, path: str):
+        """Drop cached listings for a workspace path and its parent directory"""
+        remote_path = self.resolve(path)
+        self._cache.pop(remote_path, None)
+        self._cache.pop(posixpath.dirname(remote_path), None)
+
+    def clear_cache(self):
+        self._cache.clear()
+
+    async def _listing(self, remote_path: str, fresh: bool = False) -> _Listing:
+        listing = self._cache.get(remote_path)
+        if listing is not None and not fresh and listing.expires_at > time.monotonic():
+            self._cache.move_to_end(remote_path)
+            return listing
+
+        attributes = await self.kali_service.run_sftp(lambda sftp: sftp.listdir_attr(remote_path))
+        entries = [
+            {
+                "name": attr.filename,
+                "type": _entry_type(attr.st_mode),
+                "size": attr.st_size or 0,
+                "mtime": attr.st_mtime or 0,
+                "mode": f"{stat.S_IMODE(attr.st_mode):04o}" if attr.st_mode is not None else None,
+            }
+            for attr in attributes
+        ]
+        listing = _Listing(entries, time.monotonic() + self.cache_ttl)
+        self._cache[remote_path] = listing
+        self._cache.move_to_end(remote_path)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return listing
+
+    # ---------------------------------
+    # Pagination
+    # ---------------------------------
+    @staticmethod
+    def _encode_cursor(sort: str, order: str, key: Tuple) -> str:
+        raw = json.dumps([sort, order, list(key)], separators=(",", ":")).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    @staticmethod
+    def _decode_cursor(cursor: str, sort: str, order: str) -> Tuple:
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            cursor_sort, cursor_order, key = json.loads(raw)
+        except (ValueError, TypeError) as e:
+            raise InvalidCursorError("Invalid cursor") from e
+        if cursor_sort != sort or cursor_order != order:
+            raise InvalidCursorError("Cursor was issued for a different sort order")
+        return tuple(key)
+
+    async def list_page(
+        self,
+        path: str = "",
+        sort: str = "name",
+        order: str = "asc",
+        cursor: Optional[str] = None,
+        limit: int = 100,
+        fresh: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        One page of a directory listing. `next_cursor` continues after the
+        last returned entry and is None on the final page.
+        """
+        if sort not in SORT_KEYS:
+            raise ValueError(f"Invalid sort key. Must be one of: {list(SORT_KEYS)}")
+        listing = await self._listing(self.resolve(path), fresh=fresh)
+        keys, ordered = listing.view(sort)
+
+        try:
+            if order == "asc":
+                start = bisect.bisect_right(keys, self._decode_cursor(cursor, sort, order)) if cursor else 0
+                page = ordered[start:start + limit]
+                more = start + limit < len(ordered)
+            else:
+                end = bisect.bisect_left(keys, self._decode_cursor(cursor, sort, order)) if cursor else len(ordered)
+                page = ordered[max(0, end - limit):end][::-1]
+                more = end - limit > 0
+        except TypeError as e:
+            raise InvalidCursorError("Invalid cursor") from e
+
+        next_cursor = self._encode_cursor(sort, order, _sort_key(page[-1], sort)) if page and more else None
+        return {
+            "path": path,
+            "entries": page,
+            "total": len(ordered),
+            "next_cursor": next_cursor,
+        }
+
+    # ---------------------------------
+    # Recursive walk
+    # ---------------------------------
+    async def walk(self, path: str = "", max_depth: Optional[int] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Yield every entry under `path` breadth-first, with its path relative
+        to the workspace. Several directories are listed ahead concurrently.
+        Symlinks are reported but not followed. Unreadable directories yield
+        an {"path", "error"} record instead of ending the walk.
+        """
+        pending: deque = deque([(self.resolve(path), 0, None)])
+        try:
+            while pending:
+                # Keep the next few directories listing in the background
+                for i in range(min(WALK_CONCURRENCY, len(pending))):
+                    remote_path, depth, task = pending[i]
+                    if task is None:
+                        pending[i] = (remote_path, depth, asyncio.ensure_future(self._listing(remote_path)))
+
+                remote_path, depth, task = pending.popleft()
+                try:
+                    listing = await task
+                except OSError as e:
+                    yield {"path": self.relative(remote_path), "error": str(e)}
+                    continue
+
+                for entry in listing.view("name")[1]:
+                    child = posixpath.join(remote_path, entry["name"])
+                    yield {**entry, "path": self.relative(child)}
+                    if entry["type"] == "dir" and (max_depth is None or depth < max_depth):
+                        pending.append((child, depth + 1, None))
+        finally:
+            for _, _, task in pending:
+                if task is None:
+                    continue
+                if task.done() and not task.cancelled():
+                    task.exception()
+                task.cancel()
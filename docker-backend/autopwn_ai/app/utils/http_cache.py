@@ -0,0 +1,69 @@
+from typing import Optional, Tuple
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Check an If-None-Match header against an entity tag using the weak
+    comparison HTTP requires for conditional GETs.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+
+    def opaque(tag: str) -> str:
+        tag = tag.strip()
+        return tag[2:] if tag.startswith("W/") else tag
+
+    target = opaque(etag)
+    return any(opaque(tag) == target for tag in if_none_match.split(","))
+
+
+def if_range_matches(if_range: Optional[str], etag: str) -> bool:
+    """
+    Check an If-Range header against an entity tag. If-Range needs the
+    strong comparison, so a weak tag on either side never matches. Dates
+    aren't compared either; the full body is always a valid answer.
+    """
+    if not if_range:
+        return True
+    if_range = if_range.strip()
+    return not etag.startswith("W/") and not if_range.startswith("W/") and if_range == etag
+
+
+class RangeNotSatisfiable(ValueError):
+    """Raised when a Range header selects no bytes of the representation"""
+
+
+def parse_range(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single-range `bytes=` Range header into an inclusive
+    (start, end) pair. Returns None when the header is absent, malformed or
+    asks for several ranges, in which case the whole body should be sent.
+    Raises RangeNotSatisfiable if the range lies outside the body.
+    """
+    if not range_header:
+        return None
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+
+    first, sep, last = spec.strip().partition("-")
+    if not sep or not (first or last):
+        return None
+    try:
+        start = int(first) if first else None
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+
+    if start is None:
+        # Suffix range: the last N bytes
+        if end <= 0:
+            raise RangeNotSatisfiable(range_header)
+        return max(0, size - end), size - 1
+    if start >= size:
+        raise RangeNotSatisfiable(range_header)
+    if start > end:
+        return None
+    return start, min(end, size - 1)
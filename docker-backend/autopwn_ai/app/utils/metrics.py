@@ -0,0 +1,236 @@
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+import bisect
+import threading
+
+# =====================================
+# In-process Metrics
+# =====================================
+
+# Latency buckets in seconds, from sub-millisecond validation up to long scans
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0,
+)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+
+class _GaugeChild(_CounterChild):
+    __slots__ = ()
+
+    def set(self, value: float):
+        self.value = value
+
+    def dec(self, amount: float = 1.0):
+        self.inc(-amount)
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "count", "_lock")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+
+class _Metric:
+    """Base for a metric family; children are created per label combination"""
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._default = self.labels()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def samples(self) -> Iterable[Tuple[str, str, float]]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self._default.inc(amount)
+
+    def samples(self):
+        for key, child in list(self._children.items()):
+            yield "", _format_labels(self.labelnames, key), child.value
+
+
+class Gauge(_Metric):
+    """Gauge whose value is either set directly or read from a callback at scrape time"""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 callback: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float):
+        self._default.set(value)
+
+    def inc(self, amount: float = 1.0):
+        self._default.inc(amount)
+
+    def dec(self, amount: float = 1.0):
+        self._default.dec(amount)
+
+    def samples(self):
+        if self.callback is not None:
+            for key, value in self.callback().items():
+                yield "", _format_labels(self.labelnames, key), value
+            return
+        for key, child in list(self._children.items()):
+            yield "", _format_labels(self.labelnames, key), child.value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self._default.observe(value)
+
+    def samples(self):
+        for key, child in list(self._children.items()):
+            with child._lock:
+                counts, total, count = list(child.counts), child.sum, child.count
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = 'le="' + _format_value(bound) + '"'
+                yield "_bucket", _format_labels(self.labelnames, key, le), cumulative
+            yield "_sum", _format_labels(self.labelnames, key), total
+            yield "_count", _format_labels(self.labelnames, key), count
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+# =====================================
+# Service Metrics
+# =====================================
+HTTP_REQUESTS = registry.register(Counter(
+    "autopwn_http_requests_total", "HTTP requests by route, method and status code.",
+    ["route", "method", "status"]))
+HTTP_REQUEST_DURATION = registry.register(Histogram(
+    "autopwn_http_request_duration_seconds", "HTTP request latency by route and method.",
+    ["route", "method"]))
+VALIDATOR_DURATION = registry.register(Histogram(
+    "autopwn_validator_duration_seconds", "Command validation time, by whether the verdict was cached.",
+    ["cached"], buckets=(0.000001, 0.0000025, 0.000005, 0.00001, 0.000025, 0.00005, 0.0001, 0.001, 0.01)))
+RATE_LIMIT_REJECTIONS = registry.register(Counter(
+    "autopwn_rate_limit_rejections_total", "Requests rejected by the rate limiter.",
+    ["route_class"]))
+KALI_CONNECT_DURATION = registry.register(Histogram(
+    "autopwn_kali_connect_duration_seconds", "Time to open and authenticate a new SSH transport.",
+    ["host"]))
+KALI_ACQUIRE_DURATION = registry.register(Histogram(
+    "autopwn_kali_channel_acquire_duration_seconds", "Time waiting for a pooled SSH channel.",
+    ["host"]))
+KALI_CONNECT_FAILURES = registry.register(Counter(
+    "autopwn_kali_connect_failures_total", "Failed SSH transport connections.",
+    ["host"]))
+KALI_COMMAND_DURATION = registry.register(Histogram(
+    "autopwn_kali_command_duration_seconds", "Remote command run time on the Kali host.",
+    ["host"]))
+WEBSOCKET_STREAMS = registry.register(Gauge(
+    "autopwn_websocket_streams_active", "Open WebSocket command streams."))
+HTTP_STREAMS = registry.register(Gauge(
+    "autopwn_http_streams_active", "Open SSE/NDJSON command streams on /execute."))
+STREAMED_BYTES = registry.register(Counter(
+    "autopwn_streamed_bytes_total", "Output bytes sent to streaming clients."))
+KALI_POOL = registry.register(Gauge(
+    "autopwn_kali_pool", "SSH pool utilization (transports, channels, sessions) by host.",
+    ["host", "field"]))
+HEALTH_PROBE_DURATION = registry.register(Histogram(
+    "autopwn_health_probe_duration_seconds", "Background Kali health probe round-trip time, by outcome.",
+    ["ok"]))
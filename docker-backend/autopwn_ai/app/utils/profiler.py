@@ -0,0 +1,79 @@
+from typing import Dict, Optional
+from collections import Counter
+import sys
+import time
+import asyncio
+import threading
+
+# =====================================
+# Sampling Profiler
+# =====================================
+
+
+class ProfilerBusyError(Exception):
+    """Raised when a profile is requested while another one is running"""
+
+
+def _frame_label(frame) -> str:
+    return f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}"
+
+
+class SamplingProfiler:
+    """
+    Samples the stack of every thread in the process every `interval`
+    seconds and aggregates them into collapsed stacks
+    ("thread;outer;...;inner count" per line), the input format of
+    flamegraph.pl and speedscope. Nothing is instrumented, so it can run
+    against live traffic; only one profile runs at a time.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self._lock = threading.Lock()
+
+    def _sample(self, seconds: float, interval: float) -> str:
+        stacks: Counter = Counter()
+        me = threading.get_ident()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            names: Dict[int, str] = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame))
+                    frame = frame.f_back
+                labels.append(names.get(ident, f"thread-{ident}"))
+                stacks[";".join(reversed(labels))] += 1
+            time.sleep(interval)
+        return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+    async def profile(self, seconds: float, interval: Optional[float] = None) -> str:
+        """Sample for `seconds` on a dedicated thread and return collapsed stacks"""
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusyError("A profile is already running")
+
+        loop = asyncio.get_running_loop()
+        result = loop.create_future()
+
+        def deliver(output: Optional[str], error: Optional[Exception]):
+            # The request may have been cancelled while sampling
+            if result.done():
+                return
+            if error is not None:
+                result.set_exception(error)
+            else:
+                result.set_result(output)
+
+        def run():
+            try:
+                loop.call_soon_threadsafe(deliver, self._sample(seconds, interval or self.interval), None)
+            except Exception as e:
+                loop.call_soon_threadsafe(deliver, None, e)
+            finally:
+                self._lock.release()
+
+        # A thread of its own, so sampling doesn't occupy an executor worker
+        threading.Thread(target=run, name="sampling-profiler", daemon=True).start()
+        return await result
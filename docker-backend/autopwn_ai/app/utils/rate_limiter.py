@@ -0,0 +1,183 @@
+from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple
+from collections import deque
+import os
+import json
+import time
+import asyncio
+from loguru import logger
+
+from app.services.history_store import key_fingerprint
+
+if TYPE_CHECKING:
+    from app.services.shared_state import SharedState
+
+# =====================================
+# Rate Limit Configuration
+# =====================================
+
+# Route classes, matched by path prefix in order. Unmatched paths are "default".
+ROUTE_CLASSES = [
+    ("/health", "health"),
+    ("/execute", "execute"),
+    ("/ws/execute", "execute"),
+]
+
+# Requests allowed per window for each route class
+DEFAULT_ROUTE_LIMITS = {
+    "health": 600,
+    "execute": 30,
+    "default": 30,
+}
+
+
+def classify_route(path: str) -> str:
+    """Map a request path to its rate-limit route class"""
+    for prefix, route_class in ROUTE_CLASSES:
+        if path.startswith(prefix):
+            return route_class
+    return "default"
+
+
+class SlidingWindowRateLimiter:
+    """
+    Sliding-window rate limiter keyed by (client key, route class).
+    Each bucket is a ring buffer holding at most `limit` timestamps, so a check
+    only looks at the oldest entry and costs O(1) regardless of how many
+    clients are tracked. Buckets idle for a full window are swept in the
+    background.
+    """
+
+    def __init__(
+        self,
+        window: float = 60.0,
+        route_limits: Optional[Dict[str, int]] = None,
+        key_limits: Optional[Dict[str, Dict[str, int]]] = None,
+    ):
+        self.window = window
+        self.route_limits = {**DEFAULT_ROUTE_LIMITS, **(route_limits or {})}
+        # Per-key overrides: {client_key: {route_class: limit}}
+        self.key_limits = key_limits or {}
+        self._buckets: Dict[Tuple[str, str], deque] = {}
+        self.rejections = 0
+
+    @classmethod
+    def from_env(cls, **kwargs: Any) -> "SlidingWindowRateLimiter":
+        route_limits = {}
+        for route_class in DEFAULT_ROUTE_LIMITS:
+            value = os.getenv(f"RATE_LIMIT_{route_class.upper()}")
+            if value:
+                route_limits[route_class] = int(value)
+
+        key_limits = {}
+        overrides = os.getenv("RATE_LIMIT_KEY_OVERRIDES")
+        if overrides:
+            try:
+                key_limits = {
+                    f"key:{key_fingerprint(api_key)}": limits for api_key, limits in json.loads(overrides).items()
+                }
+            except (ValueError, AttributeError) as e:
+                logger.error(f"Ignoring invalid RATE_LIMIT_KEY_OVERRIDES: {str(e)}")
+
+        return cls(
+            window=float(os.getenv("RATE_LIMIT_WINDOW", "60")),
+            route_limits=route_limits,
+            key_limits=key_limits,
+            **kwargs,
+        )
+
+    def limit_for(self, key: str, route_class: str) -> int:
+        # Keyed clients are "key:<key fingerprint>@<client ip>"; overrides apply per API key
+        overrides = self.key_limits.get(key) or self.key_limits.get(key.rpartition("@")[0])
+        if overrides and route_class in overrides:
+            return overrides[route_class]
+        return self.route_limits.get(route_class, self.route_limits["default"])
+
+    def hit(self, key: str, route_class: str, now: Optional[float] = None) -> Tuple[bool, float]:
+        """
+        Record a request for `key` in `route_class`.
+        Returns (allowed, retry_after_seconds).
+        """
+        now = time.monotonic() if now is None else now
+        bucket = self._buckets.get((key, route_class))
+        if bucket is None:
+            limit = self.limit_for(key, route_class)
+            if limit <= 0:
+                self.rejections += 1
+                return False, self.window
+            bucket = self._buckets[(key, route_class)] = deque(maxlen=limit)
+
+        # Full ring whose oldest entry is still inside the window: over limit
+        if len(bucket) == bucket.maxlen and now - bucket[0] < self.window:
+            self.rejections += 1
+            return False, self.window - (now - bucket[0])
+
+        bucket.append(now)
+        return True, 0.0
+
+    async def hit_async(self, key: str, route_class: str) -> Tuple[bool, float]:
+        """hit() for async callers; in-process buckets are cheap enough to check inline"""
+        return self.hit(key, route_class)
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """Drop buckets with no requests inside the window"""
+        now = time.monotonic() if now is None else now
+        idle = [
+            bucket_key for bucket_key, bucket in self._buckets.items()
+            if not bucket or now - bucket[-1] >= self.window
+        ]
+        for bucket_key in idle:
+            del self._buckets[bucket_key]
+        return len(idle)
+
+    async def sweep_async(self) -> int:
+        return self.sweep()
+
+    async def run_sweeper(self, interval: Optional[float] = None):
+        """Periodically sweep idle buckets until cancelled"""
+        interval = interval or self.window
+        while True:
+            await asyncio.sleep(interval)
+            removed = await self.sweep_async()
+            if removed:
+                logger.debug(f"Rate limiter swept {removed} idle bucket(s)")
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "tracked_buckets": len(self._buckets),
+            "rejections": self.rejections,
+        }
+
+
+class SharedRateLimiter(SlidingWindowRateLimiter):
+    """
+    Same limits as SlidingWindowRateLimiter, but the windows live in a
+    shared-state backend so every worker process counts against the same
+    budget. Nothing is kept in process memory.
+    """
+
+    def __init__(self, state: "SharedState", **kwargs: Any):
+        super().__init__(**kwargs)
+        self.state = state
+
+    def hit(self, key: str, route_class: str, now: Optional[float] = None) -> Tuple[bool, float]:
+        limit = self.limit_for(key, route_class)
+        if limit <= 0:
+            self.rejections += 1
+            return False, self.window
+        allowed, retry_after = self.state.hit(f"{key}|{route_class}", limit, self.window)
+        if not allowed:
+            self.rejections += 1
+        return allowed, retry_after
+
+    async def hit_async(self, key: str, route_class: str) -> Tuple[bool, float]:
+        # The backend may wait on another worker's lock or the network
+        return await self.state.run(self.hit, key, route_class)
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        return self.state.sweep_hits(self.window)
+
+    async def sweep_async(self) -> int:
+        return await self.state.run(self.sweep)
+
+    def stats(self) -> Dict[str, int]:
+        return {"tracked_buckets": 0, "rejections": self.rejections}
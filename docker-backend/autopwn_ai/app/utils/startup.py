@@ -0,0 +1,47 @@
+from typing import Any, Dict, List, Optional, Tuple
+import time
+from loguru import logger
+
+# =====================================
+# Startup Timing
+# =====================================
+
+
+class StartupTimer:
+    """
+    Records how long each startup phase took. `mark` closes a sequential
+    phase that began at the previous mark; `record` adds a phase timed
+    separately, such as work that ran in the background.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: List[Tuple[str, float]] = []
+        self.ready_after: Optional[float] = None
+        self._last_mark = self.started
+
+    def mark(self, phase: str):
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last_mark))
+        self._last_mark = now
+
+    def record(self, phase: str, seconds: float):
+        self.phases.append((phase, seconds))
+
+    def ready(self):
+        """Note that the service is ready and log the breakdown"""
+        self.ready_after = time.perf_counter() - self.started
+        breakdown = ", ".join(f"{phase}={seconds * 1000:.1f}ms" for phase, seconds in self.phases)
+        logger.info(f"Startup ready in {self.ready_after * 1000:.1f}ms ({breakdown})")
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready_after is not None,
+            "ready_after_ms": round(self.ready_after * 1000, 3) if self.ready_after is not None else None,
+            "phases_ms": {phase: round(seconds * 1000, 3) for phase, seconds in self.phases},
+        }
+
+
+# Created on first import, which main.py does before anything else, so the
+# first phase covers the app's own imports
+startup_timer = StartupTimer()
@@ -0,0 +1,80 @@
+from typing import Dict, Iterator, List, Optional, Tuple
+from contextlib import contextmanager
+from contextvars import ContextVar
+import time
+
+# =====================================
+# Per-request Phase Timing
+# =====================================
+# The middleware starts a RequestTimings for each request and stores it in a
+# context variable. Code anywhere below it, including executor threads run
+# with a copied context, adds named phases that end up in the response's
+# Server-Timing header.
+
+
+class RequestTimings:
+    """Named phase durations collected while handling one request"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.endpoint_done: Optional[float] = None
+        self._phases: List[Tuple[str, float]] = []
+
+    def add(self, name: str, seconds: float):
+        # list.append is atomic, so executor threads can add phases directly
+        self._phases.append((name, seconds))
+
+    def header(self) -> str:
+        """Server-Timing value; repeated phases (e.g. per batch command) are summed"""
+        totals: Dict[str, float] = {}
+        counts: Dict[str, int] = {}
+        for name, seconds in self._phases:
+            totals[name] = totals.get(name, 0.0) + seconds
+            counts[name] = counts.get(name, 0) + 1
+        entries = [
+            f'{name};dur={seconds * 1000:.3f}' + (f';desc="x{counts[name]}"' if counts[name] > 1 else "")
+            for name, seconds in totals.items()
+        ]
+        entries.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.3f}")
+        return ", ".join(entries)
+
+
+_current: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+
+def start_request() -> RequestTimings:
+    timings = RequestTimings()
+    _current.set(timings)
+    return timings
+
+
+def current() -> Optional[RequestTimings]:
+    return _current.get()
+
+
+def record(name: str, seconds: float):
+    """Add a phase to the current request, if there is one"""
+    timings = _current.get()
+    if timings is not None:
+        timings.add(name, seconds)
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Time the enclosed block as a phase of the current request"""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - start)
+
+
+def mark_endpoint_done():
+    """Note that the endpoint returned; the rest until headers go out is encoding"""
+    timings = _current.get()
+    if timings is not None:
+        timings.endpoint_done = time.perf_counter()
@@ -1,9 +1,19 @@
-from typing import Dict, List, Optional, Any, Union, Set
+from typing import Dict, List, Optional, Any, Union, Set, Iterable
+from collections import OrderedDict
+from dataclasses import dataclass
 import re
 import shlex
 import os
+import time
+import threading
+try:
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
 from pydantic import BaseModel, validator
 
+from app.utils.metrics import VALIDATOR_DURATION
+
 # =====================================
 # Command Blacklisting System
 # =====================================
@@ -87,6 +97,235 @@ DANGEROUS_PATTERNS = [
     r"\$\(\s*.*?\s*\)",  # Command substitution
 ]
 
+# Maximum command length accepted by the validator
+MAX_COMMAND_LENGTH = 8192
+
+# =====================================
+# Compiled Command Policy
+# =====================================
+
+# Characters that make shlex tokenization differ from a plain whitespace split
+_SHLEX_SPECIAL_CHARS = frozenset("'\"\\")
+_FIRST_TOKEN = re.compile(r"[ \t\r\n]*([^ \t\r\n]*)")
+
+
+def get_base_command(command: str) -> str:
+    """
+    Get the executable name a command invokes, e.g. 'nmap' for
+    '/usr/bin/nmap -sV host'. Returns an empty string if there is none.
+    """
+    if _SHLEX_SPECIAL_CHARS.isdisjoint(command):
+        # No quoting or escapes: shlex would split on whitespace only
+        return os.path.basename(_FIRST_TOKEN.match(command).group(1))
+
+    try:
+        args = shlex.split(command)
+        return os.path.basename(args[0]) if args else ""
+    except ValueError:
+        # If parsing fails, use a simple split
+        return command.split()[0].split('/')[-1]
+
+
+def _required_literals(items) -> Optional[Set[str]]:
+    """
+    Find literals that every match of a parsed regex must contain.
+    Returns a set of lowercase strings at least one of which appears in any
+    matching text, or None if no such set can be derived.
+    """
+    best: Optional[Set[str]] = None
+    run: List[str] = []
+
+    def better(current, candidate):
+        if not candidate:
+            return current
+        if current is None or min(map(len, candidate)) > min(map(len, current)):
+            return candidate
+        return current
+
+    for op, av in list(items) + [(None, None)]:
+        if op is sre_parse.LITERAL and av < 128:
+            run.append(chr(av).lower())
+            continue
+        if run:
+            best = better(best, {"".join(run)})
+            run = []
+
+        candidate = None
+        if op is sre_parse.SUBPATTERN:
+            candidate = _required_literals(av[-1])
+        elif op is sre_parse.BRANCH:
+            alternatives = [_required_literals(branch) for branch in av[1]]
+            if all(alternatives):
+                candidate = set().union(*alternatives)
+        elif op is sre_parse.IN:
+            if all(o is sre_parse.LITERAL and a < 128 for o, a in av):
+                candidate = {chr(a).lower() for _, a in av}
+        elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT) and av[0] >= 1:
+            candidate = _required_literals(av[2])
+        best = better(best, candidate)
+
+    return best
+
+
+@dataclass(frozen=True)
+class CommandVerdict:
+    """Result of validating a single command against a CommandPolicy"""
+    allowed: bool
+    reason: str = ""
+    rule: Optional[str] = None
+    base_command: str = ""
+
+
+class CommandPolicy:
+    """
+    Validates commands in a single pass. The argument blacklist is compiled
+    into one combined regex, and each dangerous pattern is guarded by the
+    literals it requires so only patterns that can possibly match are run.
+    Recent verdicts are kept in a bounded LRU cache.
+    """
+
+    def __init__(
+        self,
+        blacklisted_commands: Iterable[str] = BLACKLISTED_COMMANDS,
+        blacklisted_args: Iterable[str] = BLACKLISTED_ARGS,
+        dangerous_patterns: Iterable[str] = DANGEROUS_PATTERNS,
+        max_length: int = MAX_COMMAND_LENGTH,
+        cache_size: int = 4096,
+    ):
+        self.blacklisted_commands = frozenset(blacklisted_commands)
+        self.blacklisted_args = list(blacklisted_args)
+        self.dangerous_patterns = list(dangerous_patterns)
+        self.max_length = max_length
+        self.cache_size = cache_size
+
+        # Longest first so overlapping arguments resolve deterministically
+        self._args_matcher = re.compile("|".join(
+            re.escape(arg) for arg in sorted(self.blacklisted_args, key=len, reverse=True)
+        )) if self.blacklisted_args else None
+        self._patterns = [re.compile(pattern, re.IGNORECASE) for pattern in self.dangerous_patterns]
+
+        # Map each required literal to the patterns it gates. Patterns with no
+        # derivable literal always run.
+        self._literal_patterns: Dict[str, Set[int]] = {}
+        self._unfiltered: Set[int] = set()
+        for index, pattern in enumerate(self.dangerous_patterns):
+            literals = _required_literals(sre_parse.parse(pattern))
+            if literals is None:
+                self._unfiltered.add(index)
+                continue
+            for literal in literals:
+                self._literal_patterns.setdefault(literal, set()).add(index)
+        self._literals = list(self._literal_patterns)
+
+        self._cache: "OrderedDict[str, CommandVerdict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _evaluate(self, command: str) -> CommandVerdict:
+        # Check if command is empty
+        if not command.strip():
+            return CommandVerdict(False, "Command cannot be empty", "empty")
+
+        # Check command length (prevent extremely long commands)
+        if len(command) > self.max_length:
+            return CommandVerdict(
+                False,
+                f"Command too long: {len(command)} characters. Maximum allowed: {self.max_length}",
+                "length",
+            )
+
+        base_command = get_base_command(command)
+
+        # Check for blacklisted commands
+        if base_command.lower() in self.blacklisted_commands:
+            return CommandVerdict(
+                False, f"Command '{base_command}' is blacklisted", "command", base_command
+            )
+
+        # Check for blacklisted arguments, reporting the first listed one present
+        if self._args_matcher is not None and self._args_matcher.search(command):
+            arg = next(a for a in self.blacklisted_args if a in command)
+            return CommandVerdict(
+                False, f"Argument '{arg}' is not allowed", "argument", base_command
+            )
+
+        # Check for dangerous patterns. Literal prefilters only apply to ASCII
+        # text, where lowercasing agrees exactly with re.IGNORECASE.
+        if command.isascii():
+            folded = command.lower()
+            candidates = set(self._unfiltered)
+            for literal in [l for l in self._literals if l in folded]:
+                candidates |= self._literal_patterns[literal]
+        else:
+            candidates = range(len(self._patterns))
+
+        for index in sorted(candidates):
+            if self._patterns[index].search(command):
+                return CommandVerdict(
+                    False,
+                    f"Command matches dangerous pattern: {self.dangerous_patterns[index]}",
+                    "pattern",
+                    base_command,
+                )
+
+        return CommandVerdict(True, base_command=base_command)
+
+    def validate(self, command: str) -> CommandVerdict:
+        """
+        Validate a command, returning a cached verdict when the same command
+        was seen recently.
+        """
+        start = time.perf_counter()
+        with self._lock:
+            verdict = self._cache.get(command)
+            if verdict is not None:
+                self._cache.move_to_end(command)
+                self.hits += 1
+        if verdict is not None:
+            VALIDATOR_DURATION.labels("true").observe(time.perf_counter() - start)
+            return verdict
+
+        verdict = self._evaluate(command)
+
+        with self._lock:
+            self.misses += 1
+            self._cache[command] = verdict
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        VALIDATOR_DURATION.labels("false").observe(time.perf_counter() - start)
+        return verdict
+
+    def validate_many(self, commands: Iterable[str]) -> List[CommandVerdict]:
+        """
+        Validate several commands at once. Duplicates within the batch are
+        evaluated only once. Verdicts are returned in input order.
+        """
+        verdicts: Dict[str, CommandVerdict] = {}
+        results = []
+        for command in commands:
+            verdict = verdicts.get(command)
+            if verdict is None:
+                verdict = verdicts[command] = self.validate(command)
+            results.append(verdict)
+        return results
+
+    def cache_info(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._cache),
+                "max_size": self.cache_size,
+            }
+
+    def clear_cache(self):
+        with self._lock:
+            self._cache.clear()
+
+
+command_policy = CommandPolicy(cache_size=int(os.getenv("VALIDATOR_CACHE_SIZE", "4096")))
+
 # =====================================
 # Command Validation Classes
 # =====================================
@@ -96,36 +335,9 @@ class CommandRequest(BaseModel):
     
     @validator('command')
     def validate_command(cls, v):
-        # Check if command is empty
-        if not v.strip():
-            raise ValueError("Command cannot be empty")
-            
-        # Check command length (prevent extremely long commands)
-        if len(v) > 8192:
-            raise ValueError(f"Command too long: {len(v)} characters. Maximum allowed: 8192")
-        
-        # Try to parse the command using shlex to get the base command
-        try:
-            args = shlex.split(v)
-            base_command = os.path.basename(args[0]) if args else ""
-        except:
-            # If parsing fails, use a simple split
-            base_command = v.split()[0].split('/')[-1]
-        
-        # Check for blacklisted commands
-        if base_command.lower() in BLACKLISTED_COMMANDS:
-            raise ValueError(f"Command '{base_command}' is blacklisted")
-        
-        # Check for blacklisted arguments
-        for arg in BLACKLISTED_ARGS:
-            if arg in v:
-                raise ValueError(f"Argument '{arg}' is not allowed")
-        
-        # Check for dangerous patterns
-        for pattern in DANGEROUS_PATTERNS:
-            if re.search(pattern, v, re.IGNORECASE):
-                raise ValueError(f"Command matches dangerous pattern: {pattern}")
-        
+        verdict = command_policy.validate(v)
+        if not verdict.allowed:
+            raise ValueError(verdict.reason)
         return v
     
     @validator('timeout')
@@ -137,24 +349,30 @@ class CommandRequest(BaseModel):
                 raise ValueError("Timeout cannot exceed 3600 seconds (1 hour)")
         return v
 
+def validate_command(command: str) -> CommandVerdict:
+    """
+    Validate a command in a single pass.
+    Returns a CommandVerdict describing whether it is allowed and why not.
+    """
+    return command_policy.validate(command)
+
+def validate_many(commands: Iterable[str]) -> List[CommandVerdict]:
+    """
+    Validate a batch of commands.
+    Returns one CommandVerdict per command, in input order.
+    """
+    return command_policy.validate_many(commands)
+
 def is_command_safe(command: str) -> bool:
     """
     Check if a command is safe to execute.
     Returns True if safe, False if potentially dangerous.
     """
-    try:
-        CommandRequest(command=command)
-        return True
-    except ValueError:
-        return False
+    return command_policy.validate(command).allowed
 
 def get_validation_error(command: str) -> str:
     """
     Get the validation error for an unsafe command.
     Returns an empty string if the command is safe.
     """
-    try:
-        CommandRequest(command=command)
-        return ""
-    except ValueError as e:
-        return str(e)
\ No newline at end of file
+    return command_policy.validate(command).reason
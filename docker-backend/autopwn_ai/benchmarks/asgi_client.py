@@ -0,0 +1,162 @@
+from typing import Any, Dict, List, Optional, Tuple
+import json
+import asyncio
+
+# =====================================
+# In-process ASGI Driver
+# =====================================
+# Calls the ASGI app directly, so results measure the app and its services
+# rather than a socket stack or an HTTP client library.
+
+
+def _encode_headers(headers: Optional[Dict[str, str]]) -> List[Tuple[bytes, bytes]]:
+    return [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()]
+
+
+async def http_request(
+    app: Any,
+    method: str,
+    path: str,
+    headers: Optional[Dict[str, str]] = None,
+    body: Optional[Dict[str, Any]] = None,
+    client: Tuple[str, int] = ("127.0.0.1", 50000),
+) -> Tuple[int, Dict[str, str], bytes]:
+    """Send one HTTP request; returns (status, headers, body)"""
+    path, _, query = path.partition("?")
+    headers = dict(headers or {})
+    payload = b""
+    if body is not None:
+        payload = json.dumps(body).encode()
+        headers["content-type"] = "application/json"
+        headers["content-length"] = str(len(payload))
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": _encode_headers(headers),
+        "client": client,
+        "server": ("benchmark", 80),
+    }
+    finished = asyncio.Event()
+    request_sent = False
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": payload, "more_body": False}
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    status = 0
+    response_headers: Dict[str, str] = {}
+    chunks: List[bytes] = []
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+            response_headers.update(
+                (name.decode(), value.decode()) for name, value in message.get("headers", [])
+            )
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                finished.set()
+
+    try:
+        await app(scope, receive, send)
+    finally:
+        finished.set()
+    return status, response_headers, b"".join(chunks)
+
+
+class WebSocketSession:
+    """Client side of one in-process WebSocket connection"""
+
+    def __init__(
+        self,
+        app: Any,
+        path: str,
+        client: Tuple[str, int] = ("127.0.0.1", 50000),
+        headers: Optional[Dict[str, str]] = None,
+    ):
+        self.scope = {
+            "type": "websocket",
+            "asgi": {"version": "3.0"},
+            "scheme": "ws",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": b"",
+            "root_path": "",
+            "headers": _encode_headers(headers),
+            "subprotocols": [],
+            "client": client,
+            "server": ("benchmark", 80),
+        }
+        self._app = app
+        self._inbound: asyncio.Queue = asyncio.Queue()
+        self._outbound: asyncio.Queue = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+
+    async def _send(self, message):
+        await self._outbound.put(message)
+
+    async def connect(self):
+        await self._inbound.put({"type": "websocket.connect"})
+        self._task = asyncio.create_task(self._app(self.scope, self._inbound.get, self._send))
+        message = await self._outbound.get()
+        if message["type"] != "websocket.accept":
+            raise RuntimeError(f"WebSocket rejected: {message}")
+
+    async def send_json(self, data: Dict[str, Any]):
+        await self._inbound.put({"type": "websocket.receive", "text": json.dumps(data)})
+
+    async def receive_json(self) -> Optional[Dict[str, Any]]:
+        """Next frame from the server, or None once it has closed the socket"""
+        message = await self._outbound.get()
+        if message["type"] == "websocket.close":
+            return None
+        return json.loads(message["text"] if message.get("text") is not None else message["bytes"])
+
+    async def close(self):
+        await self._inbound.put({"type": "websocket.disconnect", "code": 1000})
+        if self._task is not None:
+            await self._task
+
+
+class Lifespan:
+    """Runs the app's startup and shutdown handlers"""
+
+    def __init__(self, app: Any):
+        self._app = app
+        self._inbound: asyncio.Queue = asyncio.Queue()
+        self._outbound: asyncio.Queue = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+
+    async def _send(self, message):
+        await self._outbound.put(message)
+
+    async def _exchange(self, event: str):
+        await self._inbound.put({"type": f"lifespan.{event}"})
+        message = await self._outbound.get()
+        if message["type"] != f"lifespan.{event}.complete":
+            raise RuntimeError(f"Lifespan {event} failed: {message}")
+
+    async def __aenter__(self):
+        self._task = asyncio.create_task(
+            self._app({"type": "lifespan", "asgi": {"version": "3.0"}}, self._inbound.get, self._send)
+        )
+        await self._exchange("startup")
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._exchange("shutdown")
+        await self._task
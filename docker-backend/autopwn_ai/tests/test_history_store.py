@@ -0,0 +1,75 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from app.services.history_store import HistoryStore, key_fingerprint
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = HistoryStore(path=str(tmp_path / "history.db"), flush_interval=0.01)
+    store.start()
+    yield store
+    store.close()
+
+
+def flush(store, rows):
+    for row in rows:
+        store.record(**row)
+    store.close()
+    store.start()
+
+
+def query(store, **filters):
+    return asyncio.run(store.query("k", **filters))
+
+
+def test_key_fingerprint():
+    assert key_fingerprint(None) is None
+    assert key_fingerprint("k") == key_fingerprint("k") != key_fingerprint("j")
+    assert "k" not in key_fingerprint("k")
+
+
+def test_pages_and_filters(store):
+    flush(store, [
+        dict(command=f"nmap -p {i} host", source="execute", success=i % 2 == 0, api_key="k", exit_code=i % 3)
+        for i in range(10)
+    ] + [dict(command="whoami", source="local", success=True, api_key="other")])
+
+    first = query(store, limit=4)
+    assert [e["command"] for e in first["entries"]] == [f"nmap -p {i} host" for i in (9, 8, 7, 6)]
+    rest = query(store, limit=10, cursor=first["next_cursor"])
+    assert len(rest["entries"]) == 6 and rest["next_cursor"] is None
+
+    assert {e["exit_code"] for e in query(store, exit_code=2)["entries"]} == {2}
+    assert all(e["success"] for e in query(store, success=True)["entries"])
+    assert len(query(store, tool="nmap")["entries"]) == 10
+    assert len(query(store, prefix="nmap -p 1")["entries"]) == 1
+    assert query(store, source="local")["entries"] == []
+
+
+def test_time_filters_do_not_assume_ids_follow_time(store):
+    flush(store, [dict(command=f"id {i}", source="job", success=True, api_key="k") for i in range(6)])
+    # Another worker's batch can commit rows that finished earlier after later ones
+    conn = sqlite3.connect(store.path)
+    for row_id, finished_at in zip(range(1, 7), (100, 300, 200, 500, 150, 400)):
+        conn.execute("UPDATE history SET finished_at = ? WHERE id = ?", (finished_at, row_id))
+    conn.commit()
+    conn.close()
+
+    entries = query(store, since=150, until=400)["entries"]
+    assert sorted(e["finished_at"] for e in entries) == [150, 200, 300]
+
+
+def test_filters_use_indexes(store):
+    conn = sqlite3.connect(store.path)
+    for where, index in (
+        ("api_key = ? AND exit_code = ?", "idx_history_key_exit"),
+        ("api_key = ? AND finished_at >= ?", "idx_history_key_finished"),
+    ):
+        plan = " ".join(
+            row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN SELECT id FROM history WHERE {where}", ("k", 1))
+        )
+        assert index in plan
+    conn.close()
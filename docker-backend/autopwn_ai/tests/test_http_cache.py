@@ -0,0 +1,44 @@
+import pytest
+
+from app.utils.http_cache import RangeNotSatisfiable, etag_matches, if_range_matches, parse_range
+
+
+def test_etag_matches_uses_weak_comparison():
+    assert etag_matches('W/"abc"', '"abc"')
+    assert etag_matches('"x", W/"abc"', 'W/"abc"')
+    assert etag_matches("*", '"abc"')
+    assert not etag_matches('"abd"', '"abc"')
+    assert not etag_matches(None, '"abc"')
+
+
+def test_if_range_uses_strong_comparison():
+    assert if_range_matches(None, 'W/"abc"')
+    assert if_range_matches('"abc"', '"abc"')
+    assert not if_range_matches('W/"abc"', 'W/"abc"')
+    assert not if_range_matches('"abc"', 'W/"abc"')
+    assert not if_range_matches('W/"abc"', '"abc"')
+    assert not if_range_matches('"abd"', '"abc"')
+    assert not if_range_matches("Wed, 21 Oct 2015 07:28:00 GMT", '"abc"')
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("bytes=0-9", (0, 9)),
+    ("bytes=10-", (10, 99)),
+    ("bytes=-10", (90, 99)),
+    ("bytes=-500", (0, 99)),
+    ("bytes=90-500", (90, 99)),
+    ("bytes=0-1,5-6", None),
+    ("items=0-1", None),
+    ("bytes=5-2", None),
+    ("bytes=a-b", None),
+    ("bytes=-", None),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, 100) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=100-", "bytes=-0"])
+def test_unsatisfiable_range(header):
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range(header, 100)
@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+from app.services.job_queue import CANCELLED, COMPLETED, FAILED, JobQueue, QueueFullError
+
+
+class FakeKali:
+    """Records the order commands run in; `fail` commands raise"""
+
+    def __init__(self):
+        self.ran = []
+        self.closed = []
+
+    async def execute_command_async(self, command, session_id=None, timeout=None, sink=None):
+        self.ran.append(command)
+        await asyncio.sleep(0)
+        if command == "fail":
+            raise RuntimeError("boom")
+        return {"stdout": command, "stderr": "", "success": True, "execution_time": 0.0, "exit_code": 0}
+
+    def close_session(self, session_id):
+        self.closed.append(session_id)
+
+
+async def drain(queue, jobs):
+    queue.start()
+    try:
+        while any(job.status not in (COMPLETED, FAILED, CANCELLED) for job in jobs):
+            await asyncio.sleep(0.001)
+    finally:
+        await queue.stop()
+
+
+def test_priorities_first_then_owners_round_robin():
+    kali = FakeKali()
+
+    async def run():
+        queue = JobQueue(kali, workers=1, max_depth=10)
+        jobs = [
+            await queue.submit("a1", None, "normal", "a"),
+            await queue.submit("a2", None, "normal", "a"),
+            await queue.submit("a3", None, "normal", "a"),
+            await queue.submit("b1", None, "normal", "b"),
+            await queue.submit("low", None, "low", "c"),
+            await queue.submit("high", None, "high", "c"),
+        ]
+        await drain(queue, jobs)
+        return jobs
+
+    jobs = asyncio.run(run())
+    assert kali.ran == ["high", "a1", "b1", "a2", "a3", "low"]
+    assert all(job.status == COMPLETED and job.result["stdout"] == job.command for job in jobs)
+
+
+def test_submit_rejects_bad_priority_and_full_queue():
+    async def run():
+        queue = JobQueue(FakeKali(), workers=1, max_depth=2)
+        with pytest.raises(ValueError):
+            await queue.submit("x", None, "urgent", "a")
+        await queue.submit("x", None, "normal", "a")
+        await queue.submit("y", None, "normal", "a")
+        with pytest.raises(QueueFullError):
+            await queue.submit("z", None, "normal", "a")
+        assert queue.stats()["queued"] == 2
+
+    asyncio.run(run())
+
+
+def test_cancel_queued_job_and_failures():
+    kali = FakeKali()
+
+    async def run():
+        queue = JobQueue(kali, workers=1, max_depth=10)
+        cancelled = await queue.submit("never", None, "normal", "a")
+        failing = await queue.submit("fail", None, "normal", "a")
+        assert queue.cancel(cancelled.job_id).status == CANCELLED
+        assert queue.depth == 1
+        await drain(queue, [failing])
+        return cancelled, failing
+
+    cancelled, failing = asyncio.run(run())
+    assert kali.ran == ["fail"]
+    assert failing.status == FAILED and failing.error == "boom"
+    assert cancelled.finished_at is not None
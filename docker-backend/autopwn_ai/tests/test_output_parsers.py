@@ -0,0 +1,131 @@
+from app.services.output_parsers import (
+    MAX_LINE_LENGTH, GobusterParser, MasscanParser, NiktoParser, NmapTextParser, NmapXmlParser,
+    OutputParser, create_parser
+)
+
+NMAP_TEXT = """Starting Nmap 7.94 ( https://nmap.org )
+Nmap scan report for web.local (10.0.0.5)
+Host is up (0.0010s latency).
+PORT   STATE SERVICE VERSION
+22/tcp open  ssh     OpenSSH 9.2p1 Debian
+80/tcp open  http    Apache httpd 2.4.57
+| http-title: Welcome
+|_http-server-header: Apache/2.4.57 (Debian)
+Running: Linux 5.X
+Nmap scan report for 10.0.0.6
+53/udp open|filtered domain
+"""
+
+NMAP_XML = """<?xml version="1.0"?>
+<nmaprun scanner="nmap">
+<host><status state="up"/><address addr="10.0.0.5" addrtype="ipv4"/>
+<hostnames><hostname name="web.local"/></hostnames>
+<ports>
+<port protocol="tcp" portid="80"><state state="open"/>
+<service name="http" product="Apache httpd" version="2.4.57"/>
+<script id="http-title" output=" Welcome "/></port>
+</ports>
+<hostscript><script id="smb-os" output="Linux"/></hostscript>
+</host>
+<host><status state="up"/><address addr="10.0.0.6" addrtype="ipv4"/>
+<ports><port protocol="udp" portid="53"><state state="open"/></port></ports>
+</host>
+</nmaprun>
+"""
+
+
+def run(parser: OutputParser, text: str, piece: int = 7):
+    """Feed `text` in small pieces, as it arrives from a command, then close"""
+    events = []
+    for i in range(0, len(text), piece):
+        events.extend(parser.feed(text[i:i + piece]))
+    events.extend(parser.close())
+    return events
+
+
+def test_nmap_text():
+    parser = NmapTextParser()
+    events = run(parser, NMAP_TEXT)
+    assert events[0] == {"kind": "host", "host": "10.0.0.5", "hostname": "web.local"}
+    assert events[1] == {
+        "kind": "port", "host": "10.0.0.5", "port": 22, "protocol": "tcp",
+        "state": "open", "service": "ssh", "version": "OpenSSH 9.2p1 Debian",
+    }
+    findings = [e for e in events if e["kind"] == "finding"]
+    assert [(f["source"], f["port"]) for f in findings] == [("http-title", 80), ("http-server-header", 80)]
+    assert {"kind": "os", "host": "10.0.0.5", "detail": "Linux 5.X"} in events
+    assert events[-1]["host"] == "10.0.0.6" and events[-1]["state"] == "open|filtered"
+    assert parser.summary() == {"tool": "nmap", "events": {"host": 2, "port": 3, "finding": 2, "os": 1}, "failed": False}
+
+
+def test_nmap_xml_emits_each_host_as_it_completes():
+    parser = NmapXmlParser()
+    first_host_end = NMAP_XML.index("</host>") + len("</host>")
+    assert [e["kind"] for e in parser.feed(NMAP_XML[:first_host_end])] == ["host", "port", "finding", "finding"]
+    rest = parser.feed(NMAP_XML[first_host_end:]) + parser.close()
+    assert [(e["kind"], e["host"]) for e in rest] == [("host", "10.0.0.6"), ("port", "10.0.0.6")]
+
+
+def test_nmap_xml_fields():
+    events = run(NmapXmlParser(), NMAP_XML)
+    assert events[0] == {"kind": "host", "host": "10.0.0.5", "hostname": "web.local", "state": "up"}
+    assert events[1]["version"] == "Apache httpd 2.4.57"
+    assert events[2] == {"kind": "finding", "host": "10.0.0.5", "port": 80, "source": "http-title", "detail": "Welcome"}
+    assert events[3]["port"] is None and events[3]["source"] == "smb-os"
+
+
+def test_masscan():
+    events = run(MasscanParser(), "Starting masscan\nDiscovered open port 443/tcp on 10.0.0.7\n")
+    assert events == [{"kind": "port", "host": "10.0.0.7", "port": 443, "protocol": "tcp", "state": "open"}]
+
+
+def test_gobuster():
+    text = "/admin (Status: 301) [Size: 312] [--> http://t/admin/]\nFound: dev.t (Status: 200) [Size: 10]\nnoise\n"
+    events = run(GobusterParser(), text)
+    assert events == [
+        {"kind": "finding", "path": "/admin", "status": 301, "size": 312, "redirect": "http://t/admin/"},
+        {"kind": "finding", "path": "dev.t", "status": 200, "size": 10, "redirect": None},
+    ]
+
+
+def test_nikto_skips_metadata():
+    text = (
+        "+ Target IP:          10.0.0.5\n"
+        "+ Start Time:         2024-01-01\n"
+        "+ OSVDB-3092: /admin/: This might be interesting.\n"
+        "+ [999986] /: Retrieved x-powered-by header: PHP/8.1\n"
+        "+ 1 host(s) tested\n"
+    )
+    events = run(NiktoParser(), text)
+    assert [(e["path"], e["reference"]) for e in events] == [("/admin/", "OSVDB-3092"), ("/", "999986")]
+    assert events[0]["detail"] == "This might be interesting."
+
+
+def test_final_unterminated_line_is_parsed_on_close():
+    parser = MasscanParser()
+    assert parser.feed("Discovered open port 80/tcp on 10.0.0.8") == []
+    assert len(parser.close()) == 1
+
+
+def test_overlong_lines_are_skipped():
+    parser = MasscanParser()
+    line = "Discovered open port 80/tcp on 10.0.0.8"
+    events = run(parser, "x" * (MAX_LINE_LENGTH + 10) + line + "\n" + line + "\n", piece=4096)
+    assert len(events) == 1
+    assert len(parser._partial) == 0
+
+
+def test_parser_errors_stop_parsing_without_raising():
+    parser = NmapXmlParser()
+    assert parser.feed("<nmaprun><host></nmaprun>") == []
+    assert parser.failed
+    assert parser.feed("<host/>") == [] and parser.close() == []
+    assert parser.summary()["failed"]
+
+
+def test_create_parser():
+    assert isinstance(create_parser("nmap -sV host"), NmapTextParser)
+    assert isinstance(create_parser("/usr/bin/nmap -oX - host"), NmapXmlParser)
+    assert isinstance(create_parser("nmap -oX out.xml host"), NmapTextParser)
+    assert isinstance(create_parser("masscan -p80 10.0.0.0/24"), MasscanParser)
+    assert create_parser("whoami") is None
@@ -0,0 +1,54 @@
+import pytest
+
+from app.services import output_store
+from app.services.output_store import OutputStream
+
+
+@pytest.fixture
+def spilled(tmp_path, monkeypatch):
+    # Small blocks so lines routinely cross block boundaries
+    monkeypatch.setattr(output_store, "BLOCK_SIZE", 64)
+    text = b"".join(b"L%d-" % i + b"y" * (i % 90) + b"\n" for i in range(200))
+    stream = OutputStream(str(tmp_path / "out.seg"), spill_threshold=0, preview_bytes=16)
+    for i in range(0, len(text), 37):
+        stream.write(text[i:i + 37])
+    stream.close(spill=True)
+    assert len(stream._blocks) > 17
+    return stream, text
+
+
+def test_read_lines_across_blocks(spilled):
+    stream, text = spilled
+    lines = text.splitlines(keepends=True)
+    assert stream.lines == len(lines)
+    for offset in range(len(lines) + 1):
+        for limit in (1, 2, 7):
+            assert b"".join(stream.read_lines(offset, limit)) == b"".join(lines[offset:offset + limit])
+
+
+def test_read_bytes_across_blocks(spilled):
+    stream, text = spilled
+    for offset in range(0, len(text) + 1, 5):
+        for limit in (1, 63, 64, 65, 500):
+            assert b"".join(stream.read_bytes(offset, limit)) == text[offset:offset + limit]
+
+
+def test_read_in_memory(tmp_path):
+    stream = OutputStream(str(tmp_path / "out.seg"), spill_threshold=1024, preview_bytes=16)
+    stream.write(b"a\nbb\nccc")
+    stream.close()
+    assert not stream.spilled
+    assert stream.lines == 3
+    assert b"".join(stream.read_lines(1, 5)) == b"bb\nccc"
+    assert b"".join(stream.read_bytes(2, 3)) == b"bb\n"
+
+
+def test_discard_removes_segment(tmp_path):
+    path = tmp_path / "out.seg"
+    stream = OutputStream(str(path), spill_threshold=0, preview_bytes=16)
+    stream.write(b"x" * 100)
+    assert path.exists()
+    stream.discard()
+    stream.write(b"more")
+    assert not path.exists()
+    assert stream.size == 100
@@ -0,0 +1,57 @@
+import json
+
+from app.services.history_store import key_fingerprint
+from app.utils.rate_limiter import SlidingWindowRateLimiter, classify_route
+
+
+def test_classify_route():
+    assert classify_route("/health") == "health"
+    assert classify_route("/execute/batch") == "execute"
+    assert classify_route("/ws/execute") == "execute"
+    assert classify_route("/history") == "default"
+
+
+def test_sliding_window():
+    limiter = SlidingWindowRateLimiter(window=10, route_limits={"execute": 2})
+    assert limiter.hit("ip:a", "execute", now=0) == (True, 0.0)
+    assert limiter.hit("ip:a", "execute", now=1) == (True, 0.0)
+    allowed, retry_after = limiter.hit("ip:a", "execute", now=4)
+    assert not allowed and retry_after == 6
+    # Other clients and route classes have their own buckets
+    assert limiter.hit("ip:b", "execute", now=4)[0]
+    assert limiter.hit("ip:a", "default", now=4)[0]
+    # The oldest request has left the window
+    assert limiter.hit("ip:a", "execute", now=10)[0]
+    assert not limiter.hit("ip:a", "execute", now=10.5)[0]
+    assert limiter.rejections == 2
+
+
+def test_zero_limit_rejects():
+    limiter = SlidingWindowRateLimiter(route_limits={"execute": 0})
+    allowed, retry_after = limiter.hit("ip:a", "execute", now=0)
+    assert not allowed and retry_after == limiter.window
+
+
+def test_sweep_drops_idle_buckets():
+    limiter = SlidingWindowRateLimiter(window=10)
+    limiter.hit("ip:a", "execute", now=0)
+    limiter.hit("ip:b", "execute", now=5)
+    assert limiter.sweep(now=12) == 1
+    assert limiter.sweep(now=20) == 1
+    assert limiter.sweep(now=20) == 0
+
+
+def test_key_overrides_apply_per_api_key(monkeypatch):
+    monkeypatch.setenv("RATE_LIMIT_KEY_OVERRIDES", json.dumps({"secret": {"execute": 1}}))
+    limiter = SlidingWindowRateLimiter.from_env()
+    # Bucket keys never contain the API key itself
+    assert all("secret" not in key for key in limiter.key_limits)
+    client_key = f"key:{key_fingerprint('secret')}@10.0.0.1"
+    assert limiter.limit_for(client_key, "execute") == 1
+    assert limiter.limit_for(client_key, "health") == limiter.route_limits["health"]
+    assert limiter.limit_for(f"key:{key_fingerprint('other')}@10.0.0.1", "execute") == limiter.route_limits["execute"]
+
+
+def test_invalid_overrides_are_ignored(monkeypatch):
+    monkeypatch.setenv("RATE_LIMIT_KEY_OVERRIDES", "not json")
+    assert SlidingWindowRateLimiter.from_env().key_limits == {}
@@ -0,0 +1,156 @@
+import asyncio
+
+import pytest
+
+from app.services.governor import QuotaExceededError
+from app.services.result_cache import (
+    BYPASS, COALESCED, HIT, MISS, UNCACHEABLE, ResultCache, normalize_command
+)
+
+
+@pytest.fixture
+def cache():
+    return ResultCache(allowlist={"ls", "whoami"}, ttl=30, max_entries=2)
+
+
+def counted(results):
+    """An execute callable returning `results` in turn and counting its calls"""
+    calls = []
+
+    async def execute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return results[len(calls) - 1]
+    return execute, calls
+
+
+@pytest.mark.parametrize("command", [
+    "ls /tmp\ntouch x",
+    "ls /tmp\r\ntouch x",
+    "ls; touch x",
+    "ls && touch x",
+    "ls | tee x",
+    "ls > x",
+    "ls $(touch x)",
+    "ls `touch x`",
+])
+def test_chained_commands_are_uncacheable(cache, command):
+    assert not cache.is_cacheable(command)
+
+
+def test_only_allowlisted_commands_are_cacheable(cache):
+    assert cache.is_cacheable("ls -la /tmp")
+    assert not cache.is_cacheable("rm -rf /tmp/x")
+    assert not ResultCache(allowlist=set()).is_cacheable("ls")
+
+
+def test_newline_chained_command_skips_cache(cache):
+    execute, calls = counted([{"success": True}] * 2)
+
+    async def run():
+        return [await cache.run("ls /tmp\ntouch x", "kali", execute) for _ in range(2)]
+
+    statuses = [status for _, status in asyncio.run(run())]
+    assert statuses == [UNCACHEABLE, UNCACHEABLE]
+    assert len(calls) == 2
+
+
+def test_normalize_command():
+    assert normalize_command("ls   -la  '/tmp'") == normalize_command('ls -la "/tmp"')
+    assert normalize_command("ls /tmp") != normalize_command("ls /var")
+
+
+def test_key_includes_context(cache):
+    execute, calls = counted([{"success": True, "host": "a"}, {"success": True, "host": "b"}])
+
+    async def run():
+        first = await cache.run("whoami", "kali-a", execute)
+        second = await cache.run("whoami", "kali-b", execute)
+        third = await cache.run("whoami  ", "kali-a", execute)
+        return first, second, third
+
+    first, second, third = asyncio.run(run())
+    assert first == ({"success": True, "host": "a"}, MISS)
+    assert second == ({"success": True, "host": "b"}, MISS)
+    assert third == ({"success": True, "host": "a"}, HIT)
+
+
+def test_failures_and_bypass_are_not_served_from_cache(cache):
+    execute, calls = counted([{"success": False}, {"success": True}, {"success": True}])
+
+    async def run():
+        return [
+            (await cache.run("whoami", "kali", execute))[1],
+            (await cache.run("whoami", "kali", execute))[1],
+            (await cache.run("whoami", "kali", execute, bypass=True))[1],
+        ]
+
+    assert asyncio.run(run()) == [MISS, MISS, BYPASS]
+    assert len(calls) == 3
+
+
+def test_followers_outlive_a_cancelled_leader(cache):
+    execute, calls = counted([{"success": True}])
+
+    async def run():
+        leader = asyncio.ensure_future(cache.run("whoami", "kali", execute))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(cache.run("whoami", "kali", execute))
+        await asyncio.sleep(0)
+        leader.cancel()
+        return await follower
+
+    assert asyncio.run(run()) == ({"success": True}, COALESCED)
+    assert len(calls) == 1
+
+
+def test_execution_cancelled_when_last_waiter_leaves(cache):
+    cancelled = []
+
+    async def execute():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(1)
+            raise
+
+    async def run():
+        waiters = [asyncio.ensure_future(cache.run("whoami", "kali", execute)) for _ in range(2)]
+        await asyncio.sleep(0)
+        waiters[0].cancel()
+        await asyncio.sleep(0.01)
+        assert not cancelled
+        waiters[1].cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        await asyncio.sleep(0)
+
+    asyncio.run(run())
+    assert cancelled == [1]
+    assert cache.stats()["in_flight"] == 0
+
+
+def test_quota_is_checked_per_caller(cache):
+    calls = []
+
+    async def execute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        if len(calls) == 1:
+            raise QuotaExceededError("cpu", "leader over quota")
+        return {"success": True}
+
+    async def deny():
+        raise QuotaExceededError("cpu", "denied")
+
+    async def run():
+        leader = asyncio.ensure_future(cache.run("whoami", "kali", execute))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(cache.run("whoami", "kali", execute))
+        results = await asyncio.gather(leader, follower, return_exceptions=True)
+        with pytest.raises(QuotaExceededError):
+            await cache.run("ls", "kali", execute, admit=deny)
+        return results
+
+    leader, follower = asyncio.run(run())
+    assert isinstance(leader, QuotaExceededError)
+    assert follower == ({"success": True}, MISS)
